@@ -0,0 +1,362 @@
+import asyncio
+import functools
+import json
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from database import DuplicateFeedbackError
+from write_queue import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted by the JSON API
+MAX_BODY_BYTES = 64 * 1024
+TOKEN_MAX_AGE = 3600
+# Route role for endpoints open to any signed-in user
+ANY_ROLE = 'any'
+
+# Query-string filters accepted by GET /api/feedback
+LIST_FILTER_ARGS = ('rating', 'student', 'date_from', 'date_to', 'sort', 'order', 'page_size', 'cursor')
+SEARCH_FILTER_ARGS = ('rating', 'student', 'date_from', 'date_to', 'page_size', 'cursor')
+# Query-string arguments accepted by GET /api/feedback/mine
+OWN_FEEDBACK_ARGS = ('page_size', 'cursor')
+FEEDBACK_FIELDS = ('id', 'student_username', 'feedback_text', 'rating', 'submission_date')
+
+
+class AsyncDatabase:
+    """Awaitable versions of the Database methods used by the JSON API.
+
+    SQLite calls run on a small thread pool sized to the connection pool, so
+    thousands of waiting requests cost coroutines rather than threads.
+    Password checks go straight to the password engine's own worker pool and
+    submissions go through the write-behind queue when one is given.
+    Admin reads are served from the read replica when the database has one.
+    """
+
+    def __init__(self, db, submission_queue=None, workers=None):
+        self.db = db
+        self.submission_queue = submission_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers or db.pool.size,
+                                           thread_name_prefix='async-db')
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    def _reporting_call(self, method, *args, **kwargs):
+        with self.db.reporting():
+            return method(*args, **kwargs)
+
+    async def _report(self, method, *args, **kwargs):
+        """Run a read-only admin query inside db.reporting() on the thread pool"""
+        return await self._run(self._reporting_call, method, *args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Run another blocking call that touches the database on the same thread pool"""
+        return await self._run(func, *args, **kwargs)
+
+    async def get_user(self, username):
+        return await self._run(self.db.get_user, username)
+
+    async def get_token_state(self, username):
+        return await self._run(self.db.get_token_state, username)
+
+    async def revoke_api_tokens(self, username):
+        return await self._run(self.db.revoke_api_tokens, username)
+
+    async def authenticate_user(self, username, password):
+        """Authenticate user login without holding a database thread while hashing"""
+        user = await self.get_user(username)
+        stored_hash = user[1] if user else None
+
+        passwords = self.db.passwords
+        if not await asyncio.wrap_future(passwords.verify_async(password, stored_hash)):
+            return None
+
+        if passwords.needs_rehash(stored_hash):
+            await self._run(self.db._upgrade_password_hash, username, stored_hash, password)
+
+        return (user[0], user[2])
+
+    async def submit_feedback(self, student_username, feedback_text, rating):
+        """Save feedback; True once committed (queued submissions wait for their group commit)"""
+        if self.submission_queue is None:
+            return await self._run(self.db.submit_feedback, student_username, feedback_text, rating)
+        # submit() can block briefly on a full queue, so keep it off the event loop
+        future = await self._run(self.submission_queue.submit, student_username, feedback_text, rating)
+        await asyncio.wrap_future(future)
+        return True
+
+    async def get_feedback_page(self, **kwargs):
+        return await self._report(self.db.get_feedback_page, **kwargs)
+
+    async def search_feedback(self, query, **kwargs):
+        return await self._report(self.db.search_feedback, query, **kwargs)
+
+    async def get_student_feedback(self, student_username, **kwargs):
+        return await self._run(self.db.get_student_feedback, student_username, **kwargs)
+
+    async def get_student_counts(self, student_username):
+        return await self._run(self.db.get_student_counts, student_username)
+
+    async def get_feedback_stats(self):
+        return await self._report(self.db.get_feedback_stats)
+
+    def close(self):
+        """Shut down the database thread pool"""
+        self.executor.shutdown(wait=True)
+
+
+class ApiError(Exception):
+    """An error returned to the client as {"error": message}"""
+
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = list(headers)
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.client_ip = scope['client'][0] if scope.get('client') else None
+        self.query = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.body = body
+        self.user = None
+
+    def json(self):
+        """Decode the body as a JSON object"""
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError:
+            raise ApiError(400, "Request body must be JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return data
+
+
+class FeedbackApi:
+    """ASGI application serving the feedback JSON API.
+
+    POST /api/login      {"username", "password"} -> {"token", "role", "expires_in"}
+    POST /api/logout     revokes every token of the caller (any token)
+    POST /api/feedback   {"feedback_text", "rating"} (student token)
+    GET  /api/feedback   dashboard filters, or q for search (admin token)
+    GET  /api/stats      total, histogram and mean rating (admin token)
+
+    Tokens are signed with the Flask app's secret key and sent as
+    "Authorization: Bearer <token>". Each one carries the user's token
+    generation, and every request checks it and the role against the users
+    table (one primary-key probe), so logging out, SessionStore.revoke_user
+    and role changes apply to tokens already handed out. Logins go through
+    login_throttle, when given, and get 429 with Retry-After when throttled.
+    """
+
+    def __init__(self, async_db, secret_key, token_max_age=TOKEN_MAX_AGE, instrumentation=None,
+                 login_throttle=None):
+        self.db = async_db
+        self.login_throttle = login_throttle
+        self.tokens = URLSafeTimedSerializer(secret_key, salt='feedback-api-token')
+        self.token_max_age = token_max_age
+        self.instrumentation = instrumentation
+        self.routes = {
+            ('POST', '/api/login'): (self.login, None),
+            ('POST', '/api/logout'): (self.logout, ANY_ROLE),
+            ('POST', '/api/feedback'): (self.submit_feedback, 'student'),
+            ('GET', '/api/feedback'): (self.list_feedback, 'admin'),
+            ('GET', '/api/feedback/mine'): (self.own_feedback, 'student'),
+            ('GET', '/api/stats'): (self.stats, 'admin'),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.db.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise ApiError(413, "Request body too large")
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _http(self, scope, receive, send):
+        started = time.perf_counter()
+        endpoint = 'unmatched'
+        headers = []
+        try:
+            route = self.routes.get((scope['method'], scope['path']))
+            if route is None:
+                if any(path == scope['path'] for _, path in self.routes):
+                    raise ApiError(405, "Method not allowed")
+                raise ApiError(404, "Not found")
+            endpoint = scope['path']
+            handler, role = route
+
+            body = await self._read_body(receive)
+            if body is None:
+                return
+            request = Request(scope, body)
+            if role is not None:
+                request.user = await self._authorize(request, role)
+            status, payload = await handler(request)
+        except ApiError as e:
+            status, payload = e.status, {'error': e.message}
+            headers = e.headers
+        except Exception as e:
+            logger.exception("Unhandled API error")
+            if self.instrumentation is not None:
+                self.instrumentation.record_error('api', e)
+            status, payload = 500, {'error': "Internal server error"}
+
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode())]
+                       + [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+        if self.instrumentation is not None:
+            self.instrumentation.request_latency.observe(
+                time.perf_counter() - started, endpoint=endpoint, method=scope['method'], status=status)
+
+    async def _authorize(self, request, role):
+        """Return (username, role) from the bearer token, requiring the given role"""
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            raise ApiError(401, "Missing bearer token")
+        try:
+            username, generation = self.tokens.loads(token, max_age=self.token_max_age)
+        except SignatureExpired:
+            raise ApiError(401, "Token expired")
+        except (BadSignature, TypeError, ValueError):
+            # TypeError/ValueError: a signed payload of another shape
+            raise ApiError(401, "Invalid token")
+
+        # Read the user on every request so revocation and role changes apply at once
+        state = await self.db.get_token_state(username)
+        if state is None or state[1] != generation:
+            raise ApiError(401, "Token revoked")
+        current_role = state[0]
+        if role != ANY_ROLE and current_role != role:
+            raise ApiError(403, f"This endpoint needs a {role} account")
+        return username, current_role
+
+    # Handlers return (status, JSON payload)
+
+    async def login(self, request):
+        data = request.json()
+        username, password = data.get('username'), data.get('password')
+        if not isinstance(username, str) or not isinstance(password, str):
+            raise ApiError(400, "username and password are required")
+
+        throttle = self.login_throttle
+        if throttle is not None:
+            # The SQLite limiter writes, so keep it off the event loop
+            retry_after = await self.db.run(throttle.acquire, request.client_ip, username)
+            if retry_after:
+                raise ApiError(429, "Too many login attempts", [('retry-after', str(math.ceil(retry_after)))])
+
+        user = await self.db.authenticate_user(username, password)
+        if user is None:
+            raise ApiError(401, "Invalid username or password")
+        if throttle is not None:
+            await self.db.run(throttle.succeeded, request.client_ip, username)
+        state = await self.db.get_token_state(user[0])
+        return 200, {'token': self.tokens.dumps([user[0], state[1]]), 'role': user[1],
+                     'expires_in': self.token_max_age}
+
+    async def logout(self, request):
+        await self.db.revoke_api_tokens(request.user[0])
+        return 200, {'status': 'logged out'}
+
+    async def submit_feedback(self, request):
+        data = request.json()
+        feedback_text = data.get('feedback_text')
+        if not isinstance(feedback_text, str):
+            raise ApiError(400, "feedback_text is required")
+        try:
+            rating = int(data.get('rating'))
+        except (TypeError, ValueError):
+            raise ApiError(400, "Rating must be between 1 and 5")
+
+        try:
+            await self.db.submit_feedback(request.user[0], feedback_text, rating)
+        except DuplicateFeedbackError as e:
+            raise ApiError(409, str(e))
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        except QueueFullError as e:
+            raise ApiError(503, str(e))
+        return 201, {'status': 'created'}
+
+    async def list_feedback(self, request):
+        query = request.query.get('q')
+        try:
+            if query:
+                page = await self.db.search_feedback(
+                    query, **{name: value for name, value in request.query.items() if name in SEARCH_FILTER_ARGS})
+            else:
+                page = await self.db.get_feedback_page(
+                    **{name: value for name, value in request.query.items() if name in LIST_FILTER_ARGS})
+        except ValueError as e:
+            raise ApiError(400, str(e))
+
+        items = []
+        for row in page.rows:
+            item = dict(zip(FEEDBACK_FIELDS, row))
+            if query:
+                item['snippet'] = row[5]
+            items.append(item)
+        return 200, {'items': items, 'next_cursor': page.next_cursor}
+
+    async def own_feedback(self, request):
+        username = request.user[0]
+        try:
+            page = await self.db.get_student_feedback(
+                username, **{name: value for name, value in request.query.items() if name in OWN_FEEDBACK_ARGS})
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        counts = await self.db.get_student_counts(username)
+        return 200, {'items': [dict(zip(FEEDBACK_FIELDS, row)) for row in page.rows],
+                     'next_cursor': page.next_cursor,
+                     'total': counts[0] if counts else 0,
+                     'mean': counts[1] if counts else None}
+
+    async def stats(self, request):
+        stats = await self.db.get_feedback_stats()
+        return 200, {'total': stats['total'], 'mean': stats['mean'],
+                     'histogram': {str(rating): count for rating, count in stats['histogram'].items()}}
@@ -1,12 +1,178 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from database import Database
+from flask import (Flask, Response, make_response, render_template, request, redirect, url_for, session, flash,
+                   jsonify, stream_with_context)
+from markupsafe import Markup, escape
+from analytics import FeedbackAnalytics
+from assets import StaticAssets
+from cache import MISSING, LRUCache
+from database import SNIPPET_END, SNIPPET_START, Database, DuplicateFeedbackError
+from events import FeedbackBroker, TooManySubscribersError, feedback_stream
+from passwords import PasswordEngine
+from sessions import ServerSideSessionInterface, SessionStore
+from ratelimit import LoginThrottle, MemoryRateLimiter, RateLimit, SQLiteRateLimiter
+from exporter import EXPORT_FORMATS, ExportProgress, export_feedback
+from write_queue import QueueFullError, WriteBehindQueue
+from metrics import Instrumentation
+from profiler import RequestProfiler
+from datetime import datetime
+import atexit
+import hashlib
+import hmac
+import logging
+import math
 import os
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-in-production'
 
+# Fingerprinted, precompressed copies of static/ served from /assets with
+# year-long caching, as written by `manage.py build-assets`
+assets = StaticAssets(app, output_dir=os.environ.get('FEEDBACK_ASSET_DIR'))
+
+# Password hashing cost. Flask logins verify on the request thread; the worker
+# pool (FEEDBACK_PASSWORD_WORKERS/_EXECUTOR) only serves hash_many() for roster
+# imports and verify_async() for the JSON API's logins
+password_params = {}
+if 'FEEDBACK_PASSWORD_ITERATIONS' in os.environ:
+    password_params['iterations'] = int(os.environ['FEEDBACK_PASSWORD_ITERATIONS'])
+if 'FEEDBACK_SCRYPT_N' in os.environ:
+    password_params['n'] = int(os.environ['FEEDBACK_SCRYPT_N'])
+password_engine = PasswordEngine(
+    scheme=os.environ.get('FEEDBACK_PASSWORD_SCHEME', 'pbkdf2_sha256'),
+    workers=int(os.environ.get('FEEDBACK_PASSWORD_WORKERS', 0)) or None,
+    executor=os.environ.get('FEEDBACK_PASSWORD_EXECUTOR', 'thread'),
+    **password_params
+)
+
 # Initialize database
-db = Database()
+db = Database(
+    os.environ.get('FEEDBACK_DB_PATH', 'feedback_portal.db'),
+    pool_size=int(os.environ.get('FEEDBACK_POOL_SIZE', 5)),
+    pool_timeout=float(os.environ.get('FEEDBACK_POOL_TIMEOUT', 10.0)),
+    storage_profile=os.environ.get('FEEDBACK_STORAGE_PROFILE', 'default'),
+    checkpoint_interval=float(os.environ.get('FEEDBACK_CHECKPOINT_INTERVAL', 30.0)),
+    password_engine=password_engine,
+    version_ttl=float(os.environ.get('FEEDBACK_VERSION_TTL', 1.0)),
+    term_dir=os.environ.get('FEEDBACK_TERM_DIR'),
+    duplicate_window=float(os.environ.get('FEEDBACK_DUPLICATE_WINDOW', 600.0)),
+    replica_path=os.environ.get('FEEDBACK_REPLICA_PATH'),
+    replica_refresh_interval=float(os.environ.get('FEEDBACK_REPLICA_REFRESH_INTERVAL', 10.0)),
+    replica_max_staleness=float(os.environ.get('FEEDBACK_REPLICA_MAX_STALENESS', 30.0)),
+    # Keep the newest N terms live and archive older ones in the background
+    retention_terms=int(os.environ['FEEDBACK_RETENTION_TERMS']) if os.environ.get('FEEDBACK_RETENTION_TERMS') else None,
+    retention_interval=float(os.environ.get('FEEDBACK_RETENTION_INTERVAL', 86400.0)),
+    retention_batch_size=int(os.environ.get('FEEDBACK_RETENTION_BATCH_SIZE', 20000))
+)
+
+# Rendered admin dashboards, keyed on the feedback table version
+dashboard_cache = LRUCache(
+    maxsize=int(os.environ.get('FEEDBACK_DASHBOARD_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('FEEDBACK_DASHBOARD_CACHE_TTL', 300.0))
+)
+
+# Admin reports, recomputed only when the feedback table version changes
+analytics = FeedbackAnalytics(
+    db,
+    chunk_size=int(os.environ.get('FEEDBACK_REPORT_CHUNK_SIZE', 50000)),
+    cache_size=int(os.environ.get('FEEDBACK_REPORT_CACHE_SIZE', 16))
+)
+
+# Live admin feed: committed submissions fan out to every open /admin/stream
+feedback_broker = FeedbackBroker(buffer_size=int(os.environ.get('FEEDBACK_STREAM_BUFFER', 256)),
+                                 max_subscribers=int(os.environ.get('FEEDBACK_STREAM_MAX_SUBSCRIBERS', 64)))
+db.feedback_observer = feedback_broker.publish
+STREAM_HEARTBEAT = float(os.environ.get('FEEDBACK_STREAM_HEARTBEAT', 15.0))
+STREAM_MAX_AGE = float(os.environ.get('FEEDBACK_STREAM_MAX_AGE', 300.0))
+
+# Login sessions live server-side so they can be revoked and counted;
+# FEEDBACK_SESSION_BACKEND=cookie keeps Flask's signed-cookie sessions
+session_backend = os.environ.get('FEEDBACK_SESSION_BACKEND', 'sqlite')
+if session_backend not in ('sqlite', 'cookie'):
+    raise ValueError(f"Unknown session backend: {session_backend}")
+session_store = None
+if session_backend == 'sqlite':
+    session_store = SessionStore(
+        db,
+        lifetime=float(os.environ.get('FEEDBACK_SESSION_LIFETIME', 43200.0)),
+        cache_size=int(os.environ.get('FEEDBACK_SESSION_CACHE_SIZE', 4096)),
+        cache_ttl=float(os.environ.get('FEEDBACK_SESSION_CACHE_TTL', 5.0))
+    )
+    app.session_interface = ServerSideSessionInterface(
+        session_store, sweep_interval=float(os.environ.get('FEEDBACK_SESSION_SWEEP_INTERVAL', 300.0)))
+
+# Login throttling: failed attempts per client IP and per username. The memory
+# backend is per process; FEEDBACK_LOGIN_RATE_LIMIT=sqlite shares the counters
+# between server workers, =off disables throttling
+rate_limit_backend = os.environ.get('FEEDBACK_LOGIN_RATE_LIMIT', 'memory')
+if rate_limit_backend not in ('memory', 'sqlite', 'off'):
+    raise ValueError(f"Unknown login rate limit backend: {rate_limit_backend}")
+login_throttle = None
+if rate_limit_backend != 'off':
+    login_throttle = LoginThrottle(
+        SQLiteRateLimiter(db) if rate_limit_backend == 'sqlite'
+        else MemoryRateLimiter(max_keys=int(os.environ.get('FEEDBACK_RATE_LIMIT_MAX_KEYS', 100000))),
+        per_ip=RateLimit(int(os.environ.get('FEEDBACK_LOGIN_IP_LIMIT', 20)),
+                         float(os.environ.get('FEEDBACK_LOGIN_IP_WINDOW', 60.0))),
+        per_username=RateLimit(int(os.environ.get('FEEDBACK_LOGIN_USER_LIMIT', 10)),
+                               float(os.environ.get('FEEDBACK_LOGIN_USER_WINDOW', 300.0)))
+    )
+
+# Optional write-behind mode: submissions are group-committed by a writer thread
+submission_queue = None
+if os.environ.get('FEEDBACK_WRITE_BEHIND') == '1':
+    submission_queue = WriteBehindQueue(
+        db,
+        max_batch=int(os.environ.get('FEEDBACK_WRITE_BATCH', 100)),
+        max_delay=float(os.environ.get('FEEDBACK_WRITE_DELAY', 0.05)),
+        maxsize=int(os.environ.get('FEEDBACK_WRITE_QUEUE_SIZE', 10000))
+    )
+    # Flush queued submissions on clean shutdown
+    atexit.register(submission_queue.close)
+
+# Request/query metrics for /metrics and the opt-in slow-request log
+slow_request_ms = os.environ.get('FEEDBACK_SLOW_REQUEST_MS')
+# Streams stay open for minutes; their duration says nothing about latency
+instrumentation = Instrumentation(slow_request_ms=float(slow_request_ms) if slow_request_ms else None,
+                                  untimed_endpoints=('/admin/stream',))
+instrumentation.init_app(app)
+instrumentation.instrument_database(db)
+instrumentation.instrument_cache(dashboard_cache, 'feedback_dashboard_cache')
+instrumentation.instrument_cache(analytics.cache, 'feedback_report_cache')
+instrumentation.instrument_stream(feedback_broker)
+if db.replica is not None:
+    instrumentation.instrument_replica(db.replica)
+if db.retention is not None:
+    instrumentation.instrument_retention(db.retention)
+if submission_queue is not None:
+    instrumentation.instrument_queue(submission_queue)
+if session_store is not None:
+    instrumentation.instrument_sessions(session_store)
+if login_throttle is not None:
+    instrumentation.instrument_login_throttle(login_throttle)
+
+# Opt-in stack sampling of live requests: FEEDBACK_PROFILE_SAMPLE_RATE of all
+# requests, plus ones an admin marks; results are at /admin/profiles
+profiler = RequestProfiler(
+    sample_rate=float(os.environ.get('FEEDBACK_PROFILE_SAMPLE_RATE', 0.0)),
+    interval=float(os.environ.get('FEEDBACK_PROFILE_INTERVAL', 0.005)),
+    max_profiles=int(os.environ.get('FEEDBACK_PROFILE_RING_SIZE', 50))
+)
+
+def profile_requested():
+    """An admin's ?profile=1 request, or any request carrying X-Profile-Token: FEEDBACK_PROFILE_TOKEN"""
+    if request.args.get('profile') == '1' and session.get('role') == 'admin':
+        return True
+    token = os.environ.get('FEEDBACK_PROFILE_TOKEN')
+    # Constant-time, so the token can't be guessed from response times; bytes,
+    # because compare_digest() rejects non-ASCII str
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Profile-Token', '').encode(), token.encode())
+
+profiler.init_app(app, marked=profile_requested)
+instrumentation.instrument_profiler(profiler)
+
+def rotate_session():
+    """Move a server-side session to a fresh id (no-op for cookie sessions)"""
+    if hasattr(session, 'regenerate'):
+        session.regenerate()
 
 @app.route('/')
 def index():
@@ -20,10 +186,22 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
+        # Turn bursts away before they reach the database or the password hasher
+        retry_after = login_throttle.acquire(request.remote_addr, username) if login_throttle else 0
+        if retry_after:
+            flash(f'Too many login attempts, please try again in {math.ceil(retry_after)} seconds', 'error')
+            response = make_response(render_template('login.html'), 429)
+            response.headers['Retry-After'] = str(math.ceil(retry_after))
+            return response
+        
         try:
             user = db.authenticate_user(username, password)
             
             if user:
+                if login_throttle:
+                    login_throttle.succeeded(request.remote_addr, username)
+                # A session id handed out before login must not carry the login
+                rotate_session()
                 session['username'] = user[0]
                 session['role'] = user[1]
                 
@@ -37,7 +215,7 @@ def login():
                 
         except Exception as e:
             flash('Login error occurred', 'error')
-            print(f"Login error: {e}")
+            instrumentation.record_error('login', e)
     
     return render_template('login.html')
 
@@ -53,36 +231,270 @@ def feedback_form():
         
         try:
             rating = int(rating)
-            db.submit_feedback(session['username'], feedback_text, rating)
+            if submission_queue is not None:
+                # Wait for the group commit, so a dropped repeat is reported like below
+                submission_queue.submit(session['username'], feedback_text, rating).result()
+            else:
+                db.submit_feedback(session['username'], feedback_text, rating)
             flash('Feedback submitted successfully!', 'success')
             return redirect(url_for('feedback_form'))
             
+        except DuplicateFeedbackError:
+            # Most likely a double click or a retried POST: the first one went through
+            flash('This feedback was already submitted.', 'info')
+            return redirect(url_for('feedback_form'))
         except ValueError as e:
             flash(str(e), 'error')
+        except QueueFullError:
+            flash('The server is busy saving feedback, please try again in a moment', 'error')
         except Exception as e:
             flash('Error submitting feedback', 'error')
-            print(f"Feedback submission error: {e}")
+            instrumentation.record_error('feedback', e)
     
-    return render_template('feedback.html', username=session['username'])
+    try:
+        my_feedback = db.get_student_feedback(session['username'], page_size=10,
+                                              cursor=request.args.get('cursor'))
+    except ValueError:
+        my_feedback = db.get_student_feedback(session['username'], page_size=10)
+    return render_template('feedback.html', username=session['username'],
+                           my_feedback=my_feedback.rows, next_cursor=my_feedback.next_cursor,
+                           my_counts=db.get_student_counts(session['username']))
+
+# Query-string filters accepted by the admin dashboard
+ADMIN_FILTER_ARGS = ('q', 'rating', 'student', 'date_from', 'date_to', 'sort', 'order', 'page_size')
+EXPORT_FILTER_ARGS = ('rating', 'student', 'date_from', 'date_to')
+SEARCH_FILTER_ARGS = ('rating', 'student', 'date_from', 'date_to', 'page_size')
+
+def get_admin_filters():
+    """Read the non-empty dashboard filters from the query string"""
+    return {name: request.args[name] for name in ADMIN_FILTER_ARGS if request.args.get(name)}
+
+@app.template_filter('highlight')
+def highlight_snippet(snippet):
+    """Escape a search snippet and mark up the matched terms"""
+    return Markup(str(escape(snippet)).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+# Changes when the dashboard templates or the asset URLs they embed do, so a deploy retires old ETags
+DASHBOARD_TEMPLATE_STAMP = ':'.join(
+    [str(os.stat(os.path.join(app.root_path, app.template_folder, name)).st_mtime_ns)
+     for name in ('base.html', 'admin.html')] + [assets.stamp])
+
+def dashboard_etag(version):
+    """ETag for the dashboard this admin requested at this feedback version"""
+    key = f"{DASHBOARD_TEMPLATE_STAMP}:{version}:{session['username']}:{request.query_string.decode()}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def dashboard_response(html, etag, last_modified):
+    """Wrap dashboard HTML with validators; answers 304 if the browser's copy is current"""
+    response = make_response(html)
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    # Browsers must revalidate, which costs one conditional request
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @app.route('/admin')
 def admin_dashboard():
-    """Admin dashboard to view all feedback"""
+    """Admin dashboard to view or search feedback one page at a time"""
     if 'username' not in session or session.get('role') != 'admin':
         return redirect(url_for('login'))
     
+    # The page, its stats and its ETag all come from one replica snapshot
+    with db.reporting():
+        return render_admin_dashboard()
+
+def render_admin_dashboard():
+    """Serve the dashboard from the cache or render it; called inside db.reporting()"""
+    version, last_modified = db.get_feedback_version()
+    etag = dashboard_etag(version)
+    # Pending flash messages are shown once, so such pages are never cached
+    cacheable = not session.get('_flashes')
+    if cacheable:
+        if request.if_none_match.contains_weak(etag):
+            return dashboard_response('', etag, last_modified)
+        html = dashboard_cache.get(etag)
+        if html is not MISSING:
+            return dashboard_response(html, etag, last_modified)
+    
+    filters = get_admin_filters()
+    cursor = request.args.get('cursor')
     try:
-        feedback_list = db.get_all_feedback()
-        return render_template('admin.html', feedback_list=feedback_list)
+        stats = db.get_feedback_stats()
+        if filters.get('q'):
+            # Search results are ranked by relevance, so sort/order do not apply
+            page = db.search_feedback(filters['q'], cursor=cursor,
+                                      **{name: value for name, value in filters.items()
+                                         if name in SEARCH_FILTER_ARGS})
+        else:
+            page = db.get_feedback_page(cursor=cursor,
+                                        **{name: value for name, value in filters.items() if name != 'q'})
+        # Only the first page of the newest-first listing takes live rows from /admin/stream
+        live = (not cursor and set(filters) <= {'page_size', 'sort', 'order'}
+                and filters.get('sort', 'date') == 'date' and filters.get('order', 'desc') == 'desc')
+        html = render_template('admin.html', feedback_list=page.rows, stats=stats,
+                               next_cursor=page.next_cursor, filters=filters,
+                               search_available=db.search_available,
+                               stream_after=db.get_last_feedback_id() if live else None)
+        if cacheable:
+            dashboard_cache.set(etag, html)
+            return dashboard_response(html, etag, last_modified)
+        return html
+    except ValueError as e:
+        flash(str(e), 'error')
     except Exception as e:
         flash('Error loading feedback', 'error')
-        print(f"Admin dashboard error: {e}")
-        return render_template('admin.html', feedback_list=[])
+        instrumentation.record_error('admin_dashboard', e)
+    return render_template('admin.html', feedback_list=[], stats=None, next_cursor=None, filters=filters,
+                           search_available=db.search_available)
+
+@app.route('/admin/stream')
+def admin_stream():
+    """Server-Sent Events feed of feedback submitted after Last-Event-ID (or ?after=)"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return 'Admin login required', 401
+    
+    # EventSource sends the id of the last event it saw when it reconnects
+    raw = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        after = int(raw) if raw else db.get_last_feedback_id()
+    except ValueError:
+        return 'Invalid feedback id', 400
+    if after < 0:
+        return 'Invalid feedback id', 400
+    
+    # Subscribe before answering, so a full broker gets a 503 rather than an empty stream
+    try:
+        subscription = feedback_broker.subscribe()
+    except TooManySubscribersError:
+        return 'Too many live feeds open, try again later', 503, {'Retry-After': str(int(STREAM_HEARTBEAT))}
+    events = feedback_stream(db, subscription, after, heartbeat=STREAM_HEARTBEAT, max_age=STREAM_MAX_AGE)
+    response = Response(stream_with_context(events), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Give the slot back even if the stream is never iterated
+    response.call_on_close(subscription.close)
+    return response
+
+# Bounds and defaults of the reports page's query arguments
+REPORT_ARGS = {'weeks': (26, 520), 'terms': (15, 100)}
+
+def get_report_args():
+    """Read the reports page's weeks and terms, raising ValueError when out of range"""
+    values = {}
+    for name, (default, maximum) in REPORT_ARGS.items():
+        raw = request.args.get(name)
+        try:
+            value = int(raw) if raw else default
+        except ValueError:
+            value = 0
+        if not 1 <= value <= maximum:
+            raise ValueError(f"{name.capitalize()} must be between 1 and {maximum}")
+        values[name] = value
+    return values
+
+@app.route('/admin/reports')
+def admin_reports():
+    """Weekly rating trend, ratings per student cohort and top terms by rating"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    try:
+        args = get_report_args()
+    except ValueError as e:
+        flash(str(e), 'error')
+        args = {name: default for name, (default, _) in REPORT_ARGS.items()}
+    limits = {'max_weeks': REPORT_ARGS['weeks'][1], 'max_terms': REPORT_ARGS['terms'][1]}
+    try:
+        reports = analytics.reports(**args)
+    except Exception as e:
+        flash('Error computing reports', 'error')
+        instrumentation.record_error('admin_reports', e)
+        reports = None
+    return render_template('reports.html', reports=reports, **args, **limits)
+
+@app.route('/admin/export')
+def export_feedback_download():
+    """Stream all (filtered) feedback as a CSV or NDJSON download"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    fmt = request.args.get('format', 'csv')
+    filters = {name: value for name, value in get_admin_filters().items() if name in EXPORT_FILTER_ARGS}
+    progress = ExportProgress()
+    try:
+        chunks = export_feedback(db, fmt, progress=progress, **filters)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_dashboard', **filters))
+    
+    def generate():
+        with db.reporting():
+            yield from chunks
+        app.logger.info("Exported %d feedback rows as %s in %.2fs (%.0f rows/s)",
+                        progress.rows, fmt, progress.elapsed, progress.rows_per_second)
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"feedback-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """Recent request profiles and per-route sample totals"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    return render_template('profiles.html', profiles=profiler.recent_profiles(),
+                           routes=profiler.route_profiles(), sample_rate=profiler.sample_rate,
+                           interval=profiler.interval)
+
+@app.route('/admin/profiles/<int:profile_id>.txt')
+def download_profile(profile_id):
+    """One recent profile as collapsed stacks"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return Response('Profile no longer kept\n', status=404, mimetype='text/plain')
+    return Response(profile.collapsed(), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.txt"'})
+
+@app.route('/admin/profiles/routes.txt')
+def download_route_profiles():
+    """Collapsed stacks of every profile of ?route= (default: all routes, each under its own frame)"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    route = request.args.get('route')
+    stacks = profiler.collapsed(route)
+    if stacks is None:
+        return Response('No profiles of this route\n', status=404, mimetype='text/plain')
+    return Response(stacks, mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename="profiles.txt"'})
+
+@app.route('/admin/profiles/reset', methods=['POST'])
+def reset_profiles():
+    """Forget the kept profiles and route totals"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    profiler.reset()
+    flash('Profiles cleared', 'info')
+    return redirect(url_for('admin_profiles'))
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics; set FEEDBACK_METRICS_TOKEN to require a bearer token"""
+    token = os.environ.get('FEEDBACK_METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(instrumentation.registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/logout')
 def logout():
     """Logout user"""
     session.clear()
+    rotate_session()
     flash('You have been logged out', 'info')
     return redirect(url_for('login'))
 
@@ -98,6 +510,5 @@ def internal_error(error):
     return redirect(url_for('login'))
 
 if __name__ == '__main__':
-    # Ensure database is initialized
-    db.init_database()
+    logging.basicConfig(level=logging.INFO)
     app.run(debug=True, port=5000)
\ No newline at end of file
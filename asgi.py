@@ -0,0 +1,21 @@
+"""ASGI entry point for the JSON API.
+
+Serve it with any ASGI server, for example:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+The API shares the Flask app's database, write-behind queue, secret key,
+login throttle and metrics, all configured through the same environment variables. The HTML
+pages are still served by the WSGI app in app.py.
+"""
+import os
+
+from api import AsyncDatabase, FeedbackApi
+from app import app, db, instrumentation, login_throttle, submission_queue
+
+async_db = AsyncDatabase(db, submission_queue,
+                         workers=int(os.environ.get('FEEDBACK_API_DB_WORKERS', 0)) or None)
+
+application = FeedbackApi(async_db, app.secret_key,
+                          token_max_age=int(os.environ.get('FEEDBACK_API_TOKEN_MAX_AGE', 3600)),
+                          instrumentation=instrumentation, login_throttle=login_throttle)
@@ -0,0 +1,244 @@
+"""Fingerprinted, precompressed static assets.
+
+build_assets() copies every file in static/ to an output directory under a
+name that contains a hash of its content (style.css -> style.3f9c0e1a2b4d.css)
+and writes gzip and, when the brotli package is installed, brotli variants
+next to it. manifest.json maps each source name to its fingerprinted file.
+
+The build is a deploy step (python manage.py build-assets), never done on
+import. StaticAssets serves its files from memory at /assets/<name>. A URL
+changes whenever the content does, so responses can be cached by browsers
+and proxies for a year without revalidation. Templates link to them with
+asset_url('style.css'), which falls back to the plain /static URL when there
+is no build.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+
+from flask import Response, abort, request, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip variants only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+FINGERPRINT_LENGTH = 12
+# Files worth compressing; images and fonts are compressed already
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Preferred first when the browser accepts both equally
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _compressors():
+    compressors = {'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors['br'] = lambda data: brotli.compress(data, quality=11)
+    return compressors
+
+
+def fingerprinted_name(name, digest):
+    """style.css -> style.<first FINGERPRINT_LENGTH hex digits of digest>.css"""
+    root, extension = os.path.splitext(name)
+    return f'{root}.{digest[:FINGERPRINT_LENGTH]}{extension}'
+
+
+def source_files(source_dir, output_dir):
+    """Source name -> path of every file in source_dir, skipping dotfiles and output_dir"""
+    output_dir = os.path.abspath(output_dir)
+    files = {}
+    for root, dirs, names in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs
+                         if not d.startswith('.') and os.path.abspath(os.path.join(root, d)) != output_dir)
+        for name in sorted(names):
+            if not name.startswith('.'):
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, source_dir).replace(os.sep, '/')] = path
+    return files
+
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_manifest(output_dir):
+    """Return the manifest in output_dir, or None if there is no usable one"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('format') != MANIFEST_FORMAT:
+        return None
+    return manifest
+
+
+def manifest_is_current(source_dir, output_dir):
+    """True if output_dir holds a build of exactly the current source files"""
+    manifest = read_manifest(output_dir)
+    if manifest is None:
+        return False
+    sources = source_files(source_dir, output_dir)
+    if set(sources) != set(manifest['assets']):
+        return False
+    for name, path in sources.items():
+        entry = manifest['assets'][name]
+        if _digest(path) != entry['sha256'] or not os.path.exists(os.path.join(output_dir, entry['path'])):
+            return False
+    return True
+
+
+def build_assets(source_dir, output_dir):
+    """Write fingerprinted copies and compressed variants of source_dir's files; returns the manifest.
+
+    Files from earlier builds that the new manifest doesn't list are removed.
+    """
+    compressors = _compressors()
+    previous = read_manifest(output_dir)
+    assets = {}
+    written = set()
+
+    for name, path in source_files(source_dir, output_dir).items():
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        target = fingerprinted_name(name, digest)
+        variants = {'identity': data}
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            for encoding, _ in ENCODINGS:
+                if encoding in compressors:
+                    compressed = compressors[encoding](data)
+                    # Tiny files can come out larger
+                    if len(compressed) < len(data):
+                        variants[encoding] = compressed
+
+        entry = {'path': target, 'sha256': digest, 'content_type': content_type, 'sizes': {}}
+        for encoding, body in variants.items():
+            file_name = target + dict(ENCODINGS).get(encoding, '')
+            _write_file(os.path.join(output_dir, file_name), body)
+            written.add(file_name)
+            entry['sizes'][encoding] = len(body)
+        assets[name] = entry
+
+    manifest = {'format': MANIFEST_FORMAT, 'assets': assets}
+    _write_file(os.path.join(output_dir, MANIFEST_NAME),
+                json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    if previous is not None:
+        for file_name in set(_output_files(previous)) - written:
+            try:
+                os.remove(os.path.join(output_dir, file_name))
+            except FileNotFoundError:
+                pass
+    return manifest
+
+
+def _output_files(manifest):
+    """Every file a manifest's build wrote, besides the manifest"""
+    suffixes = dict(ENCODINGS)
+    return [entry['path'] + suffixes.get(encoding, '')
+            for entry in manifest['assets'].values() for encoding in entry['sizes']]
+
+
+def _write_file(path, data):
+    """Write data to path atomically, so a running server never reads half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class StaticAssets:
+    """Serve a build_assets() output directory with immutable caching and Accept-Encoding negotiation.
+
+    Only reads the directory: run `python manage.py build-assets` to write it.
+    asset_url() falls back to the plain /static URL for files the manifest
+    doesn't know, e.g. when nothing was built yet.
+    """
+
+    def __init__(self, app=None, source_dir=None, output_dir=None):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        # source name -> fingerprinted name
+        self.urls = {}
+        # fingerprinted name -> (content type, {encoding: body}, sha256)
+        self.files = {}
+        # Changes whenever any asset URL does; pages embedding the URLs can key caches on it
+        self.stamp = ''
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.source_dir is None:
+            self.source_dir = app.static_folder
+        if self.output_dir is None:
+            self.output_dir = os.path.join(app.static_folder, 'dist')
+        self.load()
+        app.add_url_rule('/assets/<path:filename>', 'asset', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    def load(self):
+        """Read the output directory's manifest and files into memory"""
+        manifest = read_manifest(self.output_dir)
+        if manifest is None:
+            logger.info("No static asset build in %s, serving static/ unversioned "
+                        "(run `python manage.py build-assets`)", self.output_dir)
+            manifest = {'assets': {}}
+        elif not manifest_is_current(self.source_dir, self.output_dir):
+            logger.warning("Static asset build in %s is out of date; run `python manage.py build-assets`",
+                           self.output_dir)
+
+        urls, files = {}, {}
+        for name, entry in manifest['assets'].items():
+            variants = {}
+            try:
+                for encoding in entry['sizes']:
+                    path = os.path.join(self.output_dir, entry['path'] + dict(ENCODINGS).get(encoding, ''))
+                    with open(path, 'rb') as f:
+                        variants[encoding] = f.read()
+            except OSError:
+                continue
+            urls[name] = entry['path']
+            files[entry['path']] = (entry['content_type'], variants, entry['sha256'])
+        self.urls, self.files = urls, files
+        self.stamp = hashlib.sha256(json.dumps(sorted(urls.items())).encode()).hexdigest()[:16]
+
+    def url(self, name):
+        """URL of a static file: its fingerprinted /assets URL if it was built"""
+        fingerprinted = self.urls.get(name)
+        if fingerprinted is None:
+            return url_for('static', filename=name)
+        return url_for('asset', filename=fingerprinted)
+
+    def serve(self, filename):
+        """Send the best encoding the browser accepts"""
+        asset = self.files.get(filename)
+        if asset is None:
+            abort(404)
+        content_type, variants, digest = asset
+
+        encoding = 'identity'
+        best = 0
+        for candidate, _ in ENCODINGS:
+            quality = request.accept_encodings[candidate]
+            if candidate in variants and quality > best:
+                encoding, best = candidate, quality
+
+        response = Response(variants[encoding], content_type=content_type)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.set_etag(f'{digest[:FINGERPRINT_LENGTH]}-{encoding}')
+        return response.make_conditional(request)
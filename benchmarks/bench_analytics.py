@@ -0,0 +1,119 @@
+"""Vectorized feedback reports vs. Python loops over get_all_feedback() rows.
+
+Builds a temporary database per row count and computes the same reports
+(weekly rating trend, ratings per student cohort, top terms in low- and
+high-rated feedback) twice: with loops and Counters over the row tuples,
+and with the NumPy engine in analytics.py. Checks that both agree, then
+reports the time of each, plus a cached repeat of the engine.
+
+    python benchmarks/bench_analytics.py --rows 100000 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from analytics import (HIGH_RATINGS, LOW_RATINGS, MIN_TERM_LENGTH, STOPWORDS, TOKEN_PATTERN,
+                       FeedbackAnalytics)
+from bench_search import make_text
+from database import Database
+from passwords import PasswordEngine
+
+
+def populate(db, rows, batch_size=10000):
+    """Two years of feedback from 2000 students who join over time"""
+    rng = random.Random(42)
+    start = date(2023, 1, 2)
+    for first in range(0, rows, batch_size):
+        batch = []
+        for i in range(first, min(first + batch_size, rows)):
+            day = start + timedelta(days=i * 730 // rows)
+            student = rng.randrange(max(2000 * i // rows, 1) + 1)
+            batch.append((f'student{student}', make_text(rng, i), rng.choice((1, 2, 3, 4, 4, 5, 5)),
+                          f'{day.isoformat()} {i % 24:02d}:{i % 60:02d}:00'))
+        db.bulk_insert_feedback(batch)
+
+
+def loop_reports(db, weeks, terms):
+    """The same reports computed row by row in Python"""
+    weekly = defaultdict(lambda: [0] * 5)
+    first_seen = {}
+    low, high = Counter(), Counter()
+    rows = db.get_all_feedback()
+    for _, student, text, rating, submitted in rows:
+        day = date.fromisoformat(submitted[:10])
+        weekly[day - timedelta(days=day.weekday())][rating - 1] += 1
+        if student not in first_seen or day < first_seen[student]:
+            first_seen[student] = day
+        words = {word for word in TOKEN_PATTERN.findall(text.casefold())
+                 if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS}
+        if rating in LOW_RATINGS:
+            low.update(words)
+        elif rating in HIGH_RATINGS:
+            high.update(words)
+
+    cohorts = defaultdict(lambda: [0] * 5)
+    for _, student, _, rating, _ in rows:
+        cohorts[first_seen[student].strftime('%Y-%m')][rating - 1] += 1
+
+    last = max(weekly)
+    trend = []
+    for n in range(weeks - 1, -1, -1):
+        week = last - timedelta(weeks=n)
+        if week >= min(weekly):
+            trend.append((week, tuple(weekly[week]) if week in weekly else (0,) * 5))
+
+    def top(counts):
+        return [word for word, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:terms]]
+
+    return trend, sorted((name, tuple(histogram)) for name, histogram in cohorts.items()), top(low), top(high)
+
+
+def engine_reports(analytics, weeks, terms):
+    reports = analytics.reports(weeks=weeks, terms=terms)
+    return ([(week.week, week.histogram) for week in reports.weekly],
+            [(cohort.cohort, cohort.histogram) for cohort in reports.cohorts],
+            [term.term for term in reports.low_terms], [term.term for term in reports.high_terms])
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000], help='feedback rows to generate')
+    parser.add_argument('--weeks', type=int, default=26)
+    parser.add_argument('--terms', type=int, default=15)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'python loops':>14} {'numpy cold':>12} {'numpy cached':>14} {'speedup':>8}  agree")
+    for rows in args.rows:
+        tmp_dir = tempfile.mkdtemp()
+        db = Database(os.path.join(tmp_dir, 'bench.db'), password_engine=PasswordEngine(iterations=1000))
+        try:
+            populate(db, rows)
+            analytics = FeedbackAnalytics(db)
+            expected, loop_ms = timed(lambda: loop_reports(db, args.weeks, args.terms))
+            actual, cold_ms = timed(lambda: engine_reports(analytics, args.weeks, args.terms))
+            _, cached_ms = timed(lambda: engine_reports(analytics, args.weeks, args.terms))
+            # Hashed term buckets can merge rare terms; the top of the lists doesn't collide in practice
+            print(f"{rows:>9} {loop_ms:>12.0f}ms {cold_ms:>10.0f}ms {cached_ms:>12.2f}ms "
+                  f"{loop_ms / cold_ms:>7.1f}x  {'yes' if actual == expected else 'NO'}")
+        finally:
+            db.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
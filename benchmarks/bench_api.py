@@ -0,0 +1,129 @@
+"""Async JSON API vs. the sync Flask routes at increasing concurrency.
+
+Both stacks run in-process against the same temporary database, so the
+numbers compare request handling rather than network or server overhead:
+the Flask routes are driven by one thread per client through the test
+client, the ASGI API by one coroutine per client on a single event loop.
+Each client submits feedback and then lists the newest page, in a loop.
+
+    python benchmarks/bench_api.py --duration 5 --clients 8 64 512
+
+To benchmark over real sockets, serve asgi:application with an ASGI server
+(e.g. uvicorn) and app:app with a WSGI server and point a load generator at
+both.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from loadtest import percentile
+
+
+def report(name, clients, latencies, elapsed):
+    for op in ('submit', 'list'):
+        values = latencies[op]
+        print(f"{name:<6} {clients:>7} {op:<7} {len(values) / elapsed:>9.1f} "
+              f"{percentile(values, 0.50) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f}")
+
+
+def run_flask(app, clients, duration):
+    latencies = {'submit': [], 'list': []}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client(number):
+        student = app.test_client()
+        student.post('/login', data={'username': 'student1', 'password': 'password123'})
+        admin = app.test_client()
+        admin.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        local = {'submit': [], 'list': []}
+        n = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            student.post('/feedback', data={'feedback_text': f'Flask {number}-{n}', 'rating': '4'})
+            local['submit'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            admin.get('/admin')
+            local['list'].append(time.perf_counter() - started)
+            n += 1
+        with lock:
+            for op, values in local.items():
+                latencies[op].extend(values)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+async def run_asgi(api, clients, duration):
+    # Reuse the ASGI test helper rather than duplicating the protocol plumbing
+    from tests.test_api import call
+
+    latencies = {'submit': [], 'list': []}
+    _, body = await call(api, 'POST', '/api/login', {'username': 'student1', 'password': 'password123'})
+    student = body['token']
+    _, body = await call(api, 'POST', '/api/login', {'username': 'admin', 'password': 'admin123'})
+    admin = body['token']
+    deadline = time.perf_counter() + duration
+
+    async def client(number):
+        n = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await call(api, 'POST', '/api/feedback', {'feedback_text': f'ASGI {number}-{n}', 'rating': 4},
+                       token=student)
+            latencies['submit'].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await call(api, 'GET', '/api/feedback', token=admin)
+            latencies['list'].append(time.perf_counter() - started)
+            n += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--clients', type=int, nargs='+', default=[8, 64, 512], help='concurrent clients')
+    parser.add_argument('--stacks', nargs='+', choices=('flask', 'asgi'), default=['flask', 'asgi'])
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['FEEDBACK_DB_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+    from app import app, db
+    from api import AsyncDatabase, FeedbackApi
+
+    async_db = AsyncDatabase(db)
+    api = FeedbackApi(async_db, app.secret_key)
+    try:
+        print(f"{'stack':<6} {'clients':>7} {'op':<7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for clients in args.clients:
+            if 'flask' in args.stacks:
+                report('flask', clients, *run_flask(app, clients, args.duration))
+            if 'asgi' in args.stacks:
+                report('asgi', clients, *asyncio.run(run_asgi(api, clients, args.duration)))
+    finally:
+        async_db.close()
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
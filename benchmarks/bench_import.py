@@ -0,0 +1,82 @@
+"""Bulk import vs. row-at-a-time submit_feedback benchmark.
+
+Generates a CSV of synthetic archived feedback and loads it into fresh
+temporary databases, once through submit_feedback and once through
+importer.import_feedback at several batch sizes.
+
+    python benchmarks/bench_import.py --rows 20000 --batch-sizes 100 1000 5000
+"""
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from importer import import_feedback
+
+
+def write_csv(path, rows):
+    """Write synthetic feedback rows to a CSV file"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('student_username', 'feedback_text', 'rating', 'submission_date'))
+        for i in range(rows):
+            writer.writerow((f'student{i % 500}', f'Archived feedback number {i} about the course',
+                             i % 5 + 1, f'2023-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00'))
+
+
+def time_row_at_a_time(tmp_dir, rows, storage_profile):
+    """Load rows with one submit_feedback (and one commit) each"""
+    db = Database(os.path.join(tmp_dir, 'row.db'), storage_profile=storage_profile)
+    try:
+        started = time.perf_counter()
+        for i in range(rows):
+            db.submit_feedback(f'student{i % 500}', f'Archived feedback number {i} about the course', i % 5 + 1)
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def time_bulk(tmp_dir, csv_path, batch_size, storage_profile):
+    """Load the CSV through the bulk importer"""
+    db = Database(os.path.join(tmp_dir, f'bulk-{batch_size}.db'), storage_profile=storage_profile)
+    try:
+        report = import_feedback(db, csv_path, batch_size=batch_size)
+        return report.elapsed
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--storage-profile', default='default')
+    parser.add_argument('--skip-row-at-a-time', action='store_true',
+                        help='skip the (slow) submit_feedback baseline')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(tmp_dir, 'feedback.csv')
+        write_csv(csv_path, args.rows)
+
+        print(f"{'method':<24} {'seconds':>9} {'rows/s':>10}")
+        if not args.skip_row_at_a_time:
+            elapsed = time_row_at_a_time(tmp_dir, args.rows, args.storage_profile)
+            print(f"{'submit_feedback':<24} {elapsed:>9.2f} {args.rows / elapsed:>10.0f}")
+        for batch_size in args.batch_sizes:
+            elapsed = time_bulk(tmp_dir, csv_path, batch_size, args.storage_profile)
+            print(f"{f'import (batch={batch_size})':<24} {elapsed:>9.2f} {args.rows / elapsed:>10.0f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Login throughput benchmark at several password-hashing cost settings.
+
+Each setting gets a fresh temporary database; concurrent clients then call
+Database.authenticate_user for a fixed duration. Each login hashes on its
+client thread.
+
+    python benchmarks/bench_login.py --duration 5 --clients 8
+    python benchmarks/bench_login.py --settings pbkdf2_sha256:100000 scrypt:16384
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine
+
+DEFAULT_SETTINGS = ['pbkdf2_sha256:100000', 'pbkdf2_sha256:310000', 'pbkdf2_sha256:600000',
+                    'scrypt:16384', 'scrypt:32768']
+
+
+def make_engine(setting):
+    """Build a PasswordEngine from a 'scheme:cost' string"""
+    scheme, cost = setting.split(':')
+    params = {'iterations': int(cost)} if scheme == 'pbkdf2_sha256' else {'n': int(cost)}
+    return PasswordEngine(scheme, **params)
+
+
+def run_setting(setting, duration, clients):
+    """Run concurrent logins for one cost setting and return throughput and latency"""
+    tmp_dir = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp_dir, 'bench.db'), pool_size=clients,
+                  password_engine=make_engine(setting))
+    try:
+        latencies = []
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def client():
+            local = []
+            while not stop.is_set():
+                started = time.perf_counter()
+                db.authenticate_user('student1', 'password123')
+                local.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'logins_per_sec': len(latencies) / elapsed,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        }
+    finally:
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per setting')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent login threads')
+    parser.add_argument('--settings', nargs='+', default=DEFAULT_SETTINGS, help='scheme:cost pairs')
+    args = parser.parse_args()
+
+    print(f"{'setting':<24} {'logins/s':>10} {'p50 ms':>9}")
+    for setting in args.settings:
+        result = run_setting(setting, args.duration, args.clients)
+        print(f"{setting:<24} {result['logins_per_sec']:>10.1f} {result['p50_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
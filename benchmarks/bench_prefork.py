@@ -0,0 +1,103 @@
+"""Throughput of server.py as the number of worker processes grows.
+
+For each worker count, starts server.py on a fresh temporary database and
+drives it with the load test's simulated students and admins, spread over
+several client processes so the load generator is not the bottleneck. All
+workers share one SQLite file, so reads scale with cores while writes are
+still serialized by SQLite's single writer lock.
+
+    python benchmarks/bench_prefork.py --workers 1 2 4 8 --duration 10
+    FEEDBACK_STORAGE_PROFILE=default python benchmarks/bench_prefork.py --workers 1 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from loadtest import drive, summarize
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start listening on port {port}")
+
+
+def client_process(args):
+    base_url, duration, students, admins = args
+    return drive(base_url, duration, students, admins, think_time=0.0)
+
+
+def run_workers(workers, duration, clients, students, admins):
+    """Start server.py with this many workers, load it, and return the per-route summary"""
+    tmp_dir = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(os.environ)
+    env['FEEDBACK_DB_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    env.setdefault('FEEDBACK_STORAGE_PROFILE', 'high-concurrency')
+    env.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+    server = subprocess.Popen([sys.executable, 'server.py', '--bind', f'127.0.0.1:{port}',
+                               '--workers', str(workers)],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        base_url = f'http://127.0.0.1:{port}'
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client_process, [(base_url, duration, students, admins)] * clients)
+        samples = [sample for client_samples, _ in results for sample in client_samples]
+        elapsed = max(elapsed for _, elapsed in results)
+        return summarize(samples, elapsed)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(60)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='worker counts to compare')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per worker count')
+    parser.add_argument('--clients', type=int, default=4, help='load-generating processes')
+    parser.add_argument('--students', type=int, default=8, help='simulated students per client process')
+    parser.add_argument('--admins', type=int, default=1, help='simulated admins per client process')
+    args = parser.parse_args()
+
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'workers':>7} {'total req/s':>12} {'GET /feedback p95':>18} {'POST /feedback p95':>19} "
+          f"{'GET /admin p95':>15} {'errors':>7}")
+    for workers in args.workers:
+        summary = run_workers(workers, args.duration, args.clients, args.students, args.admins)
+        total = sum(stats['rps'] for stats in summary.values())
+        errors = sum(stats['errors'] for stats in summary.values())
+
+        def p95(route):
+            return summary[route]['p95_ms'] if route in summary else 0.0
+
+        print(f"{workers:>7} {total:>12.1f} {p95('GET /feedback'):>16.1f}ms {p95('POST /feedback'):>17.1f}ms "
+              f"{p95('GET /admin'):>13.1f}ms {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
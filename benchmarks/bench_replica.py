@@ -0,0 +1,128 @@
+"""Student writes under heavy admin reads, with and without the read replica.
+
+Runs concurrent student writers (submit_feedback) and admin readers (a
+full export plus the dashboard's stats and first page, inside
+db.reporting()) against a temporary database, once reading the primary and
+once reading a snapshot replica refreshed every --refresh-interval seconds.
+Prints throughput and the writers' p99 latency for each storage profile.
+
+    python benchmarks/bench_replica.py --duration 5 --writers 4 --readers 4 --seed-rows 100000
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database, STORAGE_PROFILES
+from passwords import PasswordEngine
+
+
+def admin_read(db):
+    with db.reporting():
+        db.get_feedback_stats()
+        db.get_feedback_page(page_size=25)
+        for _ in db.iter_feedback_batches(batch_size=5000):
+            pass
+
+
+def run(profile, replica, args):
+    """Run the mixed workload once and return throughput numbers"""
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, 'bench.db')
+    db = Database(db_path, pool_size=args.writers + args.readers, storage_profile=profile,
+                  checkpoint_interval=1.0, password_engine=PasswordEngine(iterations=1000),
+                  replica_path=os.path.join(tmp_dir, 'replica.db') if replica else None,
+                  replica_refresh_interval=args.refresh_interval,
+                  replica_max_staleness=args.refresh_interval * 3)
+    try:
+        db.bulk_insert_feedback([(f'student{i % 500}', f'Seed feedback {i}', i % 5 + 1, None)
+                                 for i in range(args.seed_rows)])
+        if db.replica is not None:
+            db.replica.refresh(force=True)
+
+        latencies = []
+        counts = {'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def writer(w):
+            n = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.submit_feedback(f'student{w}', f'Benchmark feedback {w}-{n}', n % 5 + 1)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                except Exception:
+                    with lock:
+                        counts['errors'] += 1
+                n += 1
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    admin_read(db)
+                    key = 'reads'
+                except Exception:
+                    key = 'errors'
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+        threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) >= 2 else float('nan')
+        stats = db.replica.stats() if db.replica is not None else {'refreshes': 0, 'fallbacks': 0}
+        return {
+            'writes_per_sec': len(latencies) / elapsed,
+            'write_p99_ms': p99,
+            'reads_per_sec': counts['reads'] / elapsed,
+            'errors': counts['errors'],
+            'refreshes': stats['refreshes'],
+            'fallbacks': stats['fallbacks'],
+        }
+    finally:
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seed-rows', type=int, default=100000)
+    parser.add_argument('--refresh-interval', type=float, default=2.0, help='seconds between replica refreshes')
+    parser.add_argument('--profiles', nargs='+', default=list(STORAGE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<18} {'reads from':<10} {'writes/s':>10} {'write p99':>11} {'reads/s':>9} "
+          f"{'refreshes':>10} {'fallbacks':>10} {'errors':>7}")
+    for profile in args.profiles:
+        # A replica needs WAL, so other profiles only read from the primary
+        wal = STORAGE_PROFILES[profile].get('journal_mode') == 'WAL'
+        for replica in ((False, True) if wal else (False,)):
+            result = run(profile, replica, args)
+            print(f"{profile:<18} {'replica' if replica else 'primary':<10} {result['writes_per_sec']:>10.1f} "
+                  f"{result['write_p99_ms']:>9.1f}ms {result['reads_per_sec']:>9.1f} "
+                  f"{result['refreshes']:>10} {result['fallbacks']:>10} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
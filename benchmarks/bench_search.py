@@ -0,0 +1,131 @@
+"""Full-text search vs. a LIKE '%term%' scan over the feedback table.
+
+Builds a temporary database with synthetic feedback (FTS triggers on), then
+times the first page of results and the full match count for rare and
+common terms both ways.
+
+    python benchmarks/bench_search.py --rows 1000000
+    python benchmarks/bench_search.py --rows 100000 --terms calculus zyzzyva
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine
+
+COURSES = ['calculus', 'chemistry', 'databases', 'philosophy', 'statistics', 'biology',
+           'algorithms', 'economics', 'linguistics', 'astronomy']
+WORDS = ['lecture', 'homework', 'exam', 'professor', 'clear', 'confusing', 'helpful', 'slides',
+         'pace', 'labs', 'readings', 'office', 'hours', 'grading', 'project', 'tutorial',
+         'examples', 'feedback', 'workload', 'interesting', 'difficult', 'recordings']
+RARE_TERM = 'zyzzyva'
+DEFAULT_TERMS = ['calculus', 'confusing grading', RARE_TERM]
+
+
+def make_text(rng, i):
+    words = rng.choices(WORDS, k=rng.randint(6, 20))
+    words.insert(rng.randrange(len(words)), rng.choice(COURSES))
+    # A handful of rows mention a rare word
+    if i % 50000 == 0:
+        words.append(RARE_TERM)
+    return ' '.join(words).capitalize()
+
+
+def populate(db, rows, batch_size=10000):
+    rng = random.Random(42)
+    started = time.perf_counter()
+    for start in range(0, rows, batch_size):
+        db.bulk_insert_feedback([
+            (f'student{i % 500}', make_text(rng, i), i % 5 + 1, None)
+            for i in range(start, min(start + batch_size, rows))
+        ])
+    return time.perf_counter() - started
+
+
+def like_terms(term):
+    clauses = ' AND '.join('feedback_text LIKE ?' for _ in term.split())
+    return clauses, [f'%{word}%' for word in term.split()]
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+def bench_term(db, term, page_size, repeat):
+    clauses, params = like_terms(term)
+
+    def like_page():
+        with db.connection() as conn:
+            return conn.execute(f'''
+                SELECT id, student_username, feedback_text, rating, submission_date
+                FROM feedback WHERE {clauses}
+                ORDER BY submission_date DESC, id DESC LIMIT ?
+            ''', params + [page_size]).fetchall()
+
+    def like_count():
+        with db.connection() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM feedback WHERE {clauses}', params).fetchone()[0]
+
+    def fts_count():
+        with db.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM feedback_fts WHERE feedback_fts MATCH ?',
+                                (db._match_expression(term),)).fetchone()[0]
+
+    return {
+        'fts_page_ms': timed(lambda: db.search_feedback(term, page_size=page_size), repeat)[0],
+        'like_page_ms': timed(like_page, repeat)[0],
+        'fts_count': timed(fts_count, repeat),
+        'like_count': timed(like_count, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='feedback rows to generate')
+    parser.add_argument('--terms', nargs='+', default=DEFAULT_TERMS, help='search terms to time')
+    parser.add_argument('--page-size', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (median reported)')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp_dir, 'bench.db'), storage_profile='high-concurrency',
+                  password_engine=PasswordEngine(iterations=1000))
+    try:
+        elapsed = populate(db, args.rows)
+        print(f"Inserted {args.rows} rows (with FTS triggers) in {elapsed:.1f}s")
+        started = time.perf_counter()
+        db.optimize_search_index()
+        print(f"Optimized index in {time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'term':<22} {'matches':>9} {'FTS page':>10} {'LIKE page':>10} "
+              f"{'FTS count':>10} {'LIKE count':>11}")
+        for term in args.terms:
+            result = bench_term(db, term, args.page_size, args.repeat)
+            fts_count_ms, matches = result['fts_count']
+            like_count_ms, like_matches = result['like_count']
+            print(f"{term:<22} {matches:>9} {result['fts_page_ms']:>8.1f}ms {result['like_page_ms']:>8.1f}ms "
+                  f"{fts_count_ms:>8.1f}ms {like_count_ms:>9.1f}ms")
+            if matches != like_matches:
+                # LIKE is a substring match while FTS matches whole (stemmed) tokens
+                print(f"{'':<22} (LIKE matched {like_matches})")
+    finally:
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
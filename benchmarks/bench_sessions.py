@@ -0,0 +1,112 @@
+"""Per-request cost of the server-side session store vs. signed-cookie sessions.
+
+Builds a temporary database holding many sessions, then times loading a
+logged-in session (open_session) and saving it back, unchanged and
+modified (save_session), for Flask's cookie sessions and for the SQLite
+store with and without its LRU cache in front.
+
+    python benchmarks/bench_sessions.py --sessions 100000 --requests 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+from database import Database
+from loadtest import percentile
+from passwords import PasswordEngine
+from sessions import ServerSideSessionInterface, SessionStore
+
+
+def populate(store, sessions, batch_size=10000):
+    """Insert sessions for student0..studentN; returns their ids"""
+    sids = [f'bench-{i}' for i in range(sessions)]
+    expires_at = time.time() + store.lifetime
+    payload = store.serializer.dumps({'username': 'student', 'role': 'student'})
+    with store.db.connection() as conn:
+        for start in range(0, sessions, batch_size):
+            conn.executemany('INSERT INTO sessions (id, username, data, expires_at) VALUES (?, ?, ?, ?)',
+                             [(sid, f'student{i}', payload, expires_at)
+                              for i, sid in enumerate(sids[start:start + batch_size], start)])
+        conn.commit()
+    return sids
+
+
+def cookie_for(app, interface, sid):
+    """The Cookie header a browser holding this session would send"""
+    if isinstance(interface, ServerSideSessionInterface):
+        value = interface.get_signer(app).sign(sid).decode()
+    else:
+        value = interface.get_signing_serializer(app).dumps({'username': sid, 'role': 'student'})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def bench(app, interface, sids, requests, hot_sessions):
+    """Time open_session and save_session for requests drawn from hot_sessions active users"""
+    rng = random.Random(7)
+    active = rng.sample(sids, hot_sessions)
+    timings = {'open': [], 'save unchanged': [], 'save modified': []}
+    for n in range(requests):
+        headers = {'Cookie': cookie_for(app, interface, rng.choice(active))}
+        with app.test_request_context('/', headers=headers) as ctx:
+            started = time.perf_counter()
+            session = interface.open_session(app, ctx.request)
+            timings['open'].append(time.perf_counter() - started)
+
+            op = 'save modified' if n % 10 == 0 else 'save unchanged'
+            if op == 'save modified':
+                session['_flashes'] = [('success', 'Feedback submitted successfully!')]
+            response = app.response_class()
+            started = time.perf_counter()
+            interface.save_session(app, session, response)
+            timings[op].append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100000, help='sessions stored in the table')
+    parser.add_argument('--requests', type=int, default=20000, help='requests timed per backend')
+    parser.add_argument('--active', type=int, default=1000, help='sessions the requests are spread over')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp_dir, 'bench.db'), storage_profile='high-concurrency',
+                  password_engine=PasswordEngine(iterations=1000))
+    app = Flask(__name__)
+    app.secret_key = 'bench-secret'
+    try:
+        started = time.perf_counter()
+        sids = populate(SessionStore(db), args.sessions)
+        print(f"Inserted {args.sessions} sessions in {time.perf_counter() - started:.1f}s\n")
+
+        backends = [
+            ('cookie', SecureCookieSessionInterface()),
+            ('sqlite, no cache', ServerSideSessionInterface(SessionStore(db, cache_size=0), sweep_interval=0)),
+            ('sqlite + LRU', ServerSideSessionInterface(SessionStore(db, cache_size=args.active * 2),
+                                                        sweep_interval=0)),
+        ]
+        print(f"{'backend':<18} {'operation':<15} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8}")
+        for name, interface in backends:
+            for op, values in bench(app, interface, sids, args.requests, args.active).items():
+                print(f"{name:<18} {op:<15} {percentile(values, 0.50) * 1e6:>8.1f} "
+                      f"{percentile(values, 0.95) * 1e6:>8.1f} {percentile(values, 0.99) * 1e6:>8.1f}")
+            if isinstance(interface, ServerSideSessionInterface) and interface.store.cache is not None:
+                stats = interface.store.cache.stats()
+                print(f"{'':<18} cache hit rate {stats['hits'] / max(stats['hits'] + stats['misses'], 1):.1%}")
+    finally:
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Mixed read/write throughput benchmark for the SQLite storage profiles.
+
+Runs concurrent student writers (submit_feedback) and admin readers
+(get_all_feedback) against a temporary database for each storage profile
+and prints operations per second.
+
+    python benchmarks/bench_storage.py --duration 5 --writers 8 --readers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database, STORAGE_PROFILES
+
+
+def run_profile(profile, duration, writers, readers, seed_rows):
+    """Run the mixed workload for one profile and return throughput numbers"""
+    tmp_dir = tempfile.mkdtemp()
+    db = Database(os.path.join(tmp_dir, 'bench.db'), pool_size=writers + readers,
+                  storage_profile=profile, checkpoint_interval=1.0)
+    try:
+        for i in range(seed_rows):
+            db.submit_feedback('student1', f'Seed feedback {i}', i % 5 + 1)
+
+        counts = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def writer(w):
+            n = 0
+            while not stop.is_set():
+                try:
+                    db.submit_feedback('student1', f'Benchmark feedback {w}-{n}', n % 5 + 1)
+                    key = 'writes'
+                except Exception:
+                    key = 'errors'
+                n += 1
+                with lock:
+                    counts[key] += 1
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    db.get_all_feedback()
+                    key = 'reads'
+                except Exception:
+                    key = 'errors'
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'profile': profile,
+            'writes_per_sec': counts['writes'] / elapsed,
+            'reads_per_sec': counts['reads'] / elapsed,
+            'errors': counts['errors'],
+            'settings': db.storage_settings,
+        }
+    finally:
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per profile')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seed-rows', type=int, default=1000)
+    parser.add_argument('--profiles', nargs='+', default=list(STORAGE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<18} {'writes/s':>10} {'reads/s':>10} {'errors':>7}")
+    for profile in args.profiles:
+        result = run_profile(profile, args.duration, args.writers, args.readers, args.seed_rows)
+        print(f"{result['profile']:<18} {result['writes_per_sec']:>10.1f} "
+              f"{result['reads_per_sec']:>10.1f} {result['errors']:>7}")
+        print(f"  settings: {result['settings']}")
+
+
+if __name__ == '__main__':
+    main()
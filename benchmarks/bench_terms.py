@@ -0,0 +1,132 @@
+"""One feedback table vs. the same feedback with cold terms archived.
+
+Builds two temporary databases with identical synthetic feedback spread
+over ten half-year terms. In the second, every term but the last is
+archived to its own file. Times the usual reads on both (first page, a
+page filtered to one old term, search, stats, a full export) and the
+maintenance that grows with the live table: VACUUM and the file size.
+
+    python benchmarks/bench_terms.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_search import make_text
+from database import Database
+from passwords import PasswordEngine
+
+TERMS = 10
+
+
+def term_ranges(first_year):
+    """(name, starts_on, ends_on) for TERMS consecutive half-year terms"""
+    ranges = []
+    for n in range(TERMS):
+        year, fall = first_year + n // 2, n % 2
+        if fall:
+            ranges.append((f'{year}-fall', f'{year}-07-01', f'{year}-12-31'))
+        else:
+            ranges.append((f'{year}-spring', f'{year}-01-01', f'{year}-06-30'))
+    return ranges
+
+
+def populate(db, rows, first_year, batch_size=10000):
+    """Spread rows evenly over the terms, oldest first"""
+    rng = random.Random(42)
+    per_term = max(rows // TERMS, 1)
+    for start in range(0, rows, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, rows)):
+            n = min(i // per_term, TERMS - 1)
+            year, month = first_year + n // 2, 1 + 6 * (n % 2) + (i % per_term) * 6 // per_term
+            batch.append((f'student{i % 500}', make_text(rng, i), i % 5 + 1,
+                          f'{year}-{month:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:00'))
+        db.bulk_insert_feedback(batch)
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def export_all(db):
+    for _ in db.iter_feedback_batches(batch_size=5000):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='feedback rows to generate')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (median reported)')
+    args = parser.parse_args()
+
+    first_year = 2020
+    ranges = term_ranges(first_year)
+    old_term = ranges[2]
+
+    tmp_dir = tempfile.mkdtemp()
+    databases = {}
+    try:
+        for name in ('single table', 'archived terms'):
+            db = Database(os.path.join(tmp_dir, name.replace(' ', '-') + '.db'),
+                          password_engine=PasswordEngine(iterations=1000))
+            for term in ranges:
+                db.define_term(*term)
+            started = time.perf_counter()
+            populate(db, args.rows, first_year)
+            print(f"{name}: inserted {args.rows} rows in {time.perf_counter() - started:.1f}s")
+            databases[name] = db
+
+        started = time.perf_counter()
+        for term in ranges[:-1]:
+            databases['archived terms'].archive_term(term[0])
+        print(f"archived terms: archived {TERMS - 1} terms in {time.perf_counter() - started:.1f}s\n")
+
+        reads = [
+            ('first page', lambda db: db.get_feedback_page(page_size=25)),
+            (f'{old_term[0]} page', lambda db: db.get_feedback_page(
+                page_size=25, date_from=old_term[1], date_to=old_term[2])),
+            ('search page', lambda db: db.search_feedback('confusing grading', page_size=25)),
+            ('stats', lambda db: db.get_feedback_stats()),
+            ('full export', export_all),
+        ]
+        names = list(databases)
+        print(f"{'operation':<22}" + ''.join(f'{name:>16}' for name in names))
+        for label, func in reads:
+            repeat = 1 if label == 'full export' else args.repeat
+            print(f"{label:<22}" + ''.join(f"{timed(lambda: func(databases[name]), repeat):>14.1f}ms"
+                                           for name in names))
+
+        sizes, vacuums = [], []
+        for name in names:
+            db = databases[name]
+            db.pool.close_idle()
+            with db.connection() as conn:
+                started = time.perf_counter()
+                conn.execute('VACUUM')
+                vacuums.append((time.perf_counter() - started) * 1000)
+            sizes.append(os.path.getsize(db.db_name) / 1024 / 1024)
+        print(f"{'main file VACUUM':<22}" + ''.join(f'{ms:>14.1f}ms' for ms in vacuums))
+        # Archiving frees pages in the main file; VACUUM hands them back
+        print(f"{'main file size':<22}" + ''.join(f'{mib:>13.1f}MiB' for mib in sizes))
+    finally:
+        for db in databases.values():
+            db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
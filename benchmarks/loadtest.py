@@ -0,0 +1,239 @@
+"""Local load test for the feedback portal.
+
+Starts the real WSGI app on a threaded local server backed by a temporary
+SQLite file, then drives it with concurrent simulated students (log in, open
+the form, submit feedback) and admins (log in, page through the dashboard).
+Reports p50/p95/p99 latency and requests per second per route.
+
+    # Record a baseline
+    python benchmarks/loadtest.py --duration 20 --students 16 --admins 2 --save baseline.json
+
+    # Later: fail (exit 1) if any route regressed by more than 20%
+    python benchmarks/loadtest.py --duration 20 --students 16 --admins 2 \\
+        --compare baseline.json --threshold 0.2
+
+Pass --url to load a server that is already running, such as server.py.
+
+Extra environment variables (e.g. FEEDBACK_STORAGE_PROFILE=high-concurrency)
+are passed through to the app, so storage and pooling changes can be compared
+run against run.
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples, elapsed):
+    """Turn (route, seconds, ok) samples into per-route statistics"""
+    routes = {}
+    for route, seconds, ok in samples:
+        entry = routes.setdefault(route, {'latencies': [], 'errors': 0})
+        entry['latencies'].append(seconds)
+        if not ok:
+            entry['errors'] += 1
+
+    summary = {}
+    for route, entry in sorted(routes.items()):
+        latencies = entry['latencies']
+        summary[route] = {
+            'requests': len(latencies),
+            'errors': entry['errors'],
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+    return summary
+
+
+def compare_results(baseline, current, threshold):
+    """List regressions where p95 latency rose or throughput fell by more than threshold"""
+    regressions = []
+    for route, base in baseline.items():
+        now = current.get(route)
+        if now is None:
+            regressions.append(f"{route}: missing from this run")
+            continue
+        if base['p95_ms'] > 0 and now['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{route}: p95 {base['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms")
+        if base['rps'] > 0 and now['rps'] < base['rps'] * (1 - threshold):
+            regressions.append(f"{route}: {base['rps']:.1f} -> {now['rps']:.1f} req/s")
+        if now['errors'] > base['errors']:
+            regressions.append(f"{route}: errors {base['errors']} -> {now['errors']}")
+    return regressions
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Measure each route on its own instead of following redirects"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    """One simulated browser session with its own cookie jar"""
+
+    def __init__(self, base_url, samples, lock):
+        self.base_url = base_url
+        self.samples = samples
+        self.lock = lock
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, route, path, data=None):
+        """Issue one request and record its latency under the route name"""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=body, timeout=30) as response:
+                response.read()
+                ok = response.status < 400
+        except urllib.error.HTTPError as e:
+            e.read()
+            # Redirects are expected responses here
+            ok = 300 <= e.code < 400
+        except OSError:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples.append((route, elapsed, ok))
+
+
+def student_session(user, stop, think_time, number):
+    user.request('POST /login', '/login', {'username': 'student1', 'password': 'password123'})
+    n = 0
+    while not stop.is_set():
+        user.request('GET /feedback', '/feedback')
+        user.request('POST /feedback', '/feedback',
+                     {'feedback_text': f'Load test feedback {number}-{n}', 'rating': str(n % 5 + 1)})
+        n += 1
+        if think_time:
+            time.sleep(random.uniform(0, think_time))
+
+
+def admin_session(user, stop, think_time, number):
+    user.request('POST /login', '/login', {'username': 'admin', 'password': 'admin123'})
+    while not stop.is_set():
+        user.request('GET /admin', '/admin')
+        user.request('GET /admin (filtered)', '/admin?rating=5&page_size=50')
+        if think_time:
+            time.sleep(random.uniform(0, think_time))
+
+
+def drive(base_url, duration, students, admins, think_time):
+    """Run the simulated users against a server for duration seconds; returns (samples, elapsed)"""
+    samples = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    sessions = [(student_session, i) for i in range(students)] + [(admin_session, i) for i in range(admins)]
+    threads = [threading.Thread(target=session, args=(VirtualUser(base_url, samples, lock), stop, think_time, i))
+               for session, i in sessions]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def run(duration, students, admins, think_time, seed_rows):
+    """Run the load test against a fresh temporary database and return the summary"""
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['FEEDBACK_DB_PATH'] = os.path.join(tmp_dir, 'loadtest.db')
+    # Importing the app creates its Database on the temporary file
+    from app import app, db
+    from werkzeug.serving import make_server
+
+    # Keep the per-request access log out of the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    if seed_rows:
+        db.bulk_insert_feedback([('student1', f'Seed feedback {i}', i % 5 + 1, None) for i in range(seed_rows)])
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        samples, elapsed = drive(f'http://127.0.0.1:{server.server_port}', duration, students, admins, think_time)
+    finally:
+        server.shutdown()
+        db.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return summarize(samples, elapsed)
+
+
+def print_summary(summary):
+    print(f"{'route':<22} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in summary.items():
+        print(f"{route:<22} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to run')
+    parser.add_argument('--students', type=int, default=16, help='concurrent simulated students')
+    parser.add_argument('--admins', type=int, default=2, help='concurrent simulated admins')
+    parser.add_argument('--think-time', type=float, default=0.0, help='max random pause between actions')
+    parser.add_argument('--seed-rows', type=int, default=1000, help='feedback rows loaded before the run')
+    parser.add_argument('--url', help='load an already running server (e.g. server.py) instead')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    if args.url:
+        samples, elapsed = drive(args.url.rstrip('/'), args.duration, args.students, args.admins, args.think_time)
+        summary = summarize(samples, elapsed)
+    else:
+        summary = run(args.duration, args.students, args.admins, args.think_time, args.seed_rows)
+    print_summary(summary)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'routes': summary}, f, indent=2)
+        print(f"Results saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['routes']
+        regressions = compare_results(baseline, summary, args.threshold)
+        if regressions:
+            print(f"\nREGRESSIONS (threshold {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
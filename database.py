@@ -1,115 +1,1370 @@
-
 import sqlite3
+import base64
+import functools
 import hashlib
-from datetime import datetime
+import heapq
+import json
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import chain, islice
+
+import migrations
+from passwords import PasswordEngine
+from replica import ReplicaRefresher, SnapshotReplica
+from retention import RetentionManager, RetentionScheduler
+from terms import TermCatalog, aggregate_feedback, merge_aggregates
+
+logger = logging.getLogger(__name__)
+
+# Connection-level PRAGMA profiles; 'default' keeps SQLite's own settings
+STORAGE_PROFILES = {
+    'default': {},
+    'high-concurrency': {
+        # Readers no longer block on the writer and commits append to the WAL
+        'journal_mode': 'WAL',
+        # NORMAL is durable in WAL mode except for the last commits on power loss
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,  # ~16 MiB page cache per connection
+        'mmap_size': 134217728,  # 128 MiB
+        'temp_store': 'MEMORY',
+        # The background checkpointer does the regular work; this is a safety net
+        'wal_autocheckpoint': 10000,
+    },
+}
+
+# Storage PRAGMAs that only matter to a database being written (skipped on the replica)
+WRITE_PRAGMAS = ('journal_mode', 'synchronous', 'wal_autocheckpoint')
+
+# Keyset columns for each admin sort order; the trailing id breaks ties
+FEEDBACK_SORT_KEYS = {
+    'date': ('submission_date', 'id'),
+    'rating': ('rating', 'submission_date', 'id'),
+}
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+FeedbackPage = namedtuple('FeedbackPage', ['rows', 'next_cursor'])
+
+# Control characters wrapped around matched terms in search snippets; the
+# template escapes the snippet first and then turns them into <mark> tags
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_TOKENS = 12
+MAX_SEARCH_TERMS = 16
+
+# Identical feedback from one student within this many seconds is a retried submission
+DEFAULT_DUPLICATE_WINDOW = 600.0
+# Rows hashed or deleted per transaction by deduplicate_feedback
+DEDUP_BATCH_SIZE = 5000
+
+# Inserts a row unless its content hash already has a row within the
+# duplicate window of its submission date: one range probe on
+# idx_feedback_duplicates. The statement takes the write lock before it
+# reads, so concurrent retries can't both pass the probe.
+INSERT_UNLESS_DUPLICATE = '''
+    INSERT INTO feedback (student_username, feedback_text, rating, submission_date, content_hash)
+    SELECT :student, :text, :rating, COALESCE(:date, CURRENT_TIMESTAMP), :hash
+    WHERE NOT EXISTS (
+        SELECT 1 FROM feedback
+        WHERE content_hash = :hash
+          AND submission_date BETWEEN datetime(COALESCE(:date, CURRENT_TIMESTAMP), :before)
+                                  AND datetime(COALESCE(:date, CURRENT_TIMESTAMP), :after)
+    )
+'''
+
+
+def feedback_hash(student_username, feedback_text, rating):
+    """Content hash behind the duplicate guard: same student, rating and text up to whitespace and case"""
+    text = ' '.join(feedback_text.split()).casefold()
+    return hashlib.sha256(f'{student_username}\0{rating}\0{text}'.encode()).digest()[:16]
+
+
+def observed(method):
+    """Report a Database method's duration to db.query_observer, if one is set"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        observer = self.query_observer
+        local = self._observed_calls
+        # Only the outermost call is reported, so nested calls are not counted twice
+        if observer is None or getattr(local, 'depth', 0):
+            return method(self, *args, **kwargs)
+
+        local.depth = 1
+        started = time.perf_counter()
+        error = None
+        try:
+            return method(self, *args, **kwargs)
+        except ValueError:
+            # Validation failures are expected, not errors
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            local.depth = 0
+            observer(name, time.perf_counter() - started, error)
+
+    return wrapper
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class DuplicateFeedbackError(ValueError):
+    """Raised when a student repeats feedback they submitted moments ago"""
+
+    def __init__(self):
+        super().__init__("This feedback was already submitted")
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections"""
+
+    def __init__(self, db_name, size=5, timeout=10.0, health_check_interval=30.0, on_connect=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.on_connect = on_connect
+
+        # LIFO keeps the most recently used (warm) connections in rotation
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created = 0
+        self._closed = False
+        self._stats = {
+            'connections_opened': 0,
+            'connections_discarded': 0,
+            'checkouts': 0,
+            'reused_in_thread': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+        }
+
+    def _connect(self):
+        """Open a new SQLite connection for the pool"""
+        # Connections may be checked out by different threads over their lifetime;
+        # uri=True lets term archives be attached read-only (file:...?mode=ro)
+        conn = sqlite3.connect(self.db_name, timeout=self.timeout, check_same_thread=False, uri=True)
+        if self.on_connect is not None:
+            try:
+                self.on_connect(conn)
+            except Exception:
+                conn.close()
+                raise
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        """Check that a pooled connection still answers queries"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        """Close a connection and free its slot in the pool"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._stats['connections_discarded'] += 1
+
+    def _acquire(self):
+        """Take an idle connection, open a new one, or wait for one to be returned"""
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    if self._closed:
+                        raise sqlite3.ProgrammingError("Connection pool is closed")
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+
+                started = time.perf_counter()
+                try:
+                    conn, last_used = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s"
+                    )
+                finally:
+                    waited = time.perf_counter() - started
+                    with self._lock:
+                        self._stats['waits'] += 1
+                        self._stats['wait_time_total'] += waited
+                        self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+
+            # Only probe connections that have been idle for a while
+            if time.monotonic() - last_used >= self.health_check_interval and not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def _release(self, conn):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            closed = self._closed
+        if closed:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection, reusing the one this thread already holds"""
+        local = self._local
+        held = getattr(local, 'conn', None)
+        if held is not None:
+            with self._lock:
+                self._stats['reused_in_thread'] += 1
+            yield held
+            return
+
+        conn = self._acquire()
+        with self._lock:
+            self._stats['checkouts'] += 1
+        local.conn = conn
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            local.conn = None
+            self._release(conn)
+
+    def stats(self):
+        """Return a snapshot of pool usage and wait metrics"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self.size
+            snapshot['open_connections'] = self._created
+        snapshot['idle_connections'] = self._idle.qsize()
+        snapshot['in_use_connections'] = snapshot['open_connections'] - snapshot['idle_connections']
+        return snapshot
+
+    def close_idle(self):
+        """Close the idle connections but keep the pool usable; new ones open on demand"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def close(self):
+        """Close all idle connections; checked-out ones are closed on return"""
+        with self._lock:
+            self._closed = True
+        self.close_idle()
+
+
+class WalCheckpointer(threading.Thread):
+    """Background thread that checkpoints the WAL off the request path"""
+
+    def __init__(self, pool, interval=30.0):
+        super().__init__(name='wal-checkpointer', daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.checkpoints = 0
+        self.last_result = None
+
+    def checkpoint(self):
+        """Run one PASSIVE checkpoint and return (busy, wal_frames, checkpointed)"""
+        with self.pool.connection() as conn:
+            self.last_result = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        self.checkpoints += 1
+        return self.last_result
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.checkpoint()
+            except sqlite3.Error as e:
+                logger.warning("WAL checkpoint failed: %s", e)
+
+    def stop(self):
+        """Stop the thread after its current checkpoint"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
 
 class Database:
-    def __init__(self, db_name='feedback_portal.db'):
+    def __init__(self, db_name='feedback_portal.db', pool_size=5, pool_timeout=10.0,
+                 storage_profile='default', checkpoint_interval=30.0, password_engine=None,
+                 version_ttl=1.0,
+                 schema_migrations=migrations.MIGRATIONS, term_dir=None,
+                 duplicate_window=DEFAULT_DUPLICATE_WINDOW, replica_path=None,
+                 replica_refresh_interval=10.0, replica_max_staleness=30.0, retention_terms=None,
+                 retention_interval=86400.0, retention_batch_size=20000, incremental_vacuum=False):
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"Unknown storage profile: {storage_profile}")
+        started = time.perf_counter()
+
         self.db_name = db_name
-        self.init_database()
-    
+        self.storage_profile = storage_profile
+        # Instrumentation hooks: (method, seconds, error) and (sql,)
+        self.query_observer = None
+        self.statement_observer = None
+        # Called with the (id, student, text, rating, date) rows of every
+        # committed feedback insert, e.g. FeedbackBroker.publish
+        self.feedback_observer = None
+        self._observed_calls = threading.local()
+        self.passwords = password_engine or PasswordEngine()
+        # Feedback table version: writes through this object invalidate it at
+        # once, writes from other processes show up within version_ttl seconds
+        self.version_ttl = version_ttl
+        self._version_lock = threading.Lock()
+        self._version = None
+        self._version_read_at = 0.0
+        self._version_generation = 0
+        # Seconds within which identical feedback from one student is dropped
+        self.duplicate_window = duplicate_window
+        # Optional snapshot copy that reporting() blocks read from
+        self.replica = None
+        self.replica_refresher = None
+        self._reporting = threading.local()
+        # Create a new file in incremental auto-vacuum mode, so retention can
+        # hand freed pages back without a full VACUUM (see retention.py)
+        self.incremental_vacuum = incremental_vacuum or retention_terms is not None
+        self.pool = ConnectionPool(db_name, size=pool_size, timeout=pool_timeout,
+                                   on_connect=self._configure_connection)
+        # Archived terms live in per-term files (default: <db name>-terms/)
+        self.terms = TermCatalog(self, term_dir)
+        self.migrations = schema_migrations
+        # Only pending migrations run; a current schema costs one query
+        self.applied_migrations = self.migrate()
+
+        self.storage_settings = self.read_storage_settings()
+        logger.info("SQLite storage profile '%s' applied to %s: %s",
+                    storage_profile, db_name, self.storage_settings)
+
+        if replica_path and self.storage_settings.get('journal_mode') != 'wal':
+            # The copy is one read of the whole file; only in WAL mode does that not block writers
+            self.pool.close()
+            raise ValueError("A read replica needs a WAL database (storage_profile='high-concurrency')")
+
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpointer = None
+        self._start_checkpointer()
+
+        if replica_path:
+            self.replica = SnapshotReplica(self, self._open_replica_pool, replica_path,
+                                           refresh_interval=replica_refresh_interval,
+                                           max_staleness=replica_max_staleness)
+            self._refresh_replica()
+            self._start_replica_refresher()
+
+        # Optional background archiving of terms older than the newest retention_terms
+        self.retention = None
+        self.retention_scheduler = None
+        if retention_terms is not None:
+            self.retention = RetentionManager(self, retention_terms, batch_size=retention_batch_size,
+                                              interval=retention_interval)
+            self._start_retention_scheduler()
+
+        self.startup_time = time.perf_counter() - started
+        logger.info("Database %s ready in %.1fms (schema version %d, %d migrations applied)",
+                    db_name, self.startup_time * 1000, self.schema_version, len(self.applied_migrations))
+
+    def _start_checkpointer(self):
+        if self.storage_settings.get('journal_mode') == 'wal' and self.checkpoint_interval:
+            self.checkpointer = WalCheckpointer(self.pool, self.checkpoint_interval)
+            self.checkpointer.start()
+
+    def _start_replica_refresher(self):
+        if self.replica is not None and self.replica.refresh_interval:
+            self.replica_refresher = ReplicaRefresher(self.replica)
+            self.replica_refresher.start()
+
+    def _start_retention_scheduler(self):
+        if self.retention is not None and self.retention.interval:
+            self.retention_scheduler = RetentionScheduler(self.retention)
+            self.retention_scheduler.start()
+
+    def _stop_retention_scheduler(self):
+        if self.retention_scheduler is not None:
+            self.retention_scheduler.stop()
+            self.retention_scheduler = None
+
+    def _stop_replica_refresher(self):
+        if self.replica_refresher is not None:
+            self.replica_refresher.stop()
+            self.replica_refresher = None
+
+    def _refresh_replica(self, force=False):
+        """Refresh the replica now; a failure only means reads fall back to the primary for longer"""
+        try:
+            self.replica.refresh(force=force)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Replica refresh failed: %s", e)
+
+    def _open_replica_pool(self, uri):
+        return ConnectionPool(uri, size=self.pool.size, timeout=self.pool.timeout,
+                              on_connect=self._configure_replica_connection)
+
+    def _configure_replica_connection(self, conn):
+        """Apply the read-side storage profile PRAGMAs to a replica connection and refuse writes"""
+        for pragma, value in STORAGE_PROFILES[self.storage_profile].items():
+            if pragma not in WRITE_PRAGMAS:
+                conn.execute(f'PRAGMA {pragma} = {value}')
+        conn.execute('PRAGMA query_only = 1')
+        conn.set_trace_callback(self._trace_statement)
+
+    def _configure_connection(self, conn):
+        """Apply the storage profile PRAGMAs to a new connection"""
+        if self.incremental_vacuum and not conn.execute('PRAGMA page_count').fetchone()[0]:
+            # Only takes effect on a brand-new file, before journal_mode and the first table
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        for pragma, value in STORAGE_PROFILES[self.storage_profile].items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        conn.set_trace_callback(self._trace_statement)
+
+    def _trace_statement(self, sql):
+        """Forward executed SQL to the statement observer, if one is set"""
+        observer = self.statement_observer
+        if observer is not None:
+            observer(sql)
+
+    def read_storage_settings(self):
+        """Read back the effective PRAGMA settings of a pooled connection"""
+        pragmas = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+                   'temp_store', 'wal_autocheckpoint')
+        with self.connection() as conn:
+            return {pragma: conn.execute(f'PRAGMA {pragma}').fetchone()[0] for pragma in pragmas}
+
+    def connection(self):
+        """Check out a pooled database connection (use as a context manager)"""
+        snapshot = getattr(self._reporting, 'snapshot', None)
+        if snapshot is not None:
+            return snapshot.pool.connection()
+        return self.pool.connection()
+
     def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_name)
-    
+        """Open a new, unpooled connection that the caller closes; prefer connection()"""
+        conn = sqlite3.connect(self.db_name, timeout=self.pool.timeout, uri=True)
+        try:
+            self._configure_connection(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def reporting(self):
+        """Serve this thread's reads in the block from the replica, if it is fresh enough.
+
+        Every read in the block sees the same snapshot, including
+        get_feedback_version(). Without a replica, or once it is older than
+        its staleness bound, the block reads the primary as usual. Writes
+        must not happen inside the block.
+        """
+        local = self._reporting
+        if self.replica is None or getattr(local, 'active', False):
+            yield
+            return
+        local.active = True
+        try:
+            with self.replica.connection() as (snapshot, _):
+                local.snapshot = snapshot
+                try:
+                    yield
+                finally:
+                    local.snapshot = None
+        finally:
+            local.active = False
+
+    def prepare_fork(self):
+        """Release connections and stop threads before os.fork(); call after_fork() in the child.
+
+        SQLite connections and threads must not be carried into a forked process.
+        """
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+            self.checkpointer = None
+        self._stop_replica_refresher()
+        self._stop_retention_scheduler()
+        if self.replica is not None:
+            self.replica.close()
+        self.passwords.close()
+        self.pool.close_idle()
+
+    def after_fork(self):
+        """Restart background work in a freshly forked process"""
+        self._start_checkpointer()
+        self._start_replica_refresher()
+        self._start_retention_scheduler()
+
+    def close(self):
+        """Stop background work and close all pooled connections"""
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+        self._stop_replica_refresher()
+        self._stop_retention_scheduler()
+        if self.replica is not None:
+            self.replica.close()
+        self.passwords.close()
+        self.pool.close()
+
     def init_database(self):
-        """Initialize database with tables and sample data"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL CHECK (role IN ('student', 'admin'))
-            )
-        ''')
-        
-        # Create feedback table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_username TEXT NOT NULL,
-                feedback_text TEXT NOT NULL,
-                rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
-                submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (student_username) REFERENCES users(username)
-            )
-        ''')
-        
-        # Insert default users if they don't exist
-        self.create_default_users(cursor)
-        
-        conn.commit()
-        conn.close()
-    
-    def create_default_users(self, cursor):
-        """Create default student and admin users"""
-        default_users = [
-            ('student1', 'password123', 'student'),
-            ('admin', 'admin123', 'admin')
-        ]
-        
-        for username, password, role in default_users:
-            # Hash password for security
-            hashed_password = hashlib.sha256(password.encode()).hexdigest()
-            
+        """Bring the schema up to date; does nothing but check the version when it is current"""
+        return self.migrate()
+
+    def migrate(self):
+        """Apply pending schema migrations in one transaction and return the ones applied"""
+        with self.connection() as conn:
+            applied = migrations.migrate(self, conn, self.migrations)
+            self.schema_version = migrations.current_version(conn)
+            self.search_available = migrations.create_missing_search_index(self, conn, self.migrations)
+        for migration in applied:
+            logger.info("Applied schema migration %d: %s", migration.version, migration.name)
+        return applied
+
+    def get_migration_history(self):
+        """Return (version, name, applied_at) for every applied migration"""
+        with self.connection() as conn:
+            return conn.execute('SELECT version, name, applied_at FROM schema_migrations ORDER BY version').fetchall()
+
+    def get_feedback_version(self):
+        """Return (version, last_modified) of the feedback table, re-read at most every version_ttl seconds"""
+        snapshot = getattr(self._reporting, 'snapshot', None)
+        if snapshot is not None:
+            # Inside reporting(): the version of the data the block reads
+            return snapshot.version
+        with self._version_lock:
+            if self._version is not None and time.monotonic() - self._version_read_at < self.version_ttl:
+                return self._version
+            generation = self._version_generation
+
+        with self.connection() as conn:
+            version, updated_at = conn.execute(
+                'SELECT version, updated_at FROM feedback_version WHERE id = 1').fetchone()
+        result = (version, datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc))
+
+        with self._version_lock:
+            # Don't cache a value read before a concurrent invalidation
+            if generation == self._version_generation:
+                self._version = result
+                self._version_read_at = time.monotonic()
+        return result
+
+    def invalidate_feedback_version(self):
+        """Make the next get_feedback_version() read the counter again"""
+        with self._version_lock:
+            self._version = None
+            self._version_generation += 1
+
+    def hash_password(self, password):
+        """Hash a password for storage in the users table"""
+        return self.passwords.hash(password)
+
+    @observed
+    def get_user(self, username):
+        """Get (username, password hash, role), or None.
+
+        Always read from the table: a password reset or role change made by
+        any process applies to the next login. The lookup is one primary-key
+        probe, next to a password hash that costs tens of milliseconds.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
-                INSERT OR IGNORE INTO users (username, password, role)
-                VALUES (?, ?, ?)
-            ''', (username, hashed_password, role))
-    
+                SELECT username, password, role FROM users
+                WHERE username = ?
+            ''', (username,))
+
+            user = cursor.fetchone()
+
+        return user
+
+    @observed
+    def get_token_state(self, username):
+        """Get (role, token generation) for checking an API token, or None"""
+        with self.connection() as conn:
+            return conn.execute('SELECT role, token_generation FROM users WHERE username = ?',
+                                (username,)).fetchone()
+
+    def revoke_api_tokens(self, username, cursor=None):
+        """Invalidate every API token issued to a user so far; False for an unknown user"""
+        if cursor is not None:
+            return cursor.execute('UPDATE users SET token_generation = token_generation + 1 WHERE username = ?',
+                                  (username,)).rowcount > 0
+        with self.connection() as conn:
+            revoked = self.revoke_api_tokens(username, conn.cursor())
+            conn.commit()
+        return revoked
+
+    @observed
     def authenticate_user(self, username, password):
         """Authenticate user login"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        
-        cursor.execute('''
-            SELECT username, role FROM users 
-            WHERE username = ? AND password = ?
-        ''', (username, hashed_password))
-        
-        user = cursor.fetchone()
-        conn.close()
-        
-        return user
-    
-    def submit_feedback(self, student_username, feedback_text, rating):
-        """Submit student feedback"""
+        user = self.get_user(username)
+        stored_hash = user[1] if user else None
+
+        if not self.passwords.verify(password, stored_hash):
+            return None
+
+        if self.passwords.needs_rehash(stored_hash):
+            self._upgrade_password_hash(username, stored_hash, password)
+
+        return (user[0], user[2])
+
+    def _upgrade_password_hash(self, username, old_hash, password):
+        """Replace a legacy or weaker hash after a successful login"""
+        new_hash = self.hash_password(password)
+        with self.connection() as conn:
+            # Only replace the hash we verified, in case it changed meanwhile
+            conn.execute('''
+                UPDATE users SET password = ?
+                WHERE username = ? AND password = ?
+            ''', (new_hash, username, old_hash))
+            conn.commit()
+
+    @staticmethod
+    def validate_feedback(feedback_text, rating):
+        """Validate a submission and return the cleaned (text, rating)"""
         if not feedback_text.strip():
             raise ValueError("Feedback text cannot be empty")
-        
+
         if not (1 <= rating <= 5):
             raise ValueError("Rating must be between 1 and 5")
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+
+        return feedback_text.strip(), rating
+
+    def _duplicate_params(self, student_username, feedback_text, rating, submission_date=None):
+        """Named parameters for INSERT_UNLESS_DUPLICATE"""
+        return {
+            'student': student_username, 'text': feedback_text, 'rating': rating, 'date': submission_date,
+            'hash': feedback_hash(student_username, feedback_text, rating),
+            'before': f'-{self.duplicate_window} seconds', 'after': f'+{self.duplicate_window} seconds',
+        }
+
+    @observed
+    def submit_feedback(self, student_username, feedback_text, rating):
+        """Submit student feedback; raises DuplicateFeedbackError for a retried submission"""
+        feedback_text, rating = self.validate_feedback(feedback_text, rating)
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(INSERT_UNLESS_DUPLICATE,
+                           self._duplicate_params(student_username, feedback_text, rating))
+            inserted = cursor.rowcount
+            new_rows = self._new_feedback_rows(cursor, cursor.lastrowid - 1) if inserted else []
+            conn.commit()
+        if not inserted:
+            raise DuplicateFeedbackError()
+        self.invalidate_feedback_version()
+        self._notify_feedback(new_rows)
+        return True
+
+    def _last_feedback_id(self, cursor):
+        """Highest feedback id ever assigned (AUTOINCREMENT never reuses one), 0 if none"""
+        row = cursor.execute("SELECT seq FROM main.sqlite_sequence WHERE name = 'feedback'").fetchone()
+        return row[0] if row else 0
+
+    def _new_feedback_rows(self, cursor, after_id):
+        """Rows inserted after after_id in the current transaction, for feedback_observer"""
+        if self.feedback_observer is None:
+            return []
+        return cursor.execute('''
+            SELECT id, student_username, feedback_text, rating, submission_date
+            FROM main.feedback WHERE id > ? ORDER BY id
+        ''', (after_id,)).fetchall()
+
+    def _notify_feedback(self, rows):
+        """Hand committed rows to feedback_observer; its errors never fail the write"""
+        observer = self.feedback_observer
+        if observer is None or not rows:
+            return
+        try:
+            observer(rows)
+        except Exception:
+            logger.exception("Feedback observer failed")
+
+    def _save_checkpoint(self, cursor, checkpoint, completed=False):
+        """Record (kind, source, line) import progress in the current transaction"""
+        kind, source, line = checkpoint
         cursor.execute('''
-            INSERT INTO feedback (student_username, feedback_text, rating)
+            INSERT INTO import_checkpoints (kind, source, line, completed, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (kind, source) DO UPDATE SET
+                line = excluded.line, completed = excluded.completed, updated_at = excluded.updated_at
+        ''', (kind, source, line, int(completed)))
+
+    @observed
+    def bulk_insert_feedback(self, rows, checkpoint=None):
+        """Insert validated (student, text, rating, submission_date) rows in one transaction.
+
+        Rows repeating feedback from within the duplicate window are skipped;
+        returns the number inserted.
+        """
+        def insert(cursor, params):
+            cursor.executemany(INSERT_UNLESS_DUPLICATE, params)
+            return cursor.rowcount, cursor.rowcount
+
+        return self._insert_feedback(rows, insert, checkpoint)
+
+    @observed
+    def insert_feedback_batch(self, rows):
+        """Insert rows like bulk_insert_feedback(); returns one bool per row, False for a skipped repeat.
+
+        Each row is its own statement, so this is a little slower than
+        bulk_insert_feedback() on large imports.
+        """
+        def insert(cursor, params):
+            results = []
+            for row_params in params:
+                cursor.execute(INSERT_UNLESS_DUPLICATE, row_params)
+                results.append(cursor.rowcount > 0)
+            return results, sum(results)
+
+        return self._insert_feedback(rows, insert)
+
+    def _insert_feedback(self, rows, insert, checkpoint=None):
+        """Run insert(cursor, params) over the rows in one transaction; returns its result"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            notify = self.feedback_observer is not None
+            # Rows another process commits in between are published too; subscribers skip repeats
+            last_id = self._last_feedback_id(cursor) if notify else None
+            # A missing submission date falls back to the current time
+            result, inserted = insert(cursor, [self._duplicate_params(*row) for row in rows])
+            new_rows = self._new_feedback_rows(cursor, last_id) if notify and inserted else []
+            if checkpoint is not None:
+                self._save_checkpoint(cursor, checkpoint)
+
+            conn.commit()
+        if inserted:
+            self.invalidate_feedback_version()
+            self._notify_feedback(new_rows)
+        return result
+
+    def deduplicate_feedback(self, window=None, batch_size=DEDUP_BATCH_SIZE):
+        """Hash live rows that have no content hash yet and delete repeated submissions.
+
+        A row is a repeat when the same student sent the same rating and text
+        within window seconds (default: the duplicate window) after the
+        previous copy that was kept. Hashing and deleting commit every
+        batch_size rows, so submissions keep flowing while a large table is
+        compacted and an interrupted run resumes where it stopped. The delete
+        triggers take removed rows out of the statistics and the search index.
+        Returns (rows hashed, rows removed).
+        """
+        window = self.duplicate_window if window is None else window
+
+        hashed = 0
+        while True:
+            with self.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    rows = conn.execute('''
+                        SELECT id, student_username, feedback_text, rating FROM feedback
+                        WHERE content_hash IS NULL LIMIT ?
+                    ''', (batch_size,)).fetchall()
+                    conn.executemany('UPDATE feedback SET content_hash = ? WHERE id = ?',
+                                     [(feedback_hash(student, text, rating), row_id)
+                                      for row_id, student, text, rating in rows])
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            if not rows:
+                break
+            hashed += len(rows)
+
+        # Walk each hash's rows in date order along idx_feedback_duplicates
+        duplicates = []
+        previous_hash = kept_at = None
+        with self.connection() as conn:
+            for row_id, content_hash, submitted_at in conn.execute('''
+                SELECT id, content_hash, CAST(strftime('%s', submission_date) AS INTEGER) FROM feedback
+                ORDER BY content_hash, submission_date, id
+            '''):
+                if content_hash == previous_hash and submitted_at is not None and kept_at is not None \
+                        and submitted_at - kept_at <= window:
+                    duplicates.append((row_id,))
+                    continue
+                previous_hash, kept_at = content_hash, submitted_at
+
+        removed = 0
+        for start in range(0, len(duplicates), batch_size):
+            with self.connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    removed += conn.executemany('DELETE FROM feedback WHERE id = ?',
+                                                duplicates[start:start + batch_size]).rowcount
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            self.invalidate_feedback_version()
+
+        if removed:
+            logger.info("Removed %d duplicate feedback rows", removed)
+        return hashed, removed
+
+    @observed
+    def bulk_insert_users(self, rows, checkpoint=None):
+        """Insert (username, password, role) rows, skipping existing usernames"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            usernames = [row[0] for row in rows]
+            existing = set()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(usernames), 500):
+                chunk = usernames[start:start + 500]
+                cursor.execute(f"SELECT username FROM users WHERE username IN ({', '.join('?' for _ in chunk)})",
+                               chunk)
+                existing.update(row[0] for row in cursor.fetchall())
+
+            new_rows = []
+            seen = set(existing)
+            for username, password, role in rows:
+                if username not in seen:
+                    seen.add(username)
+                    new_rows.append((username, password, role))
+
+            # Hashing dominates a roster import, so spread it over the worker pool
+            hashes = self.passwords.hash_many([password for _, password, _ in new_rows])
+            cursor.executemany('''
+                INSERT OR IGNORE INTO users (username, password, role)
+                VALUES (?, ?, ?)
+            ''', [(username, hashed, role) for (username, _, role), hashed in zip(new_rows, hashes)])
+            if checkpoint is not None:
+                self._save_checkpoint(cursor, checkpoint)
+
+            conn.commit()
+
+        return len(new_rows)
+
+    def get_import_checkpoint(self, kind, source):
+        """Get (line, completed) for an import, or None if it never ran"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT line, completed FROM import_checkpoints
+                WHERE kind = ? AND source = ?
+            ''', (kind, source))
+
+            row = cursor.fetchone()
+
+        return (row[0], bool(row[1])) if row else None
+
+    def finish_import(self, kind, source, line):
+        """Mark an import as completed up to the given line"""
+        with self.connection() as conn:
+            self._save_checkpoint(conn.cursor(), (kind, source, line), completed=True)
+            conn.commit()
+
+    def clear_import_checkpoint(self, kind, source):
+        """Forget an import's progress so it starts again from the first line"""
+        with self.connection() as conn:
+            conn.execute('DELETE FROM import_checkpoints WHERE kind = ? AND source = ?', (kind, source))
+            conn.commit()
+
+    @observed
+    def get_all_feedback(self):
+        """Get all feedback for admin view, archived terms included"""
+        with self.connection() as conn:
+            return self._query_partitions(conn, lambda schema: f'''
+                SELECT f.id, f.student_username, f.feedback_text, f.rating, f.submission_date
+                FROM {schema}.feedback f
+                ORDER BY f.submission_date DESC, f.id DESC
+            ''', [], key=lambda row: (row[4], row[0]), reverse=True)
+
+    def _query_partitions(self, conn, build_sql, params, key, reverse=False, limit=None,
+                          date_from=None, date_to=None):
+        """Run a query on the live table and every archived term it can match, merged in key order.
+
+        build_sql(schema) returns the query for one partition, sorted by key;
+        partitions attached together run as one UNION ALL statement.
+        """
+        results = []
+        for schemas in self.terms.partitions(conn, date_from, date_to):
+            if len(schemas) == 1:
+                rows = conn.execute(build_sql(schemas[0]), params).fetchall()
+            else:
+                sql = ' UNION ALL '.join(f'SELECT * FROM ({build_sql(schema)})' for schema in schemas)
+                rows = sorted(conn.execute(sql, params * len(schemas)).fetchall(), key=key, reverse=reverse)
+            results.append(rows)
+
+        if len(results) == 1:
+            rows = results[0]
+            return rows[:limit] if limit is not None else rows
+        return list(islice(heapq.merge(*results, key=key, reverse=reverse), limit))
+
+    def _feedback_filters(self, rating=None, student=None, date_from=None, date_to=None):
+        """Build the WHERE clauses and parameters for the feedback filters"""
+        clauses = []
+        params = []
+
+        if rating is not None:
+            try:
+                rating = int(rating)
+            except (TypeError, ValueError):
+                raise ValueError("Rating must be between 1 and 5")
+            if not (1 <= rating <= 5):
+                raise ValueError("Rating must be between 1 and 5")
+            clauses.append('rating = ?')
+            params.append(rating)
+
+        if student:
+            clauses.append('student_username = ?')
+            params.append(student)
+
+        # Dates are inclusive calendar days in YYYY-MM-DD form
+        for value, clause in ((date_from, 'submission_date >= ?'),
+                              (date_to, "submission_date < date(?, '+1 day')")):
+            if value:
+                try:
+                    datetime.strptime(value, '%Y-%m-%d')
+                except ValueError:
+                    raise ValueError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+                clauses.append(clause)
+                params.append(value)
+
+        return clauses, params
+
+    @staticmethod
+    def _encode_cursor(values):
+        """Encode the last row's sort key as an opaque page cursor"""
+        return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor, length):
+        """Decode a page cursor produced by _encode_cursor"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid page cursor")
+        if not isinstance(values, list) or len(values) != length:
+            raise ValueError("Invalid page cursor")
+        return values
+
+    @observed
+    def get_feedback_since(self, after_id, limit=DEFAULT_PAGE_SIZE):
+        """Return up to limit live feedback rows with an id above after_id, oldest first"""
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        with self.connection() as conn:
+            return conn.execute('''
+                SELECT id, student_username, feedback_text, rating, submission_date
+                FROM main.feedback WHERE id > ? ORDER BY id LIMIT ?
+            ''', (after_id, limit)).fetchall()
+
+    @observed
+    def get_last_feedback_id(self):
+        """Return the highest feedback id assigned so far, 0 for an empty table"""
+        with self.connection() as conn:
+            return self._last_feedback_id(conn.cursor())
+
+    @observed
+    def get_feedback_page(self, page_size=DEFAULT_PAGE_SIZE, cursor=None, sort='date',
+                          order='desc', rating=None, student=None, date_from=None, date_to=None):
+        """Get one page of feedback using keyset pagination"""
+        if sort not in FEEDBACK_SORT_KEYS:
+            raise ValueError(f"Unknown sort: {sort}")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Unknown sort order: {order}")
+        try:
+            page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid page size: {page_size}")
+
+        keys = FEEDBACK_SORT_KEYS[sort]
+        clauses, params = self._feedback_filters(rating, student, date_from, date_to)
+
+        # Archived terms outside this range can't hold a matching row
+        term_from, term_to = date_from, date_to
+        if cursor:
+            # Row-value comparison lets SQLite seek straight to the next page
+            comparison = '<' if order == 'desc' else '>'
+            placeholders = ', '.join('?' for _ in keys)
+            clauses.append(f"({', '.join(keys)}) {comparison} ({placeholders})")
+            values = self._decode_cursor(cursor, len(keys))
+            params.extend(values)
+            if sort == 'date' and isinstance(values[0], str):
+                # Pages past the cursor only reach terms on its far side
+                if order == 'desc':
+                    term_to = min(term_to, values[0]) if term_to else values[0]
+                else:
+                    term_from = max(term_from, values[0]) if term_from else values[0]
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order_by = ', '.join(f'{key} {order.upper()}' for key in keys)
+        columns = ('id', 'student_username', 'feedback_text', 'rating', 'submission_date')
+        key_indexes = [columns.index(key) for key in keys]
+
+        with self.connection() as conn:
+            # Fetch one extra row to know whether another page follows
+            rows = self._query_partitions(conn, lambda schema: f'''
+                SELECT id, student_username, feedback_text, rating, submission_date
+                FROM {schema}.feedback
+                {where}
+                ORDER BY {order_by}
+                LIMIT ?
+            ''', params + [page_size + 1], key=lambda row: tuple(row[i] for i in key_indexes),
+                reverse=order == 'desc', limit=page_size + 1, date_from=term_from, date_to=term_to)
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = dict(zip(columns, rows[-1]))
+            next_cursor = self._encode_cursor(last[key] for key in keys)
+
+        return FeedbackPage(rows, next_cursor)
+
+    @staticmethod
+    def _match_expression(query):
+        """Turn free text into an FTS5 query that matches every term (a trailing * keeps prefix search)"""
+        phrases = []
+        for term in query.split()[:MAX_SEARCH_TERMS]:
+            prefix = term.endswith('*')
+            term = term.rstrip('*')
+            if term:
+                # Quoting each term stops user input being read as FTS5 syntax
+                phrases.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+        if not phrases:
+            raise ValueError("Enter at least one search term")
+        return ' '.join(phrases)
+
+    def _require_search(self):
+        if not self.search_available:
+            raise sqlite3.NotSupportedError("Full-text search needs SQLite with FTS5")
+
+    @observed
+    def search_feedback(self, query, page_size=DEFAULT_PAGE_SIZE, cursor=None, rating=None,
+                        student=None, date_from=None, date_to=None):
+        """Get one page of feedback matching a text search, best matches first.
+
+        Rows are (id, student_username, feedback_text, rating, submission_date,
+        snippet); matched terms in the snippet are wrapped in SNIPPET_START and
+        SNIPPET_END.
+        """
+        self._require_search()
+        match = self._match_expression(query)
+        try:
+            page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid page size: {page_size}")
+
+        clauses, params = self._feedback_filters(rating, student, date_from, date_to)
+        clauses.insert(0, 'feedback_fts MATCH ?')
+        params.insert(0, match)
+
+        if cursor:
+            # bm25 rank is lower for better matches; the id breaks ties
+            clauses.append('(feedback_fts.rank, f.id) > (?, ?)')
+            params.extend(self._decode_cursor(cursor, 2))
+
+        with self.connection() as conn:
+            # Each term archive has its own index, so ranks are scored per term
+            rows = self._query_partitions(conn, lambda schema: f'''
+                SELECT f.id, f.student_username, f.feedback_text, f.rating, f.submission_date,
+                       snippet(feedback_fts, 0, ?, ?, '...', ?), feedback_fts.rank
+                FROM {schema}.feedback_fts
+                JOIN {schema}.feedback f ON f.id = feedback_fts.rowid
+                WHERE {' AND '.join(clauses)}
+                ORDER BY feedback_fts.rank, f.id
+                LIMIT ?
+            ''', [SNIPPET_START, SNIPPET_END, SNIPPET_TOKENS] + params + [page_size + 1],
+                key=lambda row: (row[6], row[0]), limit=page_size + 1, date_from=date_from, date_to=date_to)
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = self._encode_cursor((rows[-1][6], rows[-1][0]))
+
+        return FeedbackPage([row[:6] for row in rows], next_cursor)
+
+    @observed
+    def rebuild_search_index(self):
+        """Re-index every feedback row from the feedback table"""
+        self._require_search()
+        with self.connection() as conn:
+            conn.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+            conn.commit()
+
+    @observed
+    def optimize_search_index(self):
+        """Merge the index's b-tree segments into one for faster queries"""
+        self._require_search()
+        with self.connection() as conn:
+            conn.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('optimize')")
+            conn.commit()
+
+    @observed
+    def verify_search_index(self):
+        """True if the index matches the text stored in the feedback table"""
+        self._require_search()
+        with self.connection() as conn:
+            try:
+                conn.execute("INSERT INTO feedback_fts (feedback_fts, rank) VALUES ('integrity-check', 1)")
+            except sqlite3.DatabaseError:
+                return False
+            finally:
+                conn.rollback()
+        return True
+
+    @observed
+    def get_feedback_stats(self):
+        """Get total count, rating histogram and mean rating from the summary table (archived terms included)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT rating, count FROM feedback_rating_stats ORDER BY rating')
+            histogram = dict(cursor.fetchall())
+
+        total = sum(histogram.values())
+        rating_sum = sum(rating * count for rating, count in histogram.items())
+        return {
+            'total': total,
+            'histogram': histogram,
+            'mean': rating_sum / total if total else None,
+        }
+
+    @observed
+    def get_daily_counts(self, date_from=None, date_to=None):
+        """Get (day, count, mean rating) rows for an inclusive range of days"""
+        clauses = []
+        params = []
+        if date_from:
+            clauses.append('day >= ?')
+            params.append(date_from)
+        if date_to:
+            clauses.append('day <= ?')
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT day, count, CAST(rating_sum AS REAL) / count
+                FROM feedback_daily_stats
+                {where}
+                ORDER BY day
+            ''', params)
+
+            return cursor.fetchall()
+
+    @observed
+    def get_student_counts(self, student_username):
+        """Get (count, mean rating) for one student, or None if they have no feedback"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT count, CAST(rating_sum AS REAL) / count
+                FROM feedback_student_stats
+                WHERE student_username = ?
+            ''', (student_username,))
+
+            return cursor.fetchone()
+
+    def get_student_feedback(self, student_username, page_size=DEFAULT_PAGE_SIZE, cursor=None):
+        """One student's feedback, newest first, archived terms included.
+
+        Walks idx_feedback_student_date, so a page costs the same however much
+        feedback other students have sent.
+        """
+        if not student_username:
+            raise ValueError("A student username is required")
+        return self.get_feedback_page(page_size=page_size, cursor=cursor, student=student_username)
+
+    def _expected_stats(self, cursor):
+        """Aggregate the statistics from the raw feedback table plus the archived terms' own statistics"""
+        return merge_aggregates(aggregate_feedback(cursor), self.terms.archived_aggregates(cursor.connection))
+
+    def add_to_stats(self, cursor, aggregates):
+        """Add (ratings, daily, students) aggregates to the summary tables (caller commits)"""
+        ratings, daily, students = aggregates
+        cursor.executemany('UPDATE feedback_rating_stats SET count = count + ? WHERE rating = ?',
+                           [(count, rating) for rating, count in ratings.items()])
+        cursor.executemany('''
+            INSERT INTO feedback_daily_stats (day, count, rating_sum) VALUES (?, ?, ?)
+            ON CONFLICT (day) DO UPDATE SET
+                count = count + excluded.count, rating_sum = rating_sum + excluded.rating_sum
+        ''', [(day, count, rating_sum) for day, (count, rating_sum) in daily.items()])
+        cursor.executemany('''
+            INSERT INTO feedback_student_stats (student_username, count, rating_sum) VALUES (?, ?, ?)
+            ON CONFLICT (student_username) DO UPDATE SET
+                count = count + excluded.count, rating_sum = rating_sum + excluded.rating_sum
+        ''', [(student, count, rating_sum) for student, (count, rating_sum) in students.items()])
+
+    def _rebuild_stats(self, cursor):
+        """Replace the summary tables with fresh aggregates (caller commits)"""
+        ratings, daily, students = self._expected_stats(cursor)
+
+        cursor.execute('DELETE FROM feedback_daily_stats')
+        cursor.execute('DELETE FROM feedback_student_stats')
+        cursor.executemany('UPDATE feedback_rating_stats SET count = ? WHERE rating = ?',
+                           [(count, rating) for rating, count in ratings.items()])
+        cursor.executemany('INSERT INTO feedback_daily_stats (day, count, rating_sum) VALUES (?, ?, ?)',
+                           [(day, count, rating_sum) for day, (count, rating_sum) in daily.items()])
+        cursor.executemany('''
+            INSERT INTO feedback_student_stats (student_username, count, rating_sum)
             VALUES (?, ?, ?)
-        ''', (student_username, feedback_text.strip(), rating))
-        
-        conn.commit()
-        conn.close()
+        ''', [(student, count, rating_sum) for student, (count, rating_sum) in students.items()])
+
+    @observed
+    def rebuild_stats(self):
+        """Recompute all feedback statistics from the raw table"""
+        with self.connection() as conn:
+            # Take the write lock first so no insert lands between read and replace
+            conn.execute('BEGIN IMMEDIATE')
+            self._rebuild_stats(conn.cursor())
+            conn.commit()
+
+    @observed
+    def verify_stats(self):
+        """Compare the summary tables against the raw table and list any mismatches"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Read both sides from one snapshot
+            cursor.execute('BEGIN')
+            ratings, daily, students = self._expected_stats(cursor)
+
+            cursor.execute('SELECT rating, count FROM feedback_rating_stats')
+            actual_ratings = dict(cursor.fetchall())
+            cursor.execute('SELECT day, count, rating_sum FROM feedback_daily_stats')
+            actual_daily = {day: (count, rating_sum) for day, count, rating_sum in cursor.fetchall()}
+            cursor.execute('SELECT student_username, count, rating_sum FROM feedback_student_stats')
+            actual_students = {student: (count, rating_sum) for student, count, rating_sum in cursor.fetchall()}
+            conn.rollback()
+
+        mismatches = []
+        for table, expected, actual in (('feedback_rating_stats', ratings, actual_ratings),
+                                        ('feedback_daily_stats', daily, actual_daily),
+                                        ('feedback_student_stats', students, actual_students)):
+            for key in sorted(set(expected) | set(actual), key=str):
+                if expected.get(key) != actual.get(key):
+                    mismatches.append((table, key, expected.get(key), actual.get(key)))
+
+        return mismatches
+
+    def iter_feedback_batches(self, batch_size=1000, rating=None, student=None,
+                              date_from=None, date_to=None, ordered=True):
+        """Stream feedback in fetchmany batches, oldest first, without loading the whole table.
+
+        With ordered=False rows come in storage order, which skips the index
+        walk; whole-table scans such as the reports don't need the order.
+
+        The generator keeps a pooled connection checked out (shared with other
+        queries on the same thread) from its first batch until it is exhausted
+        or closed; call close() on it when stopping early. The time spent
+        fetching batches (not the caller's time between them) is reported to
+        query_observer once the generator finishes.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        # Validate filters now, before the caller starts streaming
+        clauses, params = self._feedback_filters(rating, student, date_from, date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        def batches():
+            # @observed would only time creating the generator
+            observer = self.query_observer
+            elapsed, error, started = 0.0, None, time.perf_counter()
+            try:
+                with self.connection() as conn:
+                    cursor = conn.cursor()
+                    terms = self.terms.archived(conn, date_from, date_to)
+                    cursor.execute(f'''
+                        SELECT id, student_username, feedback_text, rating, submission_date
+                        FROM feedback
+                        {where}
+                        {'ORDER BY submission_date, id' if ordered else ''}
+                    ''', params)
+
+                    rows = cursor
+                    if terms and not ordered:
+                        rows = chain(cursor, self.terms.iter_archived_rows(terms, where, params, ordered=False))
+                    elif terms:
+                        # Archives are read one file at a time; their date ranges don't
+                        # overlap, so chained together they are already in order
+                        rows = heapq.merge(cursor, self.terms.iter_archived_rows(terms, where, params),
+                                           key=lambda row: (row[4], row[0]))
+                    while True:
+                        batch = list(islice(rows, batch_size))
+                        if not batch:
+                            break
+                        elapsed += time.perf_counter() - started
+                        started = None
+                        yield batch
+                        started = time.perf_counter()
+                    cursor.close()
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if started is not None:
+                    elapsed += time.perf_counter() - started
+                if observer is not None:
+                    observer('iter_feedback_batches', elapsed, error)
+
+        return batches()
+
+    def define_term(self, name, starts_on, ends_on):
+        """Define a term covering the inclusive days starts_on..ends_on (YYYY-MM-DD)"""
+        return self.terms.define(name, starts_on, ends_on)
+
+    def get_terms(self):
+        """Return every defined Term, oldest first"""
+        return self.terms.list()
+
+    @observed
+    def archive_term(self, name, through=None, compact=True):
+        """Move a term's feedback (up to day through) out of the live table into its read-only archive file"""
+        term = self.terms.archive(name, through, compact)
+        if self.replica is not None:
+            # The snapshot's live rows now also sit in the archive file its catalog points at
+            self._refresh_replica(force=True)
+        return term
+
+    def enable_incremental_vacuum(self):
+        """Switch a database created without it to incremental auto-vacuum; returns False if it already was.
+
+        Takes one full VACUUM, which locks the database and rewrites the file
+        while it runs. Databases created with incremental_vacuum=True (or with
+        retention configured) start in this mode.
+        """
+        with self.pool.connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return False
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        logger.info("Enabled incremental auto-vacuum on %s", self.db_name)
         return True
-    
-    def get_all_feedback(self):
-        """Get all feedback for admin view"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT f.id, f.student_username, f.feedback_text, f.rating, f.submission_date
-            FROM feedback f
-            ORDER BY f.submission_date DESC
-        ''')
-        
-        feedback_list = cursor.fetchall()
-        conn.close()
-        
-        return feedback_list
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""Live feed of new feedback for the admin dashboard (Server-Sent Events).
+
+Database.feedback_observer hands every committed batch of feedback rows to
+FeedbackBroker.publish(), which copies them into each subscriber's bounded
+buffer without ever blocking the writer. A subscriber that falls behind
+loses its buffer and catches up from the feedback table instead, as does a
+new or resuming one (Last-Event-ID is the last feedback id it received).
+
+The broker only sees writes made by this process. Rows written by other
+processes (server.py workers, manage.py imports) are picked up from the
+table at every heartbeat.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+# Rows a new or lagging subscriber may be sent from the table; beyond that it is told to reload
+DEFAULT_BACKLOG = 200
+# Open streams per process; each one holds a server thread for up to its max_age
+DEFAULT_MAX_SUBSCRIBERS = 64
+
+
+class TooManySubscribersError(Exception):
+    """Raised when the broker already has max_subscribers open streams"""
+
+
+def sse_message(data=None, event=None, event_id=None, retry=None, comment=None):
+    """Format one Server-Sent Events message"""
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if retry is not None:
+        lines.append(f'retry: {int(retry * 1000)}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if data is not None:
+        lines.extend(f'data: {line}' for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def feedback_event(row):
+    """SSE message for one (id, student, text, rating, date) feedback row"""
+    feedback_id, student_username, feedback_text, rating, submission_date = row
+    return sse_message(json.dumps({'id': feedback_id, 'student_username': student_username,
+                                   'feedback_text': feedback_text, 'rating': rating,
+                                   'submission_date': submission_date}),
+                       event='feedback', event_id=feedback_id)
+
+
+class Subscription:
+    """One subscriber's bounded buffer of published rows"""
+
+    def __init__(self, broker, buffer_size):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self._rows = deque()
+        self._condition = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+
+    def _put(self, rows):
+        with self._condition:
+            if self.closed:
+                return 0
+            dropped = 0
+            if len(self._rows) + len(rows) > self.buffer_size:
+                # The table still has everything; the subscriber re-reads it
+                dropped = len(self._rows) + len(rows)
+                self._rows.clear()
+                self.overflowed = True
+            else:
+                self._rows.extend(rows)
+            self._condition.notify()
+            return dropped
+
+    def get(self, timeout):
+        """Wait up to timeout seconds; returns (rows, overflowed) and resets both"""
+        with self._condition:
+            if not self._rows and not self.overflowed and not self.closed:
+                self._condition.wait(timeout)
+            rows, overflowed = list(self._rows), self.overflowed
+            self._rows.clear()
+            self.overflowed = False
+            return rows, overflowed
+
+    def close(self):
+        """Unsubscribe and wake up the reader"""
+        self.broker._unsubscribe(self)
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FeedbackBroker:
+    """In-process publish/subscribe fan-out of newly committed feedback rows.
+
+    At most max_subscribers subscriptions are open at once (None for no
+    limit); subscribe() refuses the next one with TooManySubscribersError.
+    """
+
+    def __init__(self, buffer_size=256, max_subscribers=DEFAULT_MAX_SUBSCRIBERS):
+        if buffer_size < 1:
+            raise ValueError("Subscriber buffer size must be at least 1")
+        if max_subscribers is not None and max_subscribers < 1:
+            raise ValueError("Broker must allow at least one subscriber")
+
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            'subscriptions': 0,
+            'rejected_subscriptions': 0,
+            'published_rows': 0,
+            'dropped_rows': 0,
+        }
+
+    def subscribe(self):
+        """Return a new Subscription; close it (or use it as a context manager) when done"""
+        subscription = Subscription(self, self.buffer_size)
+        with self._lock:
+            if self._closed:
+                subscription.closed = True
+                return subscription
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                self._stats['rejected_subscriptions'] += 1
+                raise TooManySubscribersError(f"{self.max_subscribers} live feeds are already open")
+            self._subscribers.add(subscription)
+            self._stats['subscriptions'] += 1
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, rows):
+        """Hand committed feedback rows to every subscriber; never blocks on slow ones"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._stats['published_rows'] += len(rows)
+        dropped = sum(subscription._put(rows) for subscription in subscribers)
+        if dropped:
+            with self._lock:
+                self._stats['dropped_rows'] += dropped
+
+    def stats(self):
+        """Return subscriber and row counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['subscribers'] = len(self._subscribers)
+        return snapshot
+
+    def close(self):
+        """End every open stream, e.g. before a graceful shutdown"""
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def feedback_stream(db, subscription, last_id, heartbeat=15.0, max_age=300.0, backlog=DEFAULT_BACKLOG):
+    """Yield SSE messages for feedback committed after last_id, closing subscription at the end.
+
+    The caller subscribes first, so a full broker can be turned away before
+    the response starts.
+
+    Rows come from the broker as they are committed, and from the table when
+    the stream starts, after the subscriber's buffer overflowed and at every
+    heartbeat. A subscriber more than backlog rows behind gets a 'reset'
+    event (reload the page) and continues from the newest row. The stream
+    ends after max_age seconds; the browser reconnects with Last-Event-ID.
+    """
+    deadline = time.monotonic() + max_age
+
+    with subscription:
+        # Everything up to `floor` is either sent or older than the stream
+        floor = last_id
+        sent = set()
+        catch_up = True
+        yield sse_message(retry=3.0, comment='connected')
+
+        while not subscription.closed:
+            if catch_up:
+                rows = db.get_feedback_since(floor, limit=backlog + 1)
+                if len(rows) > backlog:
+                    floor = db.get_last_feedback_id()
+                    sent.clear()
+                    yield sse_message(data=str(floor), event='reset', event_id=floor)
+                else:
+                    for row in rows:
+                        if row[0] not in sent:
+                            yield feedback_event(row)
+                    if rows:
+                        floor = rows[-1][0]
+                    sent = {feedback_id for feedback_id in sent if feedback_id > floor}
+                catch_up = False
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            rows, overflowed = subscription.get(min(heartbeat, remaining))
+            for row in rows:
+                if row[0] > floor and row[0] not in sent:
+                    sent.add(row[0])
+                    yield feedback_event(row)
+            if overflowed:
+                catch_up = True
+            elif not rows and not subscription.closed:
+                # Nothing published here for a while: keep the connection open
+                # and look for rows committed by other processes
+                yield sse_message(comment='heartbeat')
+                catch_up = True
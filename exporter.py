@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import time
+
+FEEDBACK_COLUMNS = ('id', 'student_username', 'feedback_text', 'rating', 'submission_date')
+
+# Export format -> (MIME type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class ExportProgress:
+    """Row count and throughput of a running export"""
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def _csv_chunks(batches, progress):
+    """Render each batch of rows as one CSV chunk, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FEEDBACK_COLUMNS)
+
+    for rows in batches:
+        writer.writerows(rows)
+        progress.rows += len(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(batches, progress):
+    """Render each batch of rows as newline-delimited JSON objects"""
+    for rows in batches:
+        progress.rows += len(rows)
+        yield ''.join(json.dumps(dict(zip(FEEDBACK_COLUMNS, row))) + '\n' for row in rows)
+
+
+def export_feedback(db, fmt, batch_size=1000, progress=None, **filters):
+    """Stream the feedback table as text chunks in the given format.
+
+    Memory use is bounded by one batch of rows. Filters are those accepted by
+    Database.get_feedback_page (rating, student, date_from, date_to) and are
+    validated before the first chunk is produced.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    progress = progress if progress is not None else ExportProgress()
+    batches = db.iter_feedback_batches(batch_size=batch_size, **filters)
+    render = _csv_chunks if fmt == 'csv' else _ndjson_chunks
+
+    def chunks():
+        try:
+            yield from render(batches, progress)
+        finally:
+            batches.close()
+            progress.finished = time.perf_counter()
+
+    return chunks()
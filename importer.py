@@ -0,0 +1,172 @@
+import csv
+import json
+import os
+import time
+from datetime import datetime
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+USER_ROLES = ('student', 'admin')
+
+
+class ImportReport:
+    """Outcome of a bulk import: counts, per-row errors and throughput"""
+
+    def __init__(self, kind, source):
+        self.kind = kind
+        self.source = source
+        self.imported = 0
+        self.skipped = 0
+        self.resumed_from = 0
+        self.last_line = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+    def write_errors(self, path):
+        """Write the per-row errors as a CSV report"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('line', 'error'))
+            writer.writerows(self.errors)
+
+
+def detect_format(path, fmt=None):
+    """Pick the import format from the argument or the file extension"""
+    if fmt is None:
+        fmt = 'ndjson' if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl') else 'csv'
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+    return fmt
+
+
+def read_records(path, fmt=None):
+    """Yield (line_number, record) pairs; record is an Exception for unparsable lines"""
+    fmt = detect_format(path, fmt)
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                # line_num points at the last physical line of the record
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("Expected a JSON object")
+                except ValueError as e:
+                    record = ValueError(f"Invalid JSON: {e}")
+                yield line_number, record
+
+
+def parse_submission_date(value):
+    """Normalise an optional submission date to SQLite's timestamp format"""
+    if value in (None, ''):
+        return None
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(str(value), fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid submission_date: {value}")
+
+
+def parse_feedback_record(db, record):
+    """Validate a feedback record the same way submit_feedback does"""
+    student_username = str(record.get('student_username') or '').strip()
+    if not student_username:
+        raise ValueError("student_username is required")
+    try:
+        rating = int(record.get('rating'))
+    except (TypeError, ValueError):
+        raise ValueError("Rating must be between 1 and 5")
+    feedback_text, rating = db.validate_feedback(str(record.get('feedback_text') or ''), rating)
+    return student_username, feedback_text, rating, parse_submission_date(record.get('submission_date'))
+
+
+def parse_user_record(db, record):
+    """Validate a roster record (the password is hashed on insert)"""
+    username = str(record.get('username') or '').strip()
+    password = str(record.get('password') or '')
+    role = str(record.get('role') or 'student').strip()
+    if not username:
+        raise ValueError("username is required")
+    if not password:
+        raise ValueError("password is required")
+    if role not in USER_ROLES:
+        raise ValueError(f"Invalid role: {role}")
+    return username, password, role
+
+
+def _run_import(db, kind, path, parse, insert, batch_size, fmt, restart):
+    """Validate records and insert them in checkpointed batches"""
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    source = os.path.abspath(path)
+    report = ImportReport(kind, source)
+
+    if restart:
+        db.clear_import_checkpoint(kind, source)
+    checkpoint = db.get_import_checkpoint(kind, source)
+    if checkpoint is not None:
+        report.resumed_from, completed = checkpoint
+        if completed:
+            report.finished = time.perf_counter()
+            return report
+
+    batch = []
+    for line_number, record in read_records(path, fmt):
+        report.last_line = line_number
+        if line_number <= report.resumed_from:
+            report.skipped += 1
+            continue
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(parse(db, record))
+        except ValueError as e:
+            report.errors.append((line_number, str(e)))
+            continue
+
+        if len(batch) >= batch_size:
+            # The checkpoint commits in the same transaction as the rows
+            report.imported += insert(batch, checkpoint=(kind, source, line_number))
+            batch = []
+
+    if batch:
+        report.imported += insert(batch, checkpoint=(kind, source, report.last_line))
+    db.finish_import(kind, source, report.last_line)
+    report.finished = time.perf_counter()
+    return report
+
+
+def import_feedback(db, path, batch_size=1000, fmt=None, restart=False):
+    """Bulk-load historical feedback from a CSV or NDJSON file.
+
+    Columns: student_username, feedback_text, rating and an optional
+    submission_date. Invalid rows are reported, not inserted. Progress is
+    checkpointed with every batch, so re-running an interrupted import resumes
+    after the last committed batch; pass restart=True to start over.
+    """
+    return _run_import(db, 'feedback', path, parse_feedback_record, db.bulk_insert_feedback,
+                       batch_size, fmt, restart)
+
+
+def import_users(db, path, batch_size=1000, fmt=None, restart=False):
+    """Bulk-load a user roster (username, password, role) from CSV or NDJSON.
+
+    Existing usernames are left untouched and not counted as imported.
+    """
+    return _run_import(db, 'users', path, parse_user_record, db.bulk_insert_users,
+                       batch_size, fmt, restart)
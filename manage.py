@@ -0,0 +1,453 @@
+"""Maintenance commands for the Student Feedback Portal.
+
+    python manage.py migrate           # bring the schema up to date
+    python manage.py stats             # show the feedback statistics
+    python manage.py stats --verify    # compare them against the raw table
+    python manage.py stats --rebuild   # recompute them from the raw table
+    python manage.py search-index --rebuild --optimize
+    python manage.py search "course structure" --limit 10
+    python manage.py sessions --revoke admin --purge
+    python manage.py dedup --window 3600
+    python manage.py terms --define 2024-spring 2024-01-08 2024-05-17 --archive 2024-spring
+    python manage.py replica --refresh
+    python manage.py retention --keep-terms 4 --dry-run
+    python manage.py report --weeks 12 --terms 20
+    python manage.py build-assets
+    python manage.py export --format csv --output feedback.csv
+    python manage.py import-feedback archive.csv --errors import-errors.csv
+    python manage.py import-users roster.ndjson
+"""
+import argparse
+import os
+import sys
+import time
+
+from analytics import FeedbackAnalytics
+from assets import build_assets
+from database import DEDUP_BATCH_SIZE, SNIPPET_END, SNIPPET_START, Database
+from exporter import EXPORT_FORMATS, ExportProgress, export_feedback
+from importer import IMPORT_FORMATS, import_feedback, import_users
+from retention import RetentionManager
+from sessions import SessionStore
+
+
+def cmd_migrate(db, args):
+    """Report the schema migrations applied when the database was opened"""
+    # Opening the database already applied anything pending
+    for migration in db.applied_migrations:
+        print(f"Applied migration {migration.version}: {migration.name}")
+    if not db.applied_migrations:
+        print("Schema is up to date.")
+    print(f"Schema version {db.schema_version}; database ready in {db.startup_time * 1000:.1f}ms")
+
+    if args.history:
+        for version, name, applied_at in db.get_migration_history():
+            print(f"  {version:>3}  {applied_at}  {name}")
+    return 0
+
+
+def cmd_stats(db, args):
+    """Show, verify or rebuild the feedback statistics"""
+    if args.rebuild:
+        db.rebuild_stats()
+        print("Feedback statistics rebuilt.")
+
+    if args.verify:
+        mismatches = db.verify_stats()
+        if mismatches:
+            print(f"Found {len(mismatches)} mismatched statistics:")
+            for table, key, expected, actual in mismatches:
+                print(f"  {table}[{key}]: expected {expected}, found {actual}")
+            print("Run 'python manage.py stats --rebuild' to repair them.")
+            return 1
+        print("Feedback statistics match the feedback table.")
+
+    stats = db.get_feedback_stats()
+    print(f"Total feedback: {stats['total']}")
+    if stats['mean'] is not None:
+        print(f"Average rating: {stats['mean']:.2f}")
+    for rating, count in stats['histogram'].items():
+        print(f"  {rating}/5: {count}")
+    return 0
+
+
+def cmd_search_index(db, args):
+    """Backfill, optimize or verify the full-text search index"""
+    if args.rebuild:
+        db.rebuild_search_index()
+        print("Search index rebuilt from the feedback table.")
+
+    if args.optimize:
+        db.optimize_search_index()
+        print("Search index optimized.")
+
+    if args.verify or not (args.rebuild or args.optimize):
+        if not db.verify_search_index():
+            print("Search index does not match the feedback table.")
+            print("Run 'python manage.py search-index --rebuild' to repair it.")
+            return 1
+        print("Search index matches the feedback table.")
+    return 0
+
+
+def cmd_search(db, args):
+    """Print the best-matching feedback for a search"""
+    page = db.search_feedback(args.query, page_size=args.limit)
+    for feedback_id, student, _, rating, submitted, snippet in page.rows:
+        snippet = snippet.replace(SNIPPET_START, '[').replace(SNIPPET_END, ']')
+        print(f"#{feedback_id} {student} {rating}/5 {submitted}: {snippet}")
+    if not page.rows:
+        print("No matches.")
+    return 0
+
+
+def cmd_sessions(db, args):
+    """Revoke users' sessions, sweep expired ones and show who is logged in"""
+    # Read straight from the table; running servers see changes within their cache TTL
+    store = SessionStore(db, cache_size=0)
+    for username in args.revoke:
+        print(f"Revoked {store.revoke_user(username)} sessions of {username}.")
+    if args.purge:
+        print(f"Removed {store.purge_expired()} expired sessions.")
+
+    active = store.active_by_user()
+    print(f"Active sessions: {sum(active.values())}")
+    for username, count in sorted(active.items(), key=lambda item: (item[0] is None, item[0] or '')):
+        print(f"  {username or '(anonymous)':<20} {count:>6}")
+    return 0
+
+
+def cmd_dedup(db, args):
+    """Hash feedback from before the duplicate guard and delete repeated submissions"""
+    window = db.duplicate_window if args.window is None else args.window
+    hashed, removed = db.deduplicate_feedback(window=window, batch_size=args.batch_size)
+    if hashed:
+        print(f"Hashed {hashed} feedback rows written before the duplicate guard.")
+    print(f"Removed {removed} duplicate feedback rows (same student, rating and text within {window:g}s).")
+    if removed:
+        print("Run VACUUM to return the freed pages to the filesystem.")
+    return 0
+
+
+def cmd_terms(db, args):
+    """Define terms, archive cold ones and list them"""
+    try:
+        if args.define:
+            term = db.define_term(*args.define)
+            print(f"Defined term {term.name}: {term.starts_on} to {term.ends_on}")
+        for name in args.archive:
+            term = db.archive_term(name)
+            if term.path is None:
+                print(f"Term {name} has no feedback to archive.")
+            else:
+                size = os.path.getsize(term.path) / 1024 / 1024
+                print(f"Archived term {name}: {term.row_count} rows in {term.path} ({size:.1f} MiB)")
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    terms = db.get_terms()
+    if not terms:
+        print("No terms defined.")
+    for term in terms:
+        status = f"archived {term.archived_at}, {term.row_count} rows" if term.path else "live"
+        live = db.terms.live_count(term)
+        pending = f", {live} rows still live" if live and term.path else (f", {live} rows" if live else '')
+        print(f"  {term.name:<16} {term.starts_on} to {term.ends_on}  {status}{pending}")
+    return 0
+
+
+def cmd_replica(db, args):
+    """Refresh the read replica and show how far behind it is"""
+    if db.replica is None:
+        print("Error: no replica configured (set FEEDBACK_REPLICA_PATH)", file=sys.stderr)
+        return 1
+    if args.refresh:
+        db.replica.refresh(force=True)
+    stats = db.replica.stats()
+    if stats['lag'] is None:
+        print(f"Replica {db.replica.path} has not been taken yet.")
+        return 0
+    size = os.path.getsize(db.replica.path) / 1024 / 1024
+    print(f"Replica {db.replica.path} ({size:.1f} MiB)")
+    print(f"  lag:           {stats['lag']:.1f}s (reads fall back to the primary after {db.replica.max_staleness:g}s)")
+    if stats['refreshes']:
+        print(f"  refresh time:  {stats['refresh_time_total'] / stats['refreshes'] * 1000:.1f}ms")
+    return 0
+
+
+def cmd_retention(db, args):
+    """Archive terms older than the newest --keep-terms and reclaim the freed space"""
+    if args.enable_incremental_vacuum:
+        print("Converting to incremental auto-vacuum (one full VACUUM)...")
+        if db.enable_incremental_vacuum():
+            print("Incremental auto-vacuum enabled.")
+        else:
+            print("Incremental auto-vacuum was already enabled.")
+    if args.keep_terms is None:
+        if args.enable_incremental_vacuum:
+            return 0
+        print("Error: --keep-terms (or FEEDBACK_RETENTION_TERMS) is required", file=sys.stderr)
+        return 1
+    try:
+        retention = RetentionManager(db, args.keep_terms, batch_size=args.batch_size)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        terms = retention.due_terms()
+        if not terms:
+            print(f"Nothing to archive: no finished term older than the newest {args.keep_terms}.")
+        for term in terms:
+            chunks = retention.chunks(term)
+            print(f"Would archive {term.name} ({term.starts_on} to {term.ends_on}): "
+                  f"{sum(rows for _, rows in chunks)} rows in {len(chunks)} chunks")
+        storage = retention.storage()
+        print(f"Database {storage['bytes'] / 1024 / 1024:.1f} MiB, {storage['free_bytes'] / 1024 / 1024:.1f} MiB free, "
+              f"auto-vacuum {storage['auto_vacuum']}")
+        return 0
+
+    report = retention.run()
+    if report is None:
+        print("Error: another process is running the retention policy", file=sys.stderr)
+        return 1
+    for name in report.terms:
+        print(f"Archived term {name}")
+    print(f"Moved {report.rows_archived} rows in {report.chunks} chunks in {report.elapsed:.1f}s")
+    print(f"Database {report.bytes_before / 1024 / 1024:.1f} MiB -> {report.bytes_after / 1024 / 1024:.1f} MiB "
+          f"({report.bytes_reclaimed / 1024 / 1024:.1f} MiB reclaimed)")
+    for probe, (before, after) in report.latency.items():
+        print(f"  {probe:<12} {before:8.2f}ms -> {after:8.2f}ms")
+    storage = retention.storage()
+    if storage['auto_vacuum'] != 'incremental' and storage['freelist_count']:
+        print(f"{storage['free_bytes'] / 1024 / 1024:.1f} MiB of free pages stay in the file; "
+              "run with --enable-incremental-vacuum once to reclaim them.")
+    return 0
+
+
+def cmd_build_assets(db, args):
+    """Build the fingerprinted, precompressed copies of the static files"""
+    started = time.perf_counter()
+    manifest = build_assets(args.source, args.output)
+    for name, entry in sorted(manifest['assets'].items()):
+        sizes = ', '.join(f"{encoding} {size / 1024:.1f} KiB" for encoding, size in entry['sizes'].items())
+        print(f"{name} -> {entry['path']} ({sizes})")
+    print(f"Built {len(manifest['assets'])} assets into {args.output} in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+def cmd_report(db, args):
+    """Print the weekly rating trend, ratings per cohort and top terms by rating"""
+    started = time.perf_counter()
+    try:
+        reports = FeedbackAnalytics(db, chunk_size=args.chunk_size).reports(weeks=args.weeks, terms=args.terms)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+    print(f"Analysed {reports.rows} feedback rows in {elapsed:.2f}s")
+
+    def distribution(histogram, count):
+        return ' '.join(f'{100 * n / count:>4.0f}%' for n in histogram) if count else ''
+
+    print(f"\nWeekly rating trend (last {args.weeks} weeks):")
+    print(f"  {'week of':<12} {'entries':>8} {'mean':>6}   {'1/5':>5} {'2/5':>5} {'3/5':>5} {'4/5':>5} {'5/5':>5}")
+    for week in reports.weekly:
+        mean = f'{week.mean:.2f}' if week.mean is not None else '-'
+        print(f"  {week.week.isoformat():<12} {week.count:>8} {mean:>6}   {distribution(week.histogram, week.count)}")
+
+    print("\nRatings by cohort (month of each student's first feedback):")
+    print(f"  {'cohort':<12} {'students':>8} {'entries':>8} {'mean':>6}   "
+          f"{'1/5':>5} {'2/5':>5} {'3/5':>5} {'4/5':>5} {'5/5':>5}")
+    for cohort in reports.cohorts:
+        print(f"  {cohort.cohort:<12} {cohort.students:>8} {cohort.count:>8} {cohort.mean:>6.2f}   "
+              f"{distribution(cohort.histogram, cohort.count)}")
+
+    for title, terms in (('low (1-2)', reports.low_terms), ('high (4-5)', reports.high_terms)):
+        print(f"\nTop terms in {title} feedback (entries with low / high ratings):")
+        for term in terms:
+            print(f"  {term.term:<24} {term.low:>8} {term.high:>8}")
+    return 0
+
+
+def cmd_export(db, args):
+    """Stream the feedback table to a file or stdout"""
+    filters = {name: getattr(args, name) for name in ('rating', 'student', 'date_from', 'date_to')
+               if getattr(args, name)}
+    progress = ExportProgress()
+    try:
+        chunks = export_feedback(db, args.format, batch_size=args.batch_size, progress=progress, **filters)
+        # The filters are validated when the first chunk is produced, before any output is opened
+        first = next(chunks, '')
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if args.output == '-':
+        out = sys.stdout
+    else:
+        out = open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        out.write(first)
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Exported {progress.rows} rows in {progress.elapsed:.2f}s "
+          f"({progress.rows_per_second:.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+def cmd_import(db, args):
+    """Bulk-load feedback or users and print the import report"""
+    run = import_feedback if args.command == 'import-feedback' else import_users
+    report = run(db, args.path, batch_size=args.batch_size, fmt=args.format, restart=args.restart)
+
+    if report.resumed_from:
+        print(f"Resumed after line {report.resumed_from} ({report.skipped} records skipped).")
+    print(f"Imported {report.imported} {report.kind} rows in {report.elapsed:.2f}s "
+          f"({report.rows_per_second:.0f} rows/s), {len(report.errors)} rejected.")
+
+    if report.errors:
+        if args.errors:
+            report.write_errors(args.errors)
+            print(f"Row errors written to {args.errors}")
+        else:
+            for line_number, error in report.errors[:20]:
+                print(f"  line {line_number}: {error}")
+            if len(report.errors) > 20:
+                print(f"  ... and {len(report.errors) - 20} more (use --errors to save them all)")
+    return 1 if report.errors else 0
+
+
+def add_filter_arguments(parser):
+    """Add the dashboard's feedback filters to a command"""
+    parser.add_argument('--rating', type=int, help='only feedback with this rating (1-5)')
+    parser.add_argument('--student', help="only this student's feedback")
+    parser.add_argument('--date-from', help='first day to include (YYYY-MM-DD)')
+    parser.add_argument('--date-to', help='last day to include (YYYY-MM-DD)')
+
+
+def build_parser():
+    """Create the command-line parser"""
+    parser = argparse.ArgumentParser(description="Student Feedback Portal maintenance commands")
+    parser.add_argument('--db', default=os.environ.get('FEEDBACK_DB_PATH', 'feedback_portal.db'),
+                        help='path to the SQLite database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='apply pending schema migrations')
+    migrate_parser.add_argument('--history', action='store_true', help='list every applied migration')
+    migrate_parser.set_defaults(func=cmd_migrate)
+
+    stats_parser = subparsers.add_parser('stats', help='show, verify or rebuild feedback statistics')
+    stats_parser.add_argument('--verify', action='store_true', help='compare against the raw table')
+    stats_parser.add_argument('--rebuild', action='store_true', help='recompute from the raw table')
+    stats_parser.set_defaults(func=cmd_stats)
+
+    index_parser = subparsers.add_parser('search-index', help='backfill, optimize or verify the search index')
+    index_parser.add_argument('--rebuild', action='store_true', help='re-index every feedback row')
+    index_parser.add_argument('--optimize', action='store_true', help='merge index segments')
+    index_parser.add_argument('--verify', action='store_true', help='check the index against the table')
+    index_parser.set_defaults(func=cmd_search_index)
+
+    search_parser = subparsers.add_parser('search', help='search feedback text')
+    search_parser.add_argument('query', help='words to look for (word* matches a prefix)')
+    search_parser.add_argument('--limit', type=int, default=20, help='most results to show')
+    search_parser.set_defaults(func=cmd_search)
+
+    sessions_parser = subparsers.add_parser('sessions', help='list, revoke or sweep login sessions')
+    sessions_parser.add_argument('--revoke', action='append', default=[], metavar='USERNAME',
+                                 help="log this user out everywhere (repeatable)")
+    sessions_parser.add_argument('--purge', action='store_true', help='delete expired sessions')
+    sessions_parser.set_defaults(func=cmd_sessions)
+
+    dedup_parser = subparsers.add_parser('dedup', help='delete repeated feedback submissions')
+    dedup_parser.add_argument('--window', type=float, default=None,
+                              help='seconds within which identical feedback counts as a repeat '
+                                   '(default: FEEDBACK_DUPLICATE_WINDOW or 600)')
+    dedup_parser.add_argument('--batch-size', type=int, default=DEDUP_BATCH_SIZE, help='rows per transaction')
+    dedup_parser.set_defaults(func=cmd_dedup)
+
+    terms_parser = subparsers.add_parser('terms', help='define, list or archive terms')
+    terms_parser.add_argument('--define', nargs=3, metavar=('NAME', 'START', 'END'),
+                              help='add a term covering START..END (YYYY-MM-DD, inclusive)')
+    terms_parser.add_argument('--archive', action='append', default=[], metavar='NAME',
+                              help="move the term's feedback to its read-only archive file (repeatable)")
+    terms_parser.set_defaults(func=cmd_terms)
+
+    replica_parser = subparsers.add_parser('replica', help='refresh the read replica or show its lag')
+    replica_parser.add_argument('--refresh', action='store_true', help='copy the primary into a new snapshot now')
+    replica_parser.set_defaults(func=cmd_replica)
+
+    report_parser = subparsers.add_parser('report', help='rating trend, cohort and keyword reports')
+    report_parser.add_argument('--weeks', type=int, default=26, help='most recent weeks in the trend')
+    report_parser.add_argument('--terms', type=int, default=15, help='terms listed per rating group')
+    report_parser.add_argument('--chunk-size', type=int, default=50000, help='rows loaded per chunk')
+    report_parser.set_defaults(func=cmd_report)
+
+    retention_parser = subparsers.add_parser('retention', help='archive old terms and reclaim the freed space')
+    keep_terms = os.environ.get('FEEDBACK_RETENTION_TERMS')
+    retention_parser.add_argument('--keep-terms', type=int, default=int(keep_terms) if keep_terms else None,
+                                  help='newest started terms to keep live (default: FEEDBACK_RETENTION_TERMS)')
+    retention_parser.add_argument('--batch-size', type=int,
+                                  default=int(os.environ.get('FEEDBACK_RETENTION_BATCH_SIZE', 20000)),
+                                  help='rows moved per transaction (whole days at a time)')
+    retention_parser.add_argument('--dry-run', action='store_true', help='show what would be archived')
+    retention_parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                                  help='convert a database created before retention support (one full VACUUM)')
+    retention_parser.set_defaults(func=cmd_retention)
+
+    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    assets_parser = subparsers.add_parser('build-assets', aliases=['assets'],
+                                          help='fingerprint and precompress the static files')
+    assets_parser.add_argument('--source', default=static_dir, help='directory of static files')
+    assets_parser.add_argument('--output',
+                               default=os.environ.get('FEEDBACK_ASSET_DIR') or os.path.join(static_dir, 'dist'),
+                               help='where to write the build (default: FEEDBACK_ASSET_DIR or static/dist)')
+    assets_parser.set_defaults(func=cmd_build_assets)
+
+    export_parser = subparsers.add_parser('export', help='stream feedback as CSV or NDJSON')
+    export_parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    export_parser.add_argument('--output', '-o', default='-', help="output file ('-' for stdout)")
+    export_parser.add_argument('--batch-size', type=int, default=1000, help='rows fetched per batch')
+    add_filter_arguments(export_parser)
+    export_parser.set_defaults(func=cmd_export)
+
+    for name, what in (('import-feedback', 'historical feedback'), ('import-users', 'a user roster')):
+        import_parser = subparsers.add_parser(name, help=f'bulk-load {what} from CSV or NDJSON')
+        import_parser.add_argument('path', help='CSV or NDJSON file to load')
+        import_parser.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file extension')
+        import_parser.add_argument('--batch-size', type=int, default=1000, help='rows per transaction')
+        import_parser.add_argument('--restart', action='store_true',
+                                   help='ignore the saved checkpoint and start from the first line')
+        import_parser.add_argument('--errors', help='write rejected rows to this CSV file')
+        import_parser.set_defaults(func=cmd_import)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Only commands that change or inspect the replica open it; opening may copy the database
+    replica_path = os.environ.get('FEEDBACK_REPLICA_PATH') if args.command in ('replica', 'terms', 'retention') else None
+    try:
+        db = Database(args.db, term_dir=os.environ.get('FEEDBACK_TERM_DIR'),
+                      duplicate_window=float(os.environ.get('FEEDBACK_DUPLICATE_WINDOW', 600.0)),
+                      replica_path=replica_path,
+                      replica_refresh_interval=float(os.environ.get('FEEDBACK_REPLICA_REFRESH_INTERVAL', 10.0)),
+                      replica_max_staleness=float(os.environ.get('FEEDBACK_REPLICA_MAX_STALENESS', 30.0)))
+    except ValueError as e:
+        # e.g. FEEDBACK_REPLICA_PATH set for a database that is not in WAL mode
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    try:
+        return args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
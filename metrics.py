@@ -0,0 +1,420 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Most SQL statements kept per request for the slow-request log
+MAX_TRACED_STATEMENTS = 50
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values, optionally split by labels"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # labels -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            return state[-1] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            for bound, bucket_count in zip(self.buckets, state):
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames, key, [('le', _format_value(bound))]), bucket_count)
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), state[-2]
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), state[-1]
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callback at scrape time"""
+
+    def __init__(self, name, help_text, callback, type_name='gauge'):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.type_name = type_name
+
+    def samples(self):
+        yield self.name, '', self.callback()
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name, help_text, callback):
+        return self.register(CallbackMetric(name, help_text, callback))
+
+    def counter_callback(self, name, help_text, callback):
+        return self.register(CallbackMetric(name, help_text, callback, type_name='counter'))
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTrace:
+    """Time breakdown of one request for the slow-request log"""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.queries = []
+        self.statements = []
+        self.dropped_statements = 0
+        self.template_time = 0.0
+        self._template_started = None
+
+    @property
+    def query_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def add_statement(self, sql):
+        if len(self.statements) < MAX_TRACED_STATEMENTS:
+            self.statements.append(' '.join(sql.split()))
+        else:
+            self.dropped_statements += 1
+
+
+class Instrumentation:
+    """Records request, query and error metrics for the Flask app and its Database.
+
+    Usage:
+        instrumentation = Instrumentation(slow_request_ms=500)
+        instrumentation.init_app(app)
+        instrumentation.instrument_database(db)
+    """
+
+    def __init__(self, registry=None, slow_request_ms=None, untimed_endpoints=()):
+        self.registry = registry or MetricsRegistry()
+        self.slow_request_ms = slow_request_ms
+        # Routes left out of the latency histogram and slow-request log, e.g. long-lived streams
+        self.untimed_endpoints = frozenset(untimed_endpoints)
+        self._local = threading.local()
+
+        self.request_latency = self.registry.histogram(
+            'feedback_http_request_duration_seconds', 'Request latency by route',
+            ('endpoint', 'method', 'status'))
+        self.query_latency = self.registry.histogram(
+            'feedback_db_query_duration_seconds', 'Database method latency', ('method',))
+        self.errors = self.registry.counter(
+            'feedback_errors_total', 'Errors by where they were handled', ('source',))
+        self.slow_requests = self.registry.counter(
+            'feedback_slow_requests_total', 'Requests slower than the slow-request threshold', ('endpoint',))
+
+    # Request tracing
+
+    @property
+    def trace(self):
+        """The RequestTrace of the request running on this thread, if any"""
+        return getattr(self._local, 'trace', None)
+
+    def record_error(self, source, error=None):
+        """Count an error handled by application code and log it"""
+        self.errors.inc(source=source)
+        if error is not None:
+            logger.error("%s error: %s", source, error)
+
+    # Flask integration
+
+    def init_app(self, app):
+        """Install request timing hooks and template render timing"""
+        from flask import request, template_rendered, before_render_template
+
+        @app.before_request
+        def start_request_timer():
+            self._local.trace = RequestTrace(request.method, request.path)
+
+        @app.after_request
+        def record_request(response):
+            trace = self.trace
+            if trace is not None:
+                self._finish(trace, request, response.status_code)
+            return response
+
+        @app.teardown_request
+        def record_request_error(error):
+            if error is not None:
+                self.record_error('request')
+            # after_request does not run for unhandled exceptions
+            trace = self.trace
+            if trace is not None:
+                self._finish(trace, request, 500)
+
+        def on_before_render(sender, template, context, **extra):
+            trace = self.trace
+            if trace is not None:
+                trace._template_started = time.perf_counter()
+
+        def on_rendered(sender, template, context, **extra):
+            trace = self.trace
+            if trace is not None and trace._template_started is not None:
+                trace.template_time += time.perf_counter() - trace._template_started
+                trace._template_started = None
+
+        before_render_template.connect(on_before_render, app, weak=False)
+        template_rendered.connect(on_rendered, app, weak=False)
+
+    def _finish(self, trace, request, status):
+        """Record a finished request and log it if it was slow"""
+        self._local.trace = None
+        elapsed = time.perf_counter() - trace.started
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        if endpoint in self.untimed_endpoints:
+            return
+        self.request_latency.observe(elapsed, endpoint=endpoint, method=request.method, status=status)
+
+        if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+            self.slow_requests.inc(endpoint=endpoint)
+            queries = ', '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in trace.queries)
+            statements = '\n    '.join(trace.statements)
+            if trace.dropped_statements:
+                statements += f'\n    ... {trace.dropped_statements} more'
+            logger.warning(
+                "Slow request %s %s: %.1fms total, %.1fms in database (%s), %.1fms rendering templates\n"
+                "  SQL:\n    %s",
+                trace.method, trace.path, elapsed * 1000, trace.query_time * 1000, queries or 'none',
+                trace.template_time * 1000, statements or 'none')
+
+    # Database integration
+
+    def instrument_database(self, db, prefix='feedback_db'):
+        """Time Database methods and export connection pool statistics"""
+        def observe_query(method, seconds, error):
+            self.query_latency.observe(seconds, method=method)
+            if error is not None:
+                self.record_error(f'db.{method}')
+            trace = self.trace
+            if trace is not None:
+                trace.queries.append((method, seconds))
+
+        def observe_statement(sql):
+            trace = self.trace
+            if trace is not None:
+                trace.add_statement(sql)
+
+        db.query_observer = observe_query
+        if self.slow_request_ms is not None:
+            db.statement_observer = observe_statement
+
+        pool = db.pool
+        self.registry.counter_callback(f'{prefix}_connections_opened_total', 'SQLite connections opened',
+                                       lambda: pool.stats()['connections_opened'])
+        self.registry.gauge_callback(f'{prefix}_connections_in_use', 'Pooled connections checked out',
+                                     lambda: pool.stats()['in_use_connections'])
+        self.registry.gauge_callback(f'{prefix}_connections_idle', 'Pooled connections waiting for reuse',
+                                     lambda: pool.stats()['idle_connections'])
+        self.registry.counter_callback(f'{prefix}_pool_waits_total', 'Checkouts that waited for a connection',
+                                       lambda: pool.stats()['waits'])
+        self.registry.counter_callback(f'{prefix}_pool_wait_seconds_total', 'Time spent waiting for a connection',
+                                       lambda: pool.stats()['wait_time_total'])
+        self.registry.counter_callback(f'{prefix}_pool_timeouts_total', 'Checkouts that timed out',
+                                       lambda: pool.stats()['timeouts'])
+
+    def instrument_queue(self, submission_queue, prefix='feedback_write_queue'):
+        """Export write-behind queue depth and flush statistics"""
+        self.registry.gauge_callback(f'{prefix}_depth', 'Submissions waiting to be written',
+                                     lambda: submission_queue.stats()['depth'])
+        self.registry.counter_callback(f'{prefix}_flushes_total', 'Group commits performed',
+                                       lambda: submission_queue.stats()['flushes'])
+        self.registry.counter_callback(f'{prefix}_flushed_rows_total', 'Submissions written',
+                                       lambda: submission_queue.stats()['flushed_rows'])
+        self.registry.counter_callback(f'{prefix}_duplicate_rows_total', 'Submissions dropped as duplicates',
+                                       lambda: submission_queue.stats()['duplicate_rows'])
+        self.registry.counter_callback(f'{prefix}_rejected_total', 'Submissions rejected by backpressure',
+                                       lambda: submission_queue.stats()['rejected'])
+        self.registry.counter_callback(f'{prefix}_flush_seconds_total', 'Time spent in group commits',
+                                       lambda: submission_queue.stats()['flush_time_total'])
+
+    def instrument_cache(self, cache, prefix):
+        """Export an LRUCache's size and hit/miss/eviction counters"""
+        self.registry.gauge_callback(f'{prefix}_size', 'Entries held in the cache',
+                                     lambda: cache.stats()['size'])
+        self.registry.counter_callback(f'{prefix}_hits_total', 'Cache lookups that found an entry',
+                                       lambda: cache.stats()['hits'])
+        self.registry.counter_callback(f'{prefix}_misses_total', 'Cache lookups that found nothing',
+                                       lambda: cache.stats()['misses'])
+        self.registry.counter_callback(f'{prefix}_evictions_total', 'Entries evicted to stay within size',
+                                       lambda: cache.stats()['evictions'])
+
+    def instrument_sessions(self, session_store, prefix='feedback_sessions'):
+        """Export the live session count and the session cache statistics"""
+        self.registry.gauge_callback(f'{prefix}_active', 'Sessions that have not expired',
+                                     session_store.count_active)
+        if session_store.cache is not None:
+            self.instrument_cache(session_store.cache, f'{prefix}_cache')
+
+    def instrument_login_throttle(self, throttle, prefix='feedback_login'):
+        """Count logins rejected by rate limiting and export the tracked key count"""
+        throttled = self.registry.counter(f'{prefix}_throttled_total',
+                                          'Login attempts rejected by rate limiting', ('scope',))
+        throttle.reject_observer = lambda scope: throttled.inc(scope=scope)
+        self.registry.gauge_callback(f'{prefix}_rate_limit_keys', 'IPs and usernames with live rate-limit counters',
+                                     lambda: len(throttle.limiter))
+
+    def instrument_replica(self, replica, prefix='feedback_replica'):
+        """Export the replica's lag and its refresh and read counters"""
+        def lag():
+            value = replica.lag()
+            return float('nan') if value is None else value
+
+        self.registry.gauge_callback(f'{prefix}_lag_seconds', 'Age of the snapshot reporting reads are served from',
+                                     lag)
+        self.registry.counter_callback(f'{prefix}_refreshes_total', 'Snapshots copied from the primary',
+                                       lambda: replica.stats()['refreshes'])
+        self.registry.counter_callback(f'{prefix}_refresh_failures_total', 'Snapshot copies that failed',
+                                       lambda: replica.stats()['refresh_failures'])
+        self.registry.counter_callback(f'{prefix}_refresh_seconds_total', 'Time spent copying snapshots',
+                                       lambda: replica.stats()['refresh_time_total'])
+        self.registry.counter_callback(f'{prefix}_reads_total', 'Reporting blocks served from the replica',
+                                       lambda: replica.stats()['reads'])
+        self.registry.counter_callback(f'{prefix}_fallbacks_total',
+                                       'Reporting blocks sent to the primary because the replica was too stale',
+                                       lambda: replica.stats()['fallbacks'])
+
+    def instrument_retention(self, retention, prefix='feedback_retention'):
+        """Export the retention policy's run, row and byte counters"""
+        def last_run():
+            value = retention.stats()['last_run']
+            return float('nan') if value is None else value
+
+        self.registry.gauge_callback(f'{prefix}_last_run_timestamp_seconds',
+                                     'When this process last finished a retention run', last_run)
+        self.registry.counter_callback(f'{prefix}_runs_total', 'Retention runs finished',
+                                       lambda: retention.stats()['runs'])
+        self.registry.counter_callback(f'{prefix}_failures_total', 'Retention runs that failed',
+                                       lambda: retention.stats()['failures'])
+        self.registry.counter_callback(f'{prefix}_rows_archived_total', 'Feedback rows moved to term archives',
+                                       lambda: retention.stats()['rows_archived'])
+        self.registry.counter_callback(f'{prefix}_reclaimed_bytes_total',
+                                       'Bytes handed back to the filesystem by incremental vacuum',
+                                       lambda: retention.stats()['bytes_reclaimed'])
+
+    def instrument_profiler(self, profiler, prefix='feedback_profiler'):
+        """Export how many requests were profiled and what sampling cost"""
+        self.registry.gauge_callback(f'{prefix}_active', 'Requests being profiled',
+                                     lambda: profiler.stats()['active'])
+        self.registry.counter_callback(f'{prefix}_profiles_total', 'Requests profiled',
+                                       lambda: profiler.stats()['profiles'])
+        self.registry.counter_callback(f'{prefix}_samples_total', 'Stack samples taken',
+                                       lambda: profiler.stats()['samples'])
+        self.registry.counter_callback(f'{prefix}_sampling_seconds_total', 'Time spent taking stack samples',
+                                       lambda: profiler.stats()['sampling_time_total'])
+
+    def instrument_stream(self, broker, prefix='feedback_stream'):
+        """Export the live feed's open streams and its published and dropped rows"""
+        self.registry.gauge_callback(f'{prefix}_subscribers', 'Open /admin/stream connections',
+                                     lambda: broker.stats()['subscribers'])
+        self.registry.counter_callback(f'{prefix}_subscriptions_total', 'Streams opened',
+                                       lambda: broker.stats()['subscriptions'])
+        self.registry.counter_callback(f'{prefix}_rejected_subscriptions_total',
+                                       'Streams refused because max_subscribers were open',
+                                       lambda: broker.stats()['rejected_subscriptions'])
+        self.registry.counter_callback(f'{prefix}_published_rows_total', 'Committed feedback rows published',
+                                       lambda: broker.stats()['published_rows'])
+        self.registry.counter_callback(f'{prefix}_dropped_rows_total',
+                                       'Buffered rows dropped for slow subscribers, who re-read them from the table',
+                                       lambda: broker.stats()['dropped_rows'])
@@ -0,0 +1,428 @@
+"""Versioned schema migrations.
+
+Each migration brings the schema from version - 1 to version. Pending
+migrations are applied together in one write transaction and recorded in
+schema_migrations, so a database that is already current costs a single
+query at startup. Migrations are written to be safe on databases created
+before versioning existed (CREATE ... IF NOT EXISTS), which start at
+version 0 and replay every step.
+
+To change the schema, append a Migration with the next version number;
+never edit one that has shipped. Migrations spell out their own DDL rather
+than calling Database helpers, so later changes to the application code
+can't rewrite what an old step does. The one deliberate exception is the
+default users' passwords, which migration 1 hashes with db.hash_password():
+the stored hashes name their own scheme and cost, so any configured engine
+can verify them, and logins re-hash them to the current setting anyway.
+
+Migration 5 skips the full-text index when SQLite lacks FTS5; Database
+retries it with create_missing_search_index() at startup, so search turns
+on once SQLite is upgraded.
+"""
+import logging
+import sqlite3
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# apply(db, cursor) runs inside the migration transaction and must not commit
+Migration = namedtuple('Migration', ['version', 'name', 'apply'])
+
+DEFAULT_USERS = [
+    ('student1', 'password123', 'student'),
+    ('admin', 'admin123', 'admin'),
+]
+
+
+def create_core_tables(db, cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL CHECK (role IN ('student', 'admin'))
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_username TEXT NOT NULL,
+            feedback_text TEXT NOT NULL,
+            rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+            submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (student_username) REFERENCES users(username)
+        )
+    ''')
+    # Hashed with the configured engine on purpose (see the module docstring);
+    # only hash passwords for users that are actually missing
+    existing = {row[0] for row in cursor.execute(
+        'SELECT username FROM users WHERE username IN (?, ?)', [username for username, _, _ in DEFAULT_USERS])}
+    for username, password, role in DEFAULT_USERS:
+        if username not in existing:
+            cursor.execute('INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)',
+                           (username, db.hash_password(password), role))
+
+
+def create_feedback_indexes(db, cursor):
+    # Back the admin dashboard's keyset pagination and filters
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_date ON feedback (submission_date, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_rating_date ON feedback (rating, submission_date, id)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_feedback_student_date
+        ON feedback (student_username, submission_date, id)
+    ''')
+
+
+def create_import_checkpoints(db, cursor):
+    # Progress of bulk imports, committed together with each batch
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            kind TEXT NOT NULL,
+            source TEXT NOT NULL,
+            line INTEGER NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, source)
+        )
+    ''')
+
+
+def create_summary_statistics(db, cursor):
+    cursor.execute('''
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name = 'feedback_stats_insert'
+    ''')
+    triggers_existed = cursor.fetchone()[0] > 0
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_rating_stats (
+            rating INTEGER PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_daily_stats (
+            day TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            rating_sum INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_student_stats (
+            student_username TEXT PRIMARY KEY,
+            count INTEGER NOT NULL,
+            rating_sum INTEGER NOT NULL
+        )
+    ''')
+    # One row per rating so the histogram is always complete
+    cursor.execute('''
+        INSERT OR IGNORE INTO feedback_rating_stats (rating, count)
+        VALUES (1, 0), (2, 0), (3, 0), (4, 0), (5, 0)
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_stats_insert
+        AFTER INSERT ON feedback
+        BEGIN
+            UPDATE feedback_rating_stats SET count = count + 1 WHERE rating = NEW.rating;
+            INSERT INTO feedback_daily_stats (day, count, rating_sum)
+            VALUES (date(NEW.submission_date), 1, NEW.rating)
+            ON CONFLICT (day) DO UPDATE SET
+                count = count + 1, rating_sum = rating_sum + excluded.rating_sum;
+            INSERT INTO feedback_student_stats (student_username, count, rating_sum)
+            VALUES (NEW.student_username, 1, NEW.rating)
+            ON CONFLICT (student_username) DO UPDATE SET
+                count = count + 1, rating_sum = rating_sum + excluded.rating_sum;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_stats_delete
+        AFTER DELETE ON feedback
+        BEGIN
+            UPDATE feedback_rating_stats SET count = count - 1 WHERE rating = OLD.rating;
+            UPDATE feedback_daily_stats
+            SET count = count - 1, rating_sum = rating_sum - OLD.rating
+            WHERE day = date(OLD.submission_date);
+            DELETE FROM feedback_daily_stats
+            WHERE day = date(OLD.submission_date) AND count <= 0;
+            UPDATE feedback_student_stats
+            SET count = count - 1, rating_sum = rating_sum - OLD.rating
+            WHERE student_username = OLD.student_username;
+            DELETE FROM feedback_student_stats
+            WHERE student_username = OLD.student_username AND count <= 0;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_stats_update
+        AFTER UPDATE OF student_username, rating, submission_date ON feedback
+        BEGIN
+            UPDATE feedback_rating_stats SET count = count - 1 WHERE rating = OLD.rating;
+            UPDATE feedback_rating_stats SET count = count + 1 WHERE rating = NEW.rating;
+            UPDATE feedback_daily_stats
+            SET count = count - 1, rating_sum = rating_sum - OLD.rating
+            WHERE day = date(OLD.submission_date);
+            DELETE FROM feedback_daily_stats
+            WHERE day = date(OLD.submission_date) AND count <= 0;
+            INSERT INTO feedback_daily_stats (day, count, rating_sum)
+            VALUES (date(NEW.submission_date), 1, NEW.rating)
+            ON CONFLICT (day) DO UPDATE SET
+                count = count + 1, rating_sum = rating_sum + excluded.rating_sum;
+            UPDATE feedback_student_stats
+            SET count = count - 1, rating_sum = rating_sum - OLD.rating
+            WHERE student_username = OLD.student_username;
+            DELETE FROM feedback_student_stats
+            WHERE student_username = OLD.student_username AND count <= 0;
+            INSERT INTO feedback_student_stats (student_username, count, rating_sum)
+            VALUES (NEW.student_username, 1, NEW.rating)
+            ON CONFLICT (student_username) DO UPDATE SET
+                count = count + 1, rating_sum = rating_sum + excluded.rating_sum;
+        END
+    ''')
+
+    # Databases created before the triggers existed need a one-off backfill
+    if not triggers_existed:
+        cursor.execute('''
+            UPDATE feedback_rating_stats
+            SET count = (SELECT COUNT(*) FROM feedback WHERE feedback.rating = feedback_rating_stats.rating)
+        ''')
+        cursor.execute('DELETE FROM feedback_daily_stats')
+        cursor.execute('''
+            INSERT INTO feedback_daily_stats (day, count, rating_sum)
+            SELECT date(submission_date), COUNT(*), SUM(rating) FROM feedback GROUP BY 1
+        ''')
+        cursor.execute('DELETE FROM feedback_student_stats')
+        cursor.execute('''
+            INSERT INTO feedback_student_stats (student_username, count, rating_sum)
+            SELECT student_username, COUNT(*), SUM(rating) FROM feedback GROUP BY 1
+        ''')
+
+
+def create_search_index(db, cursor):
+    cursor.execute('''
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'table' AND name = 'feedback_fts'
+    ''')
+    index_existed = cursor.fetchone()[0] > 0
+
+    try:
+        # External-content table: the text lives only in feedback
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5(
+                feedback_text,
+                content = 'feedback',
+                content_rowid = 'id',
+                tokenize = 'porter unicode61'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning("Skipped the full-text index; search stays disabled until SQLite has FTS5: %s", e)
+        return
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_insert
+        AFTER INSERT ON feedback
+        BEGIN
+            INSERT INTO feedback_fts (rowid, feedback_text) VALUES (NEW.id, NEW.feedback_text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_delete
+        AFTER DELETE ON feedback
+        BEGIN
+            INSERT INTO feedback_fts (feedback_fts, rowid, feedback_text)
+            VALUES ('delete', OLD.id, OLD.feedback_text);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS feedback_fts_update
+        AFTER UPDATE OF feedback_text ON feedback
+        BEGIN
+            INSERT INTO feedback_fts (feedback_fts, rowid, feedback_text)
+            VALUES ('delete', OLD.id, OLD.feedback_text);
+            INSERT INTO feedback_fts (rowid, feedback_text) VALUES (NEW.id, NEW.feedback_text);
+        END
+    ''')
+
+    # Index rows that were stored before the index existed
+    if not index_existed:
+        cursor.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+
+
+def create_version_counter(db, cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO feedback_version (id, version, updated_at)
+        VALUES (1, 0, CURRENT_TIMESTAMP)
+    ''')
+    for event in ('INSERT', 'DELETE', 'UPDATE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS feedback_version_{event.lower()}
+            AFTER {event} ON feedback
+            BEGIN
+                UPDATE feedback_version
+                SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = 1;
+            END
+        ''')
+
+
+def create_sessions(db, cursor):
+    # Server-side login sessions; data is the session dict as tagged JSON
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            username TEXT,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    # Per-user revocation and the expiry sweep
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions (username)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+
+
+def create_rate_limits(db, cursor):
+    # Sliding-window counters shared by every worker (see ratelimit.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            window_index INTEGER NOT NULL,
+            previous INTEGER NOT NULL,
+            current INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires_at)')
+
+
+def create_term_catalog(db, cursor):
+    # Terms and, once archived, the read-only file holding their feedback (see terms.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_terms (
+            name TEXT PRIMARY KEY,
+            starts_on TEXT NOT NULL,
+            ends_on TEXT NOT NULL,
+            path TEXT,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            archived_at TIMESTAMP
+        )
+    ''')
+
+
+def create_duplicate_guard(db, cursor):
+    # Hash of (student, rating, normalized text) and the index the retry probe
+    # and the dedup pass run on; see database.feedback_hash. Hashing and
+    # compacting the existing rows is left to `manage.py dedup`, which works in
+    # short batches instead of holding the migration's write lock over the table
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(feedback)')}
+    if 'content_hash' not in columns:
+        cursor.execute('ALTER TABLE feedback ADD COLUMN content_hash BLOB')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_feedback_duplicates
+        ON feedback (content_hash, submission_date)
+    ''')
+    if cursor.execute('SELECT 1 FROM feedback WHERE content_hash IS NULL LIMIT 1').fetchone():
+        logger.warning("Feedback written before the duplicate guard is unhashed; "
+                       "run `python manage.py dedup` to hash it and remove stored repeats")
+
+
+def create_token_generation(db, cursor):
+    # Bumped to revoke every API token issued to the user (see api.FeedbackApi)
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(users)')}
+    if 'token_generation' not in columns:
+        cursor.execute('ALTER TABLE users ADD COLUMN token_generation INTEGER NOT NULL DEFAULT 0')
+
+
+MIGRATIONS = [
+    Migration(1, 'users and feedback tables with default users', create_core_tables),
+    Migration(2, 'feedback pagination indexes', create_feedback_indexes),
+    Migration(3, 'feedback summary statistics', create_summary_statistics),
+    Migration(4, 'import checkpoints', create_import_checkpoints),
+    Migration(5, 'full-text search index', create_search_index),
+    Migration(6, 'feedback version counter', create_version_counter),
+    Migration(7, 'server-side sessions', create_sessions),
+    Migration(8, 'login rate limits', create_rate_limits),
+    Migration(9, 'feedback term catalog', create_term_catalog),
+    Migration(10, 'feedback duplicate guard', create_duplicate_guard),
+    Migration(11, 'api token revocation', create_token_generation),
+]
+
+
+def current_version(conn):
+    """Return the newest applied migration, or 0 for an unversioned database"""
+    try:
+        return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+    except sqlite3.OperationalError:
+        # No schema_migrations table yet
+        return 0
+
+
+def pending(conn, migrations=MIGRATIONS):
+    """Return the migrations newer than the database's schema version"""
+    version = current_version(conn)
+    return [migration for migration in migrations if migration.version > version]
+
+
+def search_index_exists(conn):
+    """Whether the feedback_fts full-text index exists"""
+    return conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'"
+    ).fetchone()[0] > 0
+
+
+def create_missing_search_index(db, conn, migrations=MIGRATIONS):
+    """Create the full-text index that an applied create_search_index skipped; returns whether it exists"""
+    if search_index_exists(conn):
+        return True
+    version = next((migration.version for migration in migrations
+                    if migration.apply is create_search_index), None)
+    if version is None or current_version(conn) < version:
+        return False
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        create_search_index(db, conn.cursor())
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    created = search_index_exists(conn)
+    if created:
+        logger.info("Created the full-text index skipped by schema migration %d", version)
+    return created
+
+
+def migrate(db, conn, migrations=MIGRATIONS):
+    """Apply every pending migration in one transaction; returns the migrations applied"""
+    if not pending(conn, migrations):
+        return []
+
+    # Take the write lock first, then look again: another process may have
+    # migrated while we waited
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        todo = pending(conn, migrations)
+        for migration in todo:
+            migration.apply(db, cursor)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)',
+                           (migration.version, migration.name))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return todo
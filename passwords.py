@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Legacy rows store an unsalted SHA-256 hex digest
+_LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class Pbkdf2Hasher:
+    """PBKDF2-HMAC-SHA256, encoded as pbkdf2_sha256$iterations$salt$hash"""
+
+    scheme = 'pbkdf2_sha256'
+
+    def __init__(self, iterations=600000):
+        self.iterations = int(iterations)
+
+    def hash(self, password, salt=None):
+        salt = salt or secrets.token_bytes(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, self.iterations)
+        return f'{self.scheme}${self.iterations}${_b64encode(salt)}${_b64encode(digest)}'
+
+    @staticmethod
+    def verify(password, encoded):
+        _, iterations, salt, expected = encoded.split('$')
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), _b64decode(salt), int(iterations))
+        return hmac.compare_digest(digest, _b64decode(expected))
+
+    def needs_rehash(self, encoded):
+        return int(encoded.split('$')[1]) < self.iterations
+
+
+class ScryptHasher:
+    """scrypt, encoded as scrypt$n$r$p$salt$hash"""
+
+    scheme = 'scrypt'
+
+    def __init__(self, n=2 ** 15, r=8, p=1):
+        self.n = int(n)
+        self.r = int(r)
+        self.p = int(p)
+
+    @staticmethod
+    def _derive(password, salt, n, r, p):
+        # maxmem must cover 128 * n * r bytes plus some headroom
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+    def hash(self, password, salt=None):
+        salt = salt or secrets.token_bytes(16)
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f'{self.scheme}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(digest)}'
+
+    @classmethod
+    def verify(cls, password, encoded):
+        _, n, r, p, salt, expected = encoded.split('$')
+        digest = cls._derive(password, _b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(digest, _b64decode(expected))
+
+    def needs_rehash(self, encoded):
+        _, n, r, p, _, _ = encoded.split('$')
+        return int(n) < self.n or int(r) < self.r or int(p) < self.p
+
+
+HASHERS = {
+    Pbkdf2Hasher.scheme: Pbkdf2Hasher,
+    ScryptHasher.scheme: ScryptHasher,
+}
+
+
+def identify(encoded):
+    """Return the scheme of a stored hash, 'sha256' for legacy rows, or None"""
+    if _LEGACY_SHA256.match(encoded):
+        return 'sha256'
+    scheme = encoded.split('$', 1)[0]
+    return scheme if scheme in HASHERS else None
+
+
+def verify_password(password, encoded):
+    """Check a password against any supported stored hash (safe to run in a worker process)"""
+    scheme = identify(encoded)
+    if scheme == 'sha256':
+        digest = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(digest, encoded)
+    if scheme is None:
+        return False
+    try:
+        return HASHERS[scheme].verify(password, encoded)
+    except (ValueError, TypeError):
+        # Malformed stored hash
+        return False
+
+
+def _reject_after_verify(password, encoded):
+    """Spend the same time as a real verification, then always fail"""
+    verify_password(password, encoded)
+    return False
+
+
+class PasswordEngine:
+    """Hashes and verifies passwords with configurable cost.
+
+    verify() hashes on the calling thread; verify_async() and hash_many() use
+    a worker pool, for async callers and bulk imports.
+
+    The scheme's cost parameters (e.g. iterations=600000 for pbkdf2_sha256 or
+    n/r/p for scrypt) are passed as keyword arguments. Hashes made with an
+    older scheme or a lower cost, including legacy unsalted SHA-256 digests,
+    are reported by needs_rehash() so callers can upgrade them on login.
+    """
+
+    def __init__(self, scheme='pbkdf2_sha256', workers=None, executor='thread', **params):
+        if scheme not in HASHERS:
+            raise ValueError(f"Unknown password scheme: {scheme}")
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor type: {executor}")
+
+        self.hasher = HASHERS[scheme](**params)
+        self.workers = workers or os.cpu_count() or 1
+        self.executor_type = executor
+        self._executor = None
+        self._dummy_hash = None
+
+    @property
+    def scheme(self):
+        return self.hasher.scheme
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.executor_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                # hashlib releases the GIL while deriving keys
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='password-hasher')
+        return self._executor
+
+    def hash(self, password):
+        """Hash a password with the configured scheme and cost"""
+        return self.hasher.hash(password)
+
+    def hash_many(self, passwords):
+        """Hash several passwords in parallel on the worker pool"""
+        return list(self.executor.map(self.hasher.hash, passwords))
+
+    def _verify_call(self, password, encoded):
+        """The function and arguments that verify a password against a stored hash (or None)"""
+        if encoded is None:
+            # Verify against a real hash so unknown usernames cost as much
+            # time as wrong passwords
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hasher.hash(secrets.token_hex(8))
+            return _reject_after_verify, (password, self._dummy_hash)
+        return verify_password, (password, encoded)
+
+    def verify(self, password, encoded):
+        """Verify a password on the calling thread.
+
+        A caller that waits for the result gains nothing from a worker pool
+        but the hand-off; hashlib releases the GIL while it hashes, so other
+        request threads keep running.
+        """
+        func, args = self._verify_call(password, encoded)
+        return func(*args)
+
+    def verify_async(self, password, encoded):
+        """Verify a password on the worker pool; returns a Future[bool] (for async callers)"""
+        func, args = self._verify_call(password, encoded)
+        return self.executor.submit(func, *args)
+
+    def needs_rehash(self, encoded):
+        """True if a stored hash should be replaced with one from hash()"""
+        if identify(encoded) != self.scheme:
+            return True
+        try:
+            return self.hasher.needs_rehash(encoded)
+        except (ValueError, TypeError):
+            return True
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
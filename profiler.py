@@ -0,0 +1,259 @@
+"""Opt-in sampling profiler for live requests.
+
+A profiled request registers its thread with the profiler. While at least
+one such request runs, a background thread reads every registered thread's
+Python stack with sys._current_frames() every interval seconds and counts
+each distinct stack. Requests that aren't profiled cost one random() call;
+the sampler thread sleeps while nothing is profiled.
+
+Finished profiles are kept in a bounded ring of recent profiles and merged
+into per-route totals. Both come out as collapsed stacks, one
+"outer;...;inner count" line per distinct stack, the input format of
+flamegraph.pl, speedscope and similar viewers.
+
+Time spent in C code (sqlite3, hashlib) shows up in the Python function
+that called it. Jinja compiles templates to Python, so rendering shows up
+as frames named after the template file (admin.html).
+"""
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_MAX_PROFILES = 50
+# Deeper stacks are cut at the root end
+MAX_STACK_DEPTH = 128
+
+
+class Profile:
+    """Stack samples taken during one request"""
+
+    def __init__(self, profile_id, endpoint, method, path):
+        self.id = profile_id
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.samples = 0
+        # collapsed stack -> samples
+        self.stacks = Counter()
+
+    def finish(self, status):
+        self.duration = time.perf_counter() - self._started
+        self.status = status
+
+    def collapsed(self):
+        """The profile as collapsed stacks, most sampled first"""
+        return format_collapsed(self.stacks)
+
+
+def format_collapsed(stacks, root=None):
+    """Collapsed-stack text for a Counter of stacks, optionally under one extra root frame"""
+    prefix = f'{_frame_safe(root)};' if root is not None else ''
+    return ''.join(f'{prefix}{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def _frame_safe(text):
+    # ';' separates frames and the last space precedes the count
+    return str(text).replace(';', ':').replace('\n', ' ')
+
+
+class RouteProfile:
+    """Samples of every finished profile of one route"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.profiles = 0
+        self.samples = 0
+        self.total_time = 0.0
+        self.stacks = Counter()
+
+
+class RequestProfiler:
+    """Samples the stacks of a fraction of requests, plus requests explicitly marked for profiling.
+
+    Usage:
+        profiler = RequestProfiler(sample_rate=0.01)
+        profiler.init_app(app, marked=lambda: request.args.get('profile') == '1')
+
+    sample_rate is the fraction of all requests profiled (0 turns random
+    sampling off); marked() decides whether one request asks to be profiled.
+    """
+
+    def __init__(self, sample_rate=0.0, interval=DEFAULT_INTERVAL, max_profiles=DEFAULT_MAX_PROFILES):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("Profile sample rate must be between 0 and 1")
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive")
+        if max_profiles < 1:
+            raise ValueError("Profile ring size must be at least 1")
+
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.recent = deque(maxlen=max_profiles)
+        self.routes = {}
+        self._ids = itertools.count(1)
+        # thread id -> Profile of the request running on it
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._sampler = None
+        self._sampler_pid = None
+        # code object -> frame label
+        self._labels = {}
+        self._local = threading.local()
+        self._stats = {
+            'profiles': 0,
+            'samples': 0,
+            'sampling_time_total': 0.0,
+        }
+
+    # Profiling requests
+
+    def should_profile(self, marked=False):
+        """Whether to profile a request: marked ones always, others at sample_rate"""
+        return marked or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self, endpoint, method, path):
+        """Start sampling the calling thread; returns its Profile"""
+        profile = Profile(next(self._ids), endpoint, method, path)
+        with self._lock:
+            self._ensure_sampler()
+            self._active[threading.get_ident()] = profile
+            self._wakeup.notify()
+        return profile
+
+    def finish(self, profile, status):
+        """Stop sampling a profile's thread and keep the profile"""
+        with self._lock:
+            for thread_id, active in list(self._active.items()):
+                if active is profile:
+                    del self._active[thread_id]
+            profile.finish(status)
+            self.recent.append(profile)
+            route = self.routes.get(profile.endpoint)
+            if route is None:
+                route = self.routes[profile.endpoint] = RouteProfile(profile.endpoint)
+            route.profiles += 1
+            route.samples += profile.samples
+            route.total_time += profile.duration
+            route.stacks.update(profile.stacks)
+            self._stats['profiles'] += 1
+
+    def _ensure_sampler(self):
+        """Start the sampler thread in this process, e.g. again in a forked worker; call with the lock held"""
+        if self._sampler is None or self._sampler_pid != os.getpid() or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._sampler_pid = os.getpid()
+            self._sampler.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wakeup.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """Record one stack sample of every profiled thread"""
+        started = time.perf_counter()
+        with self._lock:
+            if not self._active:
+                return
+            frames = sys._current_frames()
+            for thread_id, profile in self._active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.stacks[self._collapse(frame)] += 1
+                    profile.samples += 1
+                    self._stats['samples'] += 1
+            self._stats['sampling_time_total'] += time.perf_counter() - started
+
+    def _collapse(self, frame):
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_safe(
+                    f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return ';'.join(labels)
+
+    # Reading profiles
+
+    def get(self, profile_id):
+        """A recent Profile by id, or None once it left the ring"""
+        with self._lock:
+            for profile in self.recent:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def recent_profiles(self):
+        """Recent profiles, newest first"""
+        with self._lock:
+            return list(reversed(self.recent))
+
+    def route_profiles(self):
+        """RouteProfile per route, most sampled first"""
+        with self._lock:
+            return sorted(self.routes.values(), key=lambda route: (-route.samples, route.endpoint))
+
+    def collapsed(self, endpoint=None):
+        """Collapsed stacks of one route, or of every route under a frame naming the route"""
+        with self._lock:
+            if endpoint is not None:
+                route = self.routes.get(endpoint)
+                return format_collapsed(route.stacks) if route is not None else None
+            return ''.join(format_collapsed(route.stacks, root=route.endpoint)
+                           for route in sorted(self.routes.values(), key=lambda route: route.endpoint))
+
+    def reset(self):
+        """Forget finished profiles and route totals"""
+        with self._lock:
+            self.recent.clear()
+            self.routes.clear()
+
+    def stats(self):
+        """Return profile and sample counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['active'] = len(self._active)
+        return snapshot
+
+    # Flask integration
+
+    def init_app(self, app, marked=lambda: False):
+        """Profile sampled and marked requests from before_request to teardown"""
+        from flask import request
+
+        @app.before_request
+        def start_profile():
+            if self.should_profile(marked()):
+                endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self._local.profile = self.start(endpoint, request.method, request.path)
+
+        @app.after_request
+        def record_status(response):
+            profile = getattr(self._local, 'profile', None)
+            if profile is not None:
+                profile.status = response.status_code
+            return response
+
+        @app.teardown_request
+        def finish_profile(error):
+            profile = getattr(self._local, 'profile', None)
+            if profile is not None:
+                self._local.profile = None
+                self.finish(profile, 500 if error is not None else profile.status)
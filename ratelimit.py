@@ -0,0 +1,239 @@
+"""Sliding-window rate limiting for the Student Feedback Portal.
+
+Each key (e.g. 'ip:203.0.113.9') keeps three integers: the index of the
+current fixed window and the hit counts of that window and the one before.
+The sliding count is the current window's hits plus the previous window's
+weighted by how much of it still overlaps the sliding window. That is a
+close estimate of a true sliding log at a fraction of its memory.
+
+MemoryRateLimiter keeps the counters in a bounded in-process LRU map;
+SQLiteRateLimiter keeps them in the rate_limits table so the limits hold
+across worker processes.
+"""
+import abc
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# At most `limit` hits per `window` seconds
+RateLimit = namedtuple('RateLimit', ['limit', 'window'])
+
+# Longest part of a username used in a key, so junk input can't bloat the map
+MAX_KEY_USERNAME = 64
+
+
+def _advance(state, rule, now):
+    """Roll (index, previous, current) forward to the window containing now"""
+    index = int(now // rule.window)
+    if state is None:
+        return index, 0, 0
+    old_index, previous, current = state
+    if index == old_index:
+        return index, previous, current
+    if index == old_index + 1:
+        return index, current, 0
+    return index, 0, 0
+
+
+def _retry_after(index, previous, current, cost, rule, now):
+    """Seconds until cost more hits fit under the limit (0 if they fit now).
+
+    Always finite: when cost hits can never fit (a limit of 0, or a cost above
+    the limit) the caller is told to come back after a full window.
+    """
+    elapsed = now - index * rule.window
+    overlap = 1 - elapsed / rule.window
+    if previous * overlap + current + cost <= rule.limit:
+        return 0.0
+    if cost > rule.limit:
+        return float(rule.window)
+    if current + cost <= rule.limit and previous:
+        # Wait for the previous window's weight to decay enough
+        return max((1 - (rule.limit - current - cost) / previous) * rule.window - elapsed, 0.001)
+    # Wait for the next window, then for this window's hits to decay there
+    wait = rule.window - elapsed
+    if current:
+        wait += max(1 - (rule.limit - cost) / current, 0) * rule.window
+    return max(wait, 0.001)
+
+
+def _expires_at(index, rule):
+    """When a key's counters stop mattering: once both windows have slid past"""
+    return (index + 2) * rule.window
+
+
+class RateLimiter(abc.ABC):
+    """Sliding-window counters; subclasses decide where they are stored"""
+
+    @abc.abstractmethod
+    def _update(self, key, rule, func, now):
+        """Apply func(state) -> (new state, result) atomically and return result"""
+
+    def hit(self, key, rule, cost=1, now=None):
+        """Count cost hits against key if they fit under rule.
+
+        Returns 0.0 when counted, otherwise the seconds to wait (nothing is
+        counted then).
+        """
+        now = time.time() if now is None else now
+
+        def apply(state):
+            index, previous, current = _advance(state, rule, now)
+            retry_after = _retry_after(index, previous, current, cost, rule, now)
+            if retry_after:
+                return (index, previous, current), retry_after
+            return (index, previous, current + cost), 0.0
+
+        return self._update(key, rule, apply, now)
+
+    def release(self, key, rule, cost=1, now=None):
+        """Give back hits counted in the current window (e.g. for a successful login)"""
+        now = time.time() if now is None else now
+
+        def apply(state):
+            index, previous, current = _advance(state, rule, now)
+            return (index, previous, max(current - cost, 0)), None
+
+        self._update(key, rule, apply, now)
+
+
+class MemoryRateLimiter(RateLimiter):
+    """In-process counters for at most max_keys keys.
+
+    Keys are dropped once their windows have passed; when the map is full the
+    least recently used key is evicted, which can only make a limit more
+    lenient for that key.
+    """
+
+    def __init__(self, max_keys=100000):
+        if max_keys < 1:
+            raise ValueError("Rate limiter must track at least one key")
+
+        self.max_keys = max_keys
+        # key -> (index, previous, current, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _update(self, key, rule, func, now):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            state, result = func(entry[:3] if entry else None)
+            self._entries[key] = state + (_expires_at(state[0], rule),)
+            self._expire(now)
+        return result
+
+    def _expire(self, now):
+        # Touched keys move to the end, so expired ones collect at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[3] <= now:
+                del self._entries[key]
+            elif len(self._entries) > self.max_keys:
+                del self._entries[key]
+                self.evictions += 1
+            else:
+                break
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """Counters in the rate_limits table, shared by every process using the database.
+
+    Each hit is one short write transaction. Expired rows are deleted at most
+    every sweep_interval seconds.
+    """
+
+    def __init__(self, db, sweep_interval=60.0):
+        self.db = db
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _update(self, key, rule, func, now):
+        with self.db.connection() as conn:
+            # Take the write lock up front so concurrent hits can't both pass
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT window_index, previous, current FROM rate_limits WHERE key = ?',
+                                   (key,)).fetchone()
+                state, result = func(tuple(row) if row else None)
+                conn.execute('''
+                    INSERT INTO rate_limits (key, window_index, previous, current, expires_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        window_index = excluded.window_index, previous = excluded.previous,
+                        current = excluded.current, expires_at = excluded.expires_at
+                ''', (key,) + state + (_expires_at(state[0], rule),))
+                if self.sweep_interval and time.monotonic() >= self._next_sweep:
+                    self._next_sweep = time.monotonic() + self.sweep_interval
+                    conn.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return result
+
+    def __len__(self):
+        with self.db.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM rate_limits WHERE expires_at > ?',
+                                (time.time(),)).fetchone()[0]
+
+
+class LoginThrottle:
+    """Per-IP and per-username limits on failed logins.
+
+    Every attempt takes a slot from both windows before the password is
+    checked, so a burst is turned away before it reaches the database or the
+    password hasher; a successful login gives its slots back. Rejections are
+    counted by scope ('ip' or 'username') and reported to reject_observer.
+    """
+
+    def __init__(self, limiter, per_ip=RateLimit(20, 60), per_username=RateLimit(10, 300)):
+        self.limiter = limiter
+        self.per_ip = per_ip
+        self.per_username = per_username
+        self.reject_observer = None
+        self.rejected = {'ip': 0, 'username': 0}
+        self._lock = threading.Lock()
+
+    def _keys(self, ip, username):
+        return f'ip:{ip}', f'user:{username[:MAX_KEY_USERNAME]}'
+
+    def _reject(self, scope, ip, username, retry_after):
+        with self._lock:
+            self.rejected[scope] += 1
+        logger.warning("Throttled login for %r from %s (%s limit, retry in %.0fs)",
+                       username[:MAX_KEY_USERNAME], ip, scope, retry_after)
+        observer = self.reject_observer
+        if observer is not None:
+            observer(scope)
+        return retry_after
+
+    def acquire(self, ip, username):
+        """Take one attempt for this IP and username; returns 0.0 or the seconds to wait"""
+        ip_key, user_key = self._keys(ip, username)
+        retry_after = self.limiter.hit(ip_key, self.per_ip)
+        if retry_after:
+            return self._reject('ip', ip, username, retry_after)
+        retry_after = self.limiter.hit(user_key, self.per_username)
+        if retry_after:
+            self.limiter.release(ip_key, self.per_ip)
+            return self._reject('username', ip, username, retry_after)
+        return 0.0
+
+    def succeeded(self, ip, username):
+        """Return the slots of a successful login, so only failures count"""
+        ip_key, user_key = self._keys(ip, username)
+        self.limiter.release(ip_key, self.per_ip)
+        self.limiter.release(user_key, self.per_username)
+
+    def stats(self):
+        """Return rejection counts by scope"""
+        with self._lock:
+            return dict(self.rejected)
@@ -0,0 +1,223 @@
+"""Read-only snapshot replica of the feedback database.
+
+The replica is a whole-file copy of the primary taken with SQLite's online
+backup API, which needs the primary in WAL mode so writers carry on during
+the copy. A refresh writes a new copy next to the old one and renames it
+into place, so connections still reading the previous snapshot keep their
+file until they are closed. The file's mtime is the moment the snapshot was
+taken; its age is the replica lag.
+
+Several processes (e.g. server.py workers) can share one replica file: a
+lock file makes sure only one of them copies the database per refresh
+interval, and the others pick the new file up on their next read.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.request import pathname2url
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# One adopted replica file: its connection pool and the feedback version it holds
+Snapshot = namedtuple('Snapshot', ['pool', 'inode', 'taken_at', 'version'])
+
+
+def immutable_uri(path):
+    """URI for a file nothing will write to again: no locking, no change detection"""
+    return 'file:' + pathname2url(os.path.abspath(path)) + '?immutable=1'
+
+
+class SnapshotReplica:
+    """A periodically refreshed read-only copy of db, with a bound on how stale reads may be.
+
+    connection() hands out the current snapshot, or None once it is older than
+    max_staleness seconds (the caller then reads the primary). refresh()
+    copies the primary; ReplicaRefresher calls it every refresh_interval
+    seconds. open_pool(uri) returns a connection pool for a snapshot file.
+    """
+
+    def __init__(self, db, open_pool, path=None, refresh_interval=10.0, max_staleness=30.0):
+        if max_staleness <= 0:
+            raise ValueError("Replica staleness bound must be positive")
+
+        self.db = db
+        self.open_pool = open_pool
+        self.path = os.path.abspath(path or os.path.splitext(os.path.abspath(db.db_name))[0] + '-replica.db')
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stats = {
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'refresh_time_total': 0.0,
+            'adoptions': 0,
+            'reads': 0,
+            'fallbacks': 0,
+        }
+
+    def _adopt(self):
+        """Switch to the replica file on disk if it is not the one in use; returns the current Snapshot"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._snapshot
+        current = self._snapshot
+        if current is not None and current.inode == (stat.st_dev, stat.st_ino):
+            return current
+
+        pool = self.open_pool(immutable_uri(self.path))
+        try:
+            with pool.connection() as conn:
+                version, updated_at = conn.execute(
+                    'SELECT version, updated_at FROM feedback_version WHERE id = 1').fetchone()
+        except sqlite3.Error:
+            # Renamed over between the stat and the open; the next read tries again
+            pool.close()
+            return current
+        last_modified = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        self._snapshot = Snapshot(pool, (stat.st_dev, stat.st_ino), stat.st_mtime, (version, last_modified))
+        self._stats['adoptions'] += 1
+        if current is not None:
+            # Connections still checked out are closed when they are returned
+            current.pool.close()
+        return self._snapshot
+
+    def lag(self):
+        """Seconds since the snapshot on disk was taken, or None if there is none yet"""
+        try:
+            return max(time.time() - os.stat(self.path).st_mtime, 0.0)
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection to the current snapshot, or yield None if it is too stale"""
+        with self._lock:
+            snapshot = self._adopt()
+            if snapshot is None or time.time() - snapshot.taken_at > self.max_staleness:
+                self._stats['fallbacks'] += 1
+                snapshot = None
+            else:
+                self._stats['reads'] += 1
+                # Check out before releasing the lock, so a refresh can't close the pool first
+                checkout = snapshot.pool.connection()
+                conn = checkout.__enter__()
+        if snapshot is None:
+            yield None, None
+            return
+        try:
+            yield snapshot, conn
+        except BaseException as e:
+            if not checkout.__exit__(type(e), e, e.__traceback__):
+                raise
+        else:
+            checkout.__exit__(None, None, None)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serialize refreshes across processes sharing the replica file"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self, force=False):
+        """Copy the primary into a new snapshot; returns False if another process just did.
+
+        Unless force is set, a snapshot younger than half the refresh interval
+        is adopted instead of copied again.
+        """
+        with self._refresh_lock, self._file_lock():
+            lag = self.lag()
+            if not force and lag is not None and lag < self.refresh_interval / 2:
+                with self._lock:
+                    self._adopt()
+                return False
+
+            started = time.perf_counter()
+            taken_at = time.time()
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            try:
+                target = sqlite3.connect(tmp_path)
+                try:
+                    with self.db.pool.connection() as source:
+                        # One step: the copy is a single consistent read of the
+                        # primary. Database only allows a replica in WAL mode,
+                        # where that read doesn't hold writers off; a stepped
+                        # copy would restart after every write and might never end
+                        source.backup(target)
+                    # The copy is opened immutable, which a WAL file can't be
+                    target.execute('PRAGMA journal_mode = DELETE')
+                finally:
+                    target.close()
+                os.utime(tmp_path, (taken_at, taken_at))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with self._lock:
+                    self._stats['refresh_failures'] += 1
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+
+            with self._lock:
+                self._adopt()
+                elapsed = time.perf_counter() - started
+                self._stats['refreshes'] += 1
+                self._stats['refresh_time_total'] += elapsed
+        logger.debug("Refreshed replica %s in %.1fms", self.path, elapsed * 1000)
+        return True
+
+    def stats(self):
+        """Return refresh and read counters and the current lag"""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['lag'] = self.lag()
+        return snapshot
+
+    def close(self):
+        """Close the snapshot's idle connections; the file stays for other processes"""
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.pool.close()
+                self._snapshot = None
+
+
+class ReplicaRefresher(threading.Thread):
+    """Background thread that refreshes the replica off the request path"""
+
+    def __init__(self, replica):
+        super().__init__(name='replica-refresher', daemon=True)
+        self.replica = replica
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.replica.refresh_interval):
+            try:
+                self.replica.refresh()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Replica refresh failed: %s", e)
+
+    def stop(self):
+        """Stop the thread after its current refresh"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
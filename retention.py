@@ -0,0 +1,312 @@
+"""Retention policy for the live feedback table.
+
+The policy keeps the newest keep_terms terms that have started in the live
+table; feedback of every older, finished term is moved to the term's
+read-only archive file (see terms.py) and stays readable through the admin
+views, search and exports. Nothing is deleted outright.
+
+A term is moved in chunks of whole days of about batch_size rows, each one
+TermCatalog.archive() call that appends the chunk to the term's archive
+file and deletes it from the live table in its own short transaction, so
+the writer lock is never held for a whole term. Progress lives in the
+database itself (the rows still live), so an interrupted run resumes where
+it stopped. Only the last chunk of a term compacts its archive file.
+
+The deletes leave free pages behind. On a database in incremental
+auto-vacuum mode they are handed back to the filesystem a few pages per
+step with PRAGMA incremental_vacuum, without the exclusive lock and full
+rewrite of a VACUUM. Databases created with retention configured (or
+incremental_vacuum=True) start in that mode; existing ones need
+Database.enable_incremental_vacuum() (one VACUUM) once.
+
+Several processes can share one database: a lock file next to it lets one
+of them run at a time, and its mtime records when the last run finished.
+"""
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 20000
+# Pages handed back per incremental_vacuum step (4 MiB at the default page size)
+DEFAULT_VACUUM_STEP = 1024
+# How often the scheduler checks whether a run is due
+CHECK_INTERVAL = 300.0
+# Runs of each latency probe; the median is reported
+PROBE_RUNS = 5
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+# One run: bytes are the database's page_count * page_size before and after;
+# latency maps each probe to its median (before_ms, after_ms)
+RetentionReport = namedtuple('RetentionReport', [
+    'terms', 'rows_archived', 'chunks', 'bytes_before', 'bytes_after', 'bytes_reclaimed',
+    'latency', 'elapsed', 'complete',
+])
+
+
+def storage_usage(conn):
+    """Page size and counts of a database connection, plus its auto-vacuum mode"""
+    usage = {pragma: conn.execute(f'PRAGMA {pragma}').fetchone()[0]
+             for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+    usage['bytes'] = usage['page_size'] * usage['page_count']
+    usage['free_bytes'] = usage['page_size'] * usage['freelist_count']
+    usage['auto_vacuum'] = AUTO_VACUUM_MODES.get(usage['auto_vacuum'], usage['auto_vacuum'])
+    return usage
+
+
+class RetentionManager:
+    """Archives feedback of terms older than the newest keep_terms and reclaims the freed pages.
+
+    Usage:
+        retention = RetentionManager(db, keep_terms=4)
+        retention.due_terms()          # what a run would move
+        report = retention.run()       # None if another process is running
+    """
+
+    def __init__(self, db, keep_terms, batch_size=DEFAULT_BATCH_SIZE, vacuum_step=DEFAULT_VACUUM_STEP,
+                 interval=86400.0):
+        if keep_terms < 1:
+            raise ValueError("Retention must keep at least 1 term")
+        if batch_size < 1:
+            raise ValueError("Retention batch size must be at least 1")
+        if vacuum_step < 1:
+            raise ValueError("Vacuum step must be at least 1 page")
+
+        self.db = db
+        self.keep_terms = keep_terms
+        self.batch_size = batch_size
+        self.vacuum_step = vacuum_step
+        self.interval = interval
+        self.lock_path = os.path.splitext(os.path.abspath(db.db_name))[0] + '-retention.lock'
+        self.last_report = None
+        self._run_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'failures': 0,
+            'rows_archived': 0,
+            'chunks': 0,
+            'bytes_reclaimed': 0,
+            'last_run': None,
+        }
+
+    # Policy
+
+    def due_terms(self, today=None):
+        """Finished terms older than the newest keep_terms started ones, with rows still live"""
+        today = today or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        started = [term for term in self.db.get_terms() if term.starts_on <= today]
+        return [term for term in started[:-self.keep_terms]
+                if term.ends_on < today and self.db.terms.live_count(term)]
+
+    def chunks(self, term):
+        """Last day and row count of each chunk of the term's live rows, oldest first"""
+        with self.db.connection() as conn:
+            days = conn.execute('''
+                SELECT date(submission_date) AS day, COUNT(*) FROM feedback
+                WHERE submission_date >= ? AND submission_date < date(?, '+1 day')
+                GROUP BY day ORDER BY day
+            ''', (term.starts_on, term.ends_on)).fetchall()
+
+        chunks = []
+        rows = 0
+        for day, count in days:
+            rows += count
+            # A day is never split, so a chunk may exceed batch_size
+            if rows >= self.batch_size:
+                chunks.append((day, rows))
+                rows = 0
+        if rows:
+            chunks.append((days[-1][0], rows))
+        return chunks
+
+    # Running
+
+    def is_due(self):
+        """Whether interval seconds have passed since the last run finished (in any process)"""
+        try:
+            return time.time() - os.path.getmtime(self.lock_path) >= self.interval
+        except FileNotFoundError:
+            return True
+
+    def run(self, today=None, should_stop=lambda: False, measure=True):
+        """Archive every due term and reclaim the freed pages; returns a RetentionReport.
+
+        Returns None if another thread or process is running. should_stop()
+        is checked between chunks and vacuum steps; a stopped run reports
+        complete=False and the next run picks up from there. measure=False
+        skips the latency probes.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return None
+                try:
+                    report = self._run(today, should_stop, measure)
+                except BaseException:
+                    with self._stats_lock:
+                        self._stats['failures'] += 1
+                    raise
+                # The lock file's mtime marks the last finished run
+                os.utime(self.lock_path)
+                return report
+        finally:
+            self._run_lock.release()
+
+    def _run(self, today, should_stop, measure):
+        started = time.perf_counter()
+        latency_before = self.measure_latency() if measure else {}
+        before = self.storage()
+
+        terms, rows_archived, chunks, complete = [], 0, 0, True
+        for term in self.due_terms(today):
+            term_chunks = self.chunks(term)
+            for index, (through, rows) in enumerate(term_chunks):
+                if should_stop():
+                    complete = False
+                    break
+                last = index == len(term_chunks) - 1
+                self.db.archive_term(term.name, through=through, compact=last)
+                rows_archived += rows
+                chunks += 1
+                if index == 0:
+                    terms.append(term.name)
+            if not complete:
+                break
+
+        if complete:
+            complete = self.reclaim(should_stop) is not None
+        after = self.storage()
+        latency_after = self.measure_latency() if measure else {}
+
+        report = RetentionReport(
+            terms=terms,
+            rows_archived=rows_archived,
+            chunks=chunks,
+            bytes_before=before['bytes'],
+            bytes_after=after['bytes'],
+            bytes_reclaimed=max(0, before['bytes'] - after['bytes']),
+            latency={probe: (latency_before[probe], latency_after[probe]) for probe in latency_before},
+            elapsed=time.perf_counter() - started,
+            complete=complete,
+        )
+        with self._stats_lock:
+            self._stats['runs'] += 1
+            self._stats['rows_archived'] += report.rows_archived
+            self._stats['chunks'] += report.chunks
+            self._stats['bytes_reclaimed'] += report.bytes_reclaimed
+            self._stats['last_run'] = time.time()
+            self.last_report = report
+        logger.info("Retention run: %d rows of %s archived in %d chunks, %d bytes reclaimed in %.1fs%s",
+                    report.rows_archived, ', '.join(terms) or 'no terms', report.chunks,
+                    report.bytes_reclaimed, report.elapsed, '' if complete else ' (stopped early)')
+        return report
+
+    def reclaim(self, should_stop=lambda: False):
+        """Hand free pages back to the filesystem vacuum_step pages at a time; returns the pages freed.
+
+        Returns None if should_stop() interrupted it. Without incremental
+        auto-vacuum the free pages are only reused by later inserts and 0 is
+        returned.
+        """
+        with self.db.pool.connection() as conn:
+            usage = storage_usage(conn)
+            if usage['auto_vacuum'] != 'incremental':
+                if usage['freelist_count']:
+                    logger.info("%d free pages left in %s; run 'manage.py retention "
+                                "--enable-incremental-vacuum' once to reclaim them",
+                                usage['freelist_count'], self.db.db_name)
+                return 0
+
+            freed = 0
+            free = usage['freelist_count']
+            while free:
+                if should_stop():
+                    return None
+                # Each step is its own short write transaction; executescript()
+                # steps the PRAGMA until it has freed every page it can
+                conn.executescript(f'PRAGMA incremental_vacuum({self.vacuum_step})')
+                remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if remaining >= free:
+                    break
+                freed += free - remaining
+                free = remaining
+            if freed and conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+                # In WAL mode the file is truncated when the pages are checkpointed
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        return freed
+
+    # Reporting
+
+    def storage(self):
+        """storage_usage() of the live database"""
+        with self.db.pool.connection() as conn:
+            return storage_usage(conn)
+
+    def measure_latency(self, runs=PROBE_RUNS):
+        """Median milliseconds of a few typical reads against the live database"""
+        probes = {
+            'newest_page': lambda: self.db.get_feedback_page(),
+            'rating_page': lambda: self.db.get_feedback_page(sort='rating', rating=1),
+            'live_scan': self._scan_live,
+        }
+        latency = {}
+        for name, probe in probes.items():
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                probe()
+                timings.append(time.perf_counter() - started)
+            latency[name] = statistics.median(timings) * 1000
+        return latency
+
+    def _scan_live(self):
+        with self.db.pool.connection() as conn:
+            conn.execute("SELECT COUNT(*) FROM feedback WHERE feedback_text LIKE '%a%'").fetchone()
+
+    def stats(self):
+        """Return run, row and byte counters"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+class RetentionScheduler(threading.Thread):
+    """Background thread that runs the retention policy every interval seconds"""
+
+    def __init__(self, retention):
+        super().__init__(name='retention-scheduler', daemon=True)
+        self.retention = retention
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(min(self.retention.interval, CHECK_INTERVAL)):
+            if not self.retention.is_due():
+                continue
+            try:
+                self.retention.run(should_stop=self._stop_event.is_set)
+            except Exception:
+                # Keep the schedule: the next run resumes from whatever is still live
+                logger.exception("Retention run failed")
+
+    def stop(self):
+        """Stop the thread after its current chunk or vacuum step"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
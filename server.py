@@ -0,0 +1,310 @@
+"""Pre-forking production server for the Student Feedback Portal.
+
+    python server.py --bind 0.0.0.0:8000 --workers 4 --max-requests 5000
+
+The master process imports the app once, which creates the schema and the
+default users, then releases its SQLite connections and background threads
+and forks the workers. Every worker serves the shared listening socket with
+a threaded WSGI server.
+
+Signals sent to the master:
+
+    SIGTERM, SIGINT  graceful shutdown: workers finish in-flight requests,
+                     flush the write-behind queue and exit
+    SIGHUP           graceful reload: start a fresh set of workers, then
+                     gracefully stop the old ones
+    SIGTTIN/SIGTTOU  add/remove one worker
+
+Workers are recycled after --max-requests requests (plus a random jitter
+so they don't all restart at once). Because the app is preloaded in the
+master, code changes need a full restart; SIGHUP only replaces the worker
+processes.
+"""
+import argparse
+import errno
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+logger = logging.getLogger('server')
+
+MASTER_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD)
+
+
+class RequestCounter:
+    """WSGI middleware that asks the worker to retire after max_requests requests"""
+
+    def __init__(self, app, max_requests, on_limit):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+            reached = self.max_requests and self.count == self.max_requests
+        if reached:
+            self.on_limit()
+        return self.app(environ, start_response)
+
+
+class Worker:
+    """One forked process serving the shared socket until told to stop"""
+
+    def __init__(self, app_module, sock, threads, max_requests, access_log):
+        self.app_module = app_module
+        self.sock = sock
+        self.threads = threads
+        self.max_requests = max_requests
+        self.access_log = access_log
+        self.server = None
+        self._stopping = threading.Event()
+
+    def stop(self, reason):
+        """Stop accepting connections; serve_forever returns once the loop notices"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        logger.info("Worker %d stopping (%s)", os.getpid(), reason)
+        if self.server is not None:
+            # shutdown() waits for serve_forever, so it can't run on the serving thread
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def run(self):
+        from werkzeug.serving import make_server
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop('SIGTERM'))
+        if not self.access_log:
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+        db = self.app_module.db
+        submission_queue = self.app_module.submission_queue
+        db.after_fork()
+        if submission_queue is not None:
+            submission_queue.after_fork()
+
+        app = RequestCounter(self.app_module.app, self.max_requests,
+                             lambda: self.stop(f'served {self.max_requests} requests'))
+        host, port = self.sock.getsockname()[:2]
+        self.server = make_server(host, port, app, threaded=self.threads, fd=self.sock.fileno())
+        # Let in-flight requests finish when the server closes
+        self.server.daemon_threads = False
+        self.server.block_on_close = True
+        logger.info("Worker %d serving", os.getpid())
+
+        try:
+            if not self._stopping.is_set():
+                self.server.serve_forever()
+        finally:
+            # End open /admin/stream responses, or closing would wait for them to time out
+            self.app_module.feedback_broker.close()
+            self.server.server_close()
+            if submission_queue is not None:
+                submission_queue.close()
+            db.close()
+
+
+class Master:
+    """Forks and supervises the workers"""
+
+    def __init__(self, app_module, sock, workers, threads=True, max_requests=0,
+                 max_requests_jitter=0, graceful_timeout=30.0, access_log=False):
+        self.app_module = app_module
+        self.sock = sock
+        self.num_workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.access_log = access_log
+        # pid -> time the worker was asked to stop (None while it is serving)
+        self.workers = {}
+        # Back off before replacing a crashed worker instead of fork-looping
+        self._respawn_at = 0.0
+        self._signals = []
+        # Signal handlers write a byte here to wake the supervision loop
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+        try:
+            os.write(self._wakeup_w, b'.')
+        except BlockingIOError:
+            pass
+
+    def spawn(self):
+        """Fork one worker"""
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        self.app_module.db.prepare_fork()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = None
+            return pid
+
+        # Child: never return into the master's loop
+        for signum in MASTER_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        # The master handles Ctrl-C and reloads for the whole group
+        for signum in (signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(signum, signal.SIG_IGN)
+        status = 0
+        try:
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            Worker(self.app_module, self.sock, self.threads, max_requests, self.access_log).run()
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            status = 1
+        finally:
+            logging.shutdown()
+            os._exit(status)
+
+    def signal_workers(self, pids, signum):
+        for pid in pids:
+            if signum == signal.SIGTERM and pid in self.workers and self.workers[pid] is None:
+                self.workers[pid] = time.monotonic()
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        """Collect exited workers; returns the pids that exited"""
+        exited = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                stopping = self.workers.pop(pid) is not None
+                code = os.waitstatus_to_exitcode(status)
+                if not stopping and code != 0:
+                    logger.warning("Worker %d exited with status %d", pid, code)
+                    self._respawn_at = time.monotonic() + 1.0
+                exited.append(pid)
+        return exited
+
+    def serving(self):
+        return [pid for pid, stop_requested in self.workers.items() if stop_requested is None]
+
+    def kill_stragglers(self):
+        """SIGKILL workers that ignored SIGTERM for longer than the graceful timeout"""
+        now = time.monotonic()
+        for pid, stop_requested in self.workers.items():
+            if stop_requested is not None and now - stop_requested > self.graceful_timeout:
+                logger.warning("Worker %d did not stop in %.0fs, killing it", pid, self.graceful_timeout)
+                self.signal_workers([pid], signal.SIGKILL)
+
+    def run(self):
+        for signum in MASTER_SIGNALS:
+            signal.signal(signum, self._on_signal)
+
+        logger.info("Master %d starting %d workers on %s", os.getpid(), self.num_workers,
+                    '%s:%s' % self.sock.getsockname()[:2])
+        shutting_down = False
+        while True:
+            if not shutting_down and time.monotonic() >= self._respawn_at:
+                while len(self.serving()) < self.num_workers:
+                    self.spawn()
+
+            # Wake up on a signal, or regularly to enforce the graceful timeout
+            self._wait(1.0)
+
+            self.reap()
+            while self._signals:
+                signum = self._signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT) and not shutting_down:
+                    logger.info("Shutting down gracefully")
+                    shutting_down = True
+                    self.signal_workers(list(self.workers), signal.SIGTERM)
+                elif signum == signal.SIGHUP and not shutting_down:
+                    logger.info("Reloading: replacing %d workers", len(self.serving()))
+                    old = self.serving()
+                    for _ in range(self.num_workers):
+                        self.spawn()
+                    self.signal_workers(old, signal.SIGTERM)
+                elif signum == signal.SIGTTIN:
+                    self.num_workers += 1
+                elif signum == signal.SIGTTOU and self.num_workers > 1:
+                    self.num_workers -= 1
+                    self.signal_workers(self.serving()[:1], signal.SIGTERM)
+
+            self.kill_stragglers()
+            if shutting_down and not self.workers:
+                break
+
+        logger.info("All workers stopped")
+        self.app_module.db.close()
+
+    def _wait(self, timeout):
+        """Sleep until a signal arrives or the timeout passes"""
+        ready, _, _ = select.select([self._wakeup_r], [], [], timeout)
+        if ready:
+            os.read(self._wakeup_r, 64)
+
+
+def bind_socket(address, backlog=2048):
+    """Create the listening socket shared by every worker"""
+    host, _, port = address.rpartition(':')
+    sock = socket.create_server((host or '127.0.0.1', int(port)), backlog=backlog, reuse_port=False)
+    # Workers race for each connection; the losers get EAGAIN instead of blocking in accept()
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default=os.environ.get('FEEDBACK_BIND', '127.0.0.1:8000'),
+                        help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('FEEDBACK_WORKERS', os.cpu_count() or 1)),
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--no-threads', dest='threads', action='store_false',
+                        help='handle one request at a time per worker')
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('FEEDBACK_MAX_REQUESTS', 0)),
+                        help='recycle a worker after this many requests (0: never)')
+    parser.add_argument('--max-requests-jitter', type=int, default=0,
+                        help='add up to this many requests to each worker\'s limit')
+    parser.add_argument('--graceful-timeout', type=float, default=30.0,
+                        help='seconds a stopping worker gets before it is killed')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s')
+    try:
+        sock = bind_socket(args.bind)
+    except OSError as e:
+        if e.errno == errno.EADDRINUSE:
+            print(f"{args.bind} is already in use", file=sys.stderr)
+            return 1
+        raise
+
+    # Consecutive requests from one browser land on different workers, so a
+    # per-process session cache would serve sessions another worker changed
+    os.environ.setdefault('FEEDBACK_SESSION_CACHE_SIZE', '0')
+    # Preload: schema creation and default users happen once, here
+    import app as app_module
+
+    Master(app_module, sock, args.workers, threads=args.threads, max_requests=args.max_requests,
+           max_requests_jitter=args.max_requests_jitter, graceful_timeout=args.graceful_timeout,
+           access_log=args.access_log).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
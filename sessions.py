@@ -0,0 +1,229 @@
+import logging
+import secrets
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from cache import MISSING, LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose contents live in the session store; the cookie only carries its id"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = sid is None
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        """Move the session to a fresh id when the response is saved.
+
+        Call on login and logout, so an id seen before either is worthless.
+        """
+        self.rotate = True
+        self.modified = True
+
+
+class SessionStore:
+    """SQLite-backed session storage with an in-process LRU cache in front.
+
+    The cache holds the serialized session for cache_ttl seconds, so a warm
+    lookup costs no query. Writes and deletes through this store take effect
+    at once; changes made by other processes (other server workers,
+    manage.py) are seen within cache_ttl seconds. Pass cache_size=0 to read
+    every session from the database, e.g. when requests from one browser are
+    spread over several processes.
+    """
+
+    def __init__(self, db, lifetime=43200.0, cache_size=4096, cache_ttl=5.0):
+        if lifetime <= 0:
+            raise ValueError("Session lifetime must be positive")
+
+        self.db = db
+        self.lifetime = lifetime
+        # sid -> (tagged JSON, expires_at), or None for unknown ids
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl) if cache_size else None
+        self.serializer = TaggedJSONSerializer()
+
+    def load(self, sid, now=None):
+        """Return (data, expires_at) for a live session, or None"""
+        entry = self.cache.get(sid) if self.cache is not None else MISSING
+        if entry is MISSING:
+            with self.db.connection() as conn:
+                entry = conn.execute('SELECT data, expires_at FROM sessions WHERE id = ?', (sid,)).fetchone()
+            entry = tuple(entry) if entry else None
+            if self.cache is not None:
+                self.cache.set(sid, entry)
+
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if expires_at <= (time.time() if now is None else now):
+            return None
+        # Decode per request: cached values must not be shared between requests
+        return self.serializer.loads(data), expires_at
+
+    def save(self, sid, data, expires_at):
+        """Create or replace a session"""
+        payload = self.serializer.dumps(dict(data))
+        with self.db.connection() as conn:
+            conn.execute('''
+                INSERT INTO sessions (id, username, data, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    username = excluded.username, data = excluded.data, expires_at = excluded.expires_at
+            ''', (sid, data.get('username'), payload, expires_at))
+            conn.commit()
+        if self.cache is not None:
+            self.cache.set(sid, (payload, expires_at))
+
+    def delete(self, sid):
+        """Remove one session"""
+        with self.db.connection() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+            conn.commit()
+        if self.cache is not None:
+            self.cache.invalidate(sid)
+
+    def revoke_user(self, username):
+        """Log a user out everywhere, API tokens included; returns the number of sessions removed"""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            sids = [row[0] for row in cursor.execute('SELECT id FROM sessions WHERE username = ?', (username,))]
+            cursor.execute('DELETE FROM sessions WHERE username = ?', (username,))
+            self.db.revoke_api_tokens(username, cursor)
+            conn.commit()
+        if self.cache is not None:
+            for sid in sids:
+                self.cache.invalidate(sid)
+        if sids:
+            logger.info("Revoked %d sessions of %s", len(sids), username)
+        return len(sids)
+
+    def purge_expired(self, now=None):
+        """Delete expired sessions; returns the number removed"""
+        with self.db.connection() as conn:
+            removed = conn.execute('DELETE FROM sessions WHERE expires_at <= ?',
+                                   (time.time() if now is None else now,)).rowcount
+            conn.commit()
+        # Cached copies carry their expiry, so load() already refuses them
+        return removed
+
+    def active_by_user(self, now=None):
+        """Return {username: live session count}; anonymous sessions count under None"""
+        with self.db.connection() as conn:
+            return dict(conn.execute('''
+                SELECT username, COUNT(*) FROM sessions
+                WHERE expires_at > ?
+                GROUP BY username
+            ''', (time.time() if now is None else now,)).fetchall())
+
+    def count_active(self, now=None):
+        """Return the number of live sessions"""
+        with self.db.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM sessions WHERE expires_at > ?',
+                                (time.time() if now is None else now,)).fetchone()[0]
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by a SessionStore.
+
+    The cookie holds a random session id signed with the app's secret key, so
+    forged ids are rejected without a lookup. Sessions expire after the
+    store's lifetime of inactivity; the expiry is pushed back (one write) once
+    less than half of it is left rather than on every request. Expired rows
+    are swept at most every sweep_interval seconds, from whichever request
+    comes next.
+    """
+
+    session_class = ServerSideSession
+    salt = 'feedback-session'
+
+    def __init__(self, store, sweep_interval=300.0):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._sweep_lock = threading.Lock()
+
+    def get_signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            # Flask falls back to a NullSession that refuses writes
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self.get_signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            stored = self.store.load(sid) if sid else None
+            if stored is not None:
+                data, expires_at = stored
+                return self.session_class(data, sid=sid, expires_at=expires_at)
+        return self.session_class()
+
+    def save_session(self, app, session, response):
+        self._maybe_sweep()
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        response.vary.add('Cookie')
+
+        if session.sid is not None and (session.rotate or not session):
+            self.store.delete(session.sid)
+            session.sid = None
+        if not session:
+            # Nothing worth keeping: drop the cookie instead of storing an empty session
+            if not session.new:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        now = time.time()
+        new_sid = session.sid is None
+        refresh = session.expires_at is not None and session.expires_at - now < self.store.lifetime / 2
+        if not (new_sid or session.modified or refresh):
+            return
+
+        if new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires_at = now + self.store.lifetime
+        self.store.save(session.sid, session, session.expires_at)
+
+        if new_sid or self.should_set_cookie(app, session):
+            response.set_cookie(name, self.get_signer(app).sign(session.sid).decode(),
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+    def _maybe_sweep(self):
+        if not self.sweep_interval or time.monotonic() < self._next_sweep:
+            return
+        # One request sweeps; the others carry on
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = time.monotonic() + self.sweep_interval
+            removed = self.store.purge_expired()
+            if removed:
+                logger.info("Swept %d expired sessions", removed)
+        except Exception:
+            logger.exception("Session sweep failed")
+        finally:
+            self._sweep_lock.release()
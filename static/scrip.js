@@ -40,6 +40,13 @@ document.addEventListener('DOMContentLoaded', function() {
                 alert('Feedback must be at least 10 characters long');
                 return false;
             }
+            
+            // A second click would post the same feedback again
+            const submitButton = document.getElementById('submitFeedback');
+            if (submitButton) {
+                submitButton.disabled = true;
+                submitButton.textContent = 'Submitting...';
+            }
         });
     }
     
@@ -65,8 +72,59 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
     }
+    
+    // Live feed: new submissions are added to the top of the first page
+    const liveFeed = document.getElementById('liveFeed');
+    if (liveFeed && window.EventSource) {
+        const source = new EventSource(liveFeed.dataset.streamUrl + '?after=' + liveFeed.dataset.after);
+        source.addEventListener('feedback', function(e) {
+            addFeedbackRow(JSON.parse(e.data));
+        });
+        // Too far behind to catch up row by row
+        source.addEventListener('reset', function() {
+            source.close();
+            window.location.reload();
+        });
+        source.addEventListener('open', function() {
+            liveFeed.classList.remove('disconnected');
+        });
+        source.addEventListener('error', function() {
+            // EventSource reconnects by itself, resuming after the last row it received
+            liveFeed.classList.add('disconnected');
+        });
+    }
 });
 
+// Add a streamed feedback row to the top of the admin table
+function addFeedbackRow(feedback) {
+    const table = document.getElementById('feedbackTable');
+    if (!table) {
+        // The page has no table yet; render it with the new row
+        window.location.reload();
+        return;
+    }
+    const tbody = table.querySelector('tbody');
+    if (tbody.querySelector('tr[data-id="' + feedback.id + '"]')) {
+        return;
+    }
+    
+    const row = document.createElement('tr');
+    row.dataset.id = feedback.id;
+    row.className = 'live-row';
+    const cells = [feedback.id, feedback.student_username, feedback.feedback_text,
+                   feedback.rating + '/5', feedback.submission_date];
+    const classes = ['', '', 'feedback-text', 'rating', ''];
+    cells.forEach(function(value, index) {
+        const cell = document.createElement('td');
+        cell.textContent = value;
+        if (classes[index]) {
+            cell.className = classes[index];
+        }
+        row.appendChild(cell);
+    });
+    tbody.insertBefore(row, tbody.firstChild);
+}
+
 // Simple table sorting function
 function sortTable(table, columnIndex) {
     const tbody = table.querySelector('tbody');
@@ -0,0 +1,390 @@
+"""Per-term archives of cold feedback.
+
+Terms are named, non-overlapping date ranges kept in the feedback_terms
+table. Archiving a term moves its rows out of the live feedback table into
+a read-only SQLite file of their own (rows, pagination indexes, summary
+statistics and, when available, a full-text index), appended to by later
+runs and compacted once the term is fully moved. The live table
+keeps the current term and anything not archived yet, so inserts, triggers
+and the live search index work as before.
+
+Queries ATTACH the archives they need on demand (read-only) and prune the
+ones whose date range can't match. Archived rows keep their ids, so ids
+stay unique across partitions.
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+Term = namedtuple('Term', ['name', 'starts_on', 'ends_on', 'path', 'row_count', 'archived_at'])
+
+# Term names end up in file names
+TERM_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+# Attached archives are named after their file
+ALIAS_PREFIX = 'term_'
+
+
+def term_alias(path):
+    """Schema name under which an archive file is attached"""
+    return ALIAS_PREFIX + hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+
+
+def read_only_uri(path):
+    return 'file:' + pathname2url(os.path.abspath(path)) + '?mode=ro'
+
+
+def parse_day(value):
+    """Validate a YYYY-MM-DD day"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+    return value
+
+
+def aggregate_feedback(cursor, table='feedback', where='', params=()):
+    """Return (ratings, daily, students) aggregates of the matching rows"""
+    cursor.execute(f'SELECT rating, COUNT(*) FROM {table} {where} GROUP BY rating', params)
+    ratings = {rating: 0 for rating in range(1, 6)}
+    ratings.update(cursor.fetchall())
+
+    cursor.execute(f'''
+        SELECT date(submission_date), COUNT(*), SUM(rating)
+        FROM {table} {where} GROUP BY date(submission_date)
+    ''', params)
+    daily = {day: (count, rating_sum) for day, count, rating_sum in cursor.fetchall()}
+
+    cursor.execute(f'''
+        SELECT student_username, COUNT(*), SUM(rating)
+        FROM {table} {where} GROUP BY student_username
+    ''', params)
+    students = {student: (count, rating_sum) for student, count, rating_sum in cursor.fetchall()}
+
+    return ratings, daily, students
+
+
+def merge_aggregates(into, other):
+    """Add the (ratings, daily, students) aggregates in other to into"""
+    ratings, daily, students = into
+    other_ratings, other_daily, other_students = other
+    for rating, count in other_ratings.items():
+        ratings[rating] = ratings.get(rating, 0) + count
+    for target, source in ((daily, other_daily), (students, other_students)):
+        for key, (count, rating_sum) in source.items():
+            old_count, old_sum = target.get(key, (0, 0))
+            target[key] = (old_count + count, old_sum + rating_sum)
+    return into
+
+
+class TermCatalog:
+    """Term definitions and the archive files of archived terms"""
+
+    def __init__(self, db, directory=None):
+        self.db = db
+        self.directory = directory or os.path.splitext(os.path.abspath(db.db_name))[0] + '-terms'
+
+    def define(self, name, starts_on, ends_on):
+        """Add a term covering the inclusive days starts_on..ends_on"""
+        if not TERM_NAME_PATTERN.match(name or ''):
+            raise ValueError(f"Invalid term name: {name!r} (letters, digits, '.', '_' and '-')")
+        starts_on, ends_on = parse_day(starts_on), parse_day(ends_on)
+        if starts_on > ends_on:
+            raise ValueError("A term must start before it ends")
+
+        with self.db.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                overlapping = conn.execute('''
+                    SELECT name FROM feedback_terms
+                    WHERE starts_on <= ? AND ends_on >= ? OR name = ?
+                ''', (ends_on, starts_on, name)).fetchone()
+                if overlapping:
+                    raise ValueError(f"Term {name} overlaps or duplicates term {overlapping[0]}")
+                conn.execute('INSERT INTO feedback_terms (name, starts_on, ends_on) VALUES (?, ?, ?)',
+                             (name, starts_on, ends_on))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return self.get(name)
+
+    def get(self, name, conn=None):
+        """Return one Term, or None"""
+        if conn is None:
+            with self.db.connection() as conn:
+                return self.get(name, conn)
+        row = conn.execute('''
+            SELECT name, starts_on, ends_on, path, row_count, archived_at
+            FROM feedback_terms WHERE name = ?
+        ''', (name,)).fetchone()
+        return Term(*row) if row else None
+
+    def list(self, conn=None):
+        """Return every Term, oldest first"""
+        if conn is None:
+            with self.db.connection() as conn:
+                return self.list(conn)
+        return [Term(*row) for row in conn.execute('''
+            SELECT name, starts_on, ends_on, path, row_count, archived_at
+            FROM feedback_terms ORDER BY starts_on
+        ''')]
+
+    def live_count(self, term):
+        """Rows of this term still in the live table"""
+        with self.db.connection() as conn:
+            return conn.execute('''
+                SELECT COUNT(*) FROM feedback
+                WHERE submission_date >= ? AND submission_date < date(?, '+1 day')
+            ''', (term.starts_on, term.ends_on)).fetchone()[0]
+
+    def archived(self, conn, date_from=None, date_to=None, terms=None):
+        """Archived terms that can hold rows between the two days (inclusive), oldest first"""
+        return [term for term in (self.list(conn) if terms is None else terms) if term.path
+                and (date_from is None or term.ends_on >= date_from[:10])
+                and (date_to is None or term.starts_on <= date_to[:10])]
+
+    def partitions(self, conn, date_from=None, date_to=None):
+        """Yield lists of schema names to query: 'main' first, then attached archives.
+
+        At most SQLITE_LIMIT_ATTACHED archives are attached at a time; later
+        batches detach archives the current batch doesn't need. Archives stay
+        attached to the pooled connection between queries.
+        """
+        archived = self.archived(conn)
+        terms = self.archived(conn, date_from, date_to, terms=archived)
+        if not terms:
+            yield ['main']
+            return
+
+        current = {term_alias(term.path) for term in archived}
+        attached = {row[1] for row in conn.execute('PRAGMA database_list') if row[1].startswith(ALIAS_PREFIX)}
+        # Archives the catalog no longer lists since this connection attached them
+        for alias in attached - current:
+            conn.execute(f'DETACH DATABASE {alias}')
+            attached.discard(alias)
+
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        first = True
+        for start in range(0, len(terms), limit):
+            batch = {term_alias(term.path): term for term in terms[start:start + limit]}
+            for alias in list(attached):
+                if len(attached) + len(set(batch) - attached) <= limit:
+                    break
+                if alias not in batch:
+                    conn.execute(f'DETACH DATABASE {alias}')
+                    attached.discard(alias)
+            for alias, term in batch.items():
+                if alias not in attached:
+                    conn.execute(f'ATTACH DATABASE ? AS {alias}', (read_only_uri(term.path),))
+                    attached.add(alias)
+            yield (['main'] if first else []) + list(batch)
+            first = False
+
+    def archived_aggregates(self, conn):
+        """Summed (ratings, daily, students) statistics stored in every archive"""
+        totals = ({rating: 0 for rating in range(1, 6)}, {}, {})
+        # The summary tables are rebuilt by an earlier migration than the catalog's
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'feedback_terms'").fetchone():
+            return totals
+        for term in self.archived(conn):
+            # Read directly rather than ATTACH: the caller may be inside a transaction
+            archive = sqlite3.connect(read_only_uri(term.path), uri=True)
+            try:
+                cursor = archive.cursor()
+                ratings = dict(cursor.execute('SELECT rating, count FROM feedback_rating_stats'))
+                daily = {day: (count, rating_sum) for day, count, rating_sum
+                         in cursor.execute('SELECT day, count, rating_sum FROM feedback_daily_stats')}
+                students = {student: (count, rating_sum) for student, count, rating_sum in
+                            cursor.execute('SELECT student_username, count, rating_sum FROM feedback_student_stats')}
+            finally:
+                archive.close()
+            merge_aggregates(totals, (ratings, daily, students))
+        return totals
+
+    def iter_archived_rows(self, terms, where='', params=(), ordered=True):
+        """Yield rows of the given archives in (submission_date, id) order (or storage order), one file at a time"""
+        for term in sorted(terms, key=lambda term: term.starts_on):
+            archive = sqlite3.connect(read_only_uri(term.path), uri=True)
+            try:
+                yield from archive.execute(f'''
+                    SELECT id, student_username, feedback_text, rating, submission_date
+                    FROM feedback {where}
+                    {'ORDER BY submission_date, id' if ordered else ''}
+                ''', params)
+            finally:
+                archive.close()
+
+    def archive(self, name, through=None, compact=True):
+        """Move a term's live rows into its archive file; returns the updated Term.
+
+        Each term has one archive file, created by its first archive run and
+        appended to by later ones. The rows are first copied into the file
+        (with its indexes, summary statistics and full-text index kept up to
+        date in the same transaction); then one transaction on the live
+        database deletes exactly the rows the file holds. Between the two
+        commits a reader can see a moved row twice; a crash there leaves the
+        rows live, and the next run deletes them without copying them again.
+        Rows added to the term's dates meanwhile (e.g. by an import) stay live
+        until the next archive run.
+
+        through (YYYY-MM-DD) moves only the rows up to that day, so a large
+        term can be moved in several short transactions, each costing only
+        its own rows; compact=False skips the ANALYZE and VACUUM of the file
+        that the last chunk does once.
+        """
+        term = self.get(name)
+        if term is None:
+            raise ValueError(f"Unknown term: {name}")
+        through = term.ends_on if through is None else min(parse_day(through), term.ends_on)
+
+        created = term.path is None
+        if created:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S%f')
+            path = os.path.join(self.directory, f'{name}-{stamp}.db')
+        else:
+            path = term.path
+
+        try:
+            copied = self._append_to_archive(term, path, through, created)
+            if copied == 0 and created:
+                os.remove(path)
+                return term
+
+            alias = term_alias(path)
+            with self.db.connection() as conn:
+                # The pooled connection may still have the archive attached from a query
+                attached = any(row[1] == alias for row in conn.execute('PRAGMA database_list'))
+                if not attached:
+                    conn.execute(f'ATTACH DATABASE ? AS {alias}', (read_only_uri(path),))
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        cursor = conn.cursor()
+                        moved_where = f'''
+                            WHERE submission_date >= ? AND submission_date < date(?, '+1 day')
+                            AND EXISTS (SELECT 1 FROM {alias}.feedback archived WHERE archived.id = main.feedback.id)
+                        '''
+                        moved_params = (term.starts_on, through)
+                        moved = aggregate_feedback(cursor, 'main.feedback', moved_where, moved_params)
+                        cursor.execute(f'DELETE FROM main.feedback {moved_where}', moved_params)
+                        # The delete triggers took the rows out of the summary tables,
+                        # which count archived feedback too, so put them back
+                        self.db.add_to_stats(cursor, moved)
+                        row_count = cursor.execute(
+                            f'SELECT SUM(count) FROM {alias}.feedback_rating_stats').fetchone()[0]
+                        cursor.execute('''
+                            UPDATE feedback_terms SET path = ?, row_count = ?, archived_at = CURRENT_TIMESTAMP
+                            WHERE name = ?
+                        ''', (path, row_count, name))
+                        conn.commit()
+                    except BaseException:
+                        conn.rollback()
+                        raise
+                finally:
+                    if not attached:
+                        conn.execute(f'DETACH DATABASE {alias}')
+        except BaseException:
+            # Nothing points at a file this run created; a known file keeps
+            # its copied rows, which the next run deletes from the live table
+            if created and os.path.exists(path):
+                os.remove(path)
+            raise
+
+        self.db.invalidate_feedback_version()
+        if compact:
+            self._compact_archive(path)
+        logger.info("Archived term %s: %d rows moved, %d rows in %s", name, copied, row_count, path)
+        return self.get(name)
+
+    def _append_to_archive(self, term, path, through, created):
+        """Copy the term's live rows up to through that the archive lacks into it; returns the rows copied"""
+        archive = sqlite3.connect(path)
+        try:
+            cursor = archive.cursor()
+            if created:
+                self._create_archive_schema(cursor)
+            cursor.execute('ATTACH DATABASE ? AS live', (read_only_uri(self.db.db_name),))
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    cursor.execute('''
+                        CREATE TEMP TABLE moving AS
+                        SELECT id, student_username, feedback_text, rating, submission_date FROM live.feedback
+                        WHERE submission_date >= ? AND submission_date < date(?, '+1 day')
+                        AND id NOT IN (SELECT id FROM main.feedback)
+                    ''', (term.starts_on, through))
+                    cursor.execute('INSERT INTO main.feedback SELECT * FROM temp.moving')
+                    copied = cursor.rowcount
+                    if cursor.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'feedback_fts'").fetchone():
+                        cursor.execute('''
+                            INSERT INTO main.feedback_fts (rowid, feedback_text)
+                            SELECT id, feedback_text FROM temp.moving
+                        ''')
+                    self.db.add_to_stats(cursor, aggregate_feedback(cursor, 'temp.moving'))
+                    cursor.execute('DROP TABLE temp.moving')
+                    archive.commit()
+                except BaseException:
+                    archive.rollback()
+                    raise
+            finally:
+                cursor.execute('DETACH DATABASE live')
+        finally:
+            archive.close()
+        return copied
+
+    def _create_archive_schema(self, cursor):
+        """Create the tables and indexes of an empty archive file"""
+        cursor.execute('''
+            CREATE TABLE feedback (
+                id INTEGER PRIMARY KEY,
+                student_username TEXT NOT NULL,
+                feedback_text TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                submission_date TIMESTAMP
+            )
+        ''')
+        # Same pagination indexes as the live table
+        cursor.execute('CREATE INDEX idx_feedback_date ON feedback (submission_date, id)')
+        cursor.execute('CREATE INDEX idx_feedback_rating_date ON feedback (rating, submission_date, id)')
+        cursor.execute('CREATE INDEX idx_feedback_student_date ON feedback (student_username, submission_date, id)')
+
+        cursor.execute('CREATE TABLE feedback_rating_stats (rating INTEGER PRIMARY KEY, count INTEGER NOT NULL)')
+        cursor.execute('''
+            CREATE TABLE feedback_daily_stats (day TEXT PRIMARY KEY, count INTEGER NOT NULL,
+                                               rating_sum INTEGER NOT NULL)
+        ''')
+        cursor.execute('''
+            CREATE TABLE feedback_student_stats (student_username TEXT PRIMARY KEY, count INTEGER NOT NULL,
+                                                 rating_sum INTEGER NOT NULL)
+        ''')
+        cursor.executemany('INSERT INTO feedback_rating_stats VALUES (?, 0)', [(rating,) for rating in range(1, 6)])
+
+        if self.db.search_available:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE feedback_fts USING fts5(
+                    feedback_text, content='feedback', content_rowid='id', tokenize='porter unicode61'
+                )
+            ''')
+        cursor.connection.commit()
+
+    def _compact_archive(self, path):
+        """Merge the full-text index, refresh the planner statistics and VACUUM an archive file"""
+        archive = sqlite3.connect(path)
+        try:
+            cursor = archive.cursor()
+            if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'feedback_fts'").fetchone():
+                cursor.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('optimize')")
+            cursor.execute('ANALYZE')
+            archive.commit()
+            cursor.execute('VACUUM')
+        finally:
+            archive.close()
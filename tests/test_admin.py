@@ -1,10 +1,14 @@
 import unittest
 import sys
 import os
+import time
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+# Keep password hashing cheap for the functional tests
+os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+
 from app import app
 
 class AdminTestCase(unittest.TestCase):
@@ -92,6 +96,165 @@ class AdminTestCase(unittest.TestCase):
                       b'No feedback' in response.data)
         self.assertTrue(has_content)
     
+    def test_admin_dashboard_pagination(self):
+        """Test that the dashboard pages through feedback with a cursor"""
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'student1', 'password': 'password123'})
+        for text in ('Pagination feedback one', 'Pagination feedback two'):
+            self.client.post('/feedback', data={'feedback_text': text, 'rating': '3'})
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        
+        response = self.client.get('/admin?page_size=1&rating=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'nextPage', response.data)
+        self.assertEqual(response.data.count(b'<td class="rating">'), 1)
+    
+    def test_admin_dashboard_invalid_filter(self):
+        """Test that an invalid filter shows an error instead of failing"""
+        response = self.client.get('/admin?date_from=yesterday')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Invalid date', response.data)
+    
+    def test_admin_dashboard_search(self):
+        """Test that searching shows highlighted, escaped snippets"""
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'student1', 'password': 'password123'})
+        self.client.post('/feedback', data={'feedback_text': 'Searchable <b>zyxwv</b> feedback', 'rating': '4'})
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        
+        response = self.client.get('/admin?q=zyxwv')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<mark>zyxwv</mark>', response.data)
+        self.assertIn(b'&lt;b&gt;', response.data)
+        self.assertNotIn(b'<b>zyxwv', response.data)
+        
+        response = self.client.get('/admin?q=nosuchwordanywhere')
+        self.assertIn(b'No feedback matches', response.data)
+    
+    def test_admin_dashboard_conditional_get(self):
+        """Test that an unchanged dashboard is answered with 304 until feedback changes"""
+        # Show the pending login message first; pages with messages are not cached
+        self.client.get('/admin')
+        response = self.client.get('/admin?page_size=50')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+        
+        response = self.client.get('/admin?page_size=50', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        
+        # A different page of the dashboard has its own ETag
+        response = self.client.get('/admin?page_size=25', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'student1', 'password': 'password123'})
+        # Unique per run: the app's database keeps earlier runs' feedback, and a repeat would be dropped
+        self.client.post('/feedback', data={'feedback_text': f'Changes the dashboard {time.time()}', 'rating': '2'})
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        
+        self.client.get('/admin')
+        response = self.client.get('/admin?page_size=50', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertIn(b'Changes the dashboard', response.data)
+    
+    def test_admin_export_download(self):
+        """Test that admins can download feedback as CSV"""
+        response = self.client.get('/admin/export?format=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        self.assertTrue(response.data.startswith(b'id,student_username,feedback_text,rating,submission_date'))
+    
+    def test_admin_export_requires_admin(self):
+        """Test that the export endpoint is admin only"""
+        self.client.get('/logout')
+        response = self.client.get('/admin/export')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login', response.location)
+    
+    def test_admin_reports_page(self):
+        """Test that the reports page shows the trend, cohort and term reports to admins only"""
+        response = self.client.get('/admin/reports?weeks=4&terms=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Feedback Reports', response.data)
+        self.assertTrue(b'weeklyReport' in response.data or b'no-feedback' in response.data)
+        
+        response = self.client.get('/admin/reports?weeks=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Weeks must be between 1 and', response.data)
+        
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'student1', 'password': 'password123'})
+        response = self.client.get('/admin/reports')
+        self.assertEqual(response.status_code, 302)
+    
+    def test_admin_stream(self):
+        """Test that the live feed is an event stream for admins, resuming after the given id"""
+        response = self.client.get('/admin')
+        self.assertIn(b'id="liveFeed"', response.data)
+        
+        response = self.client.get('/admin/stream', headers={'Last-Event-ID': '0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        self.assertIn(b'retry: ', next(response.response))
+        response.close()
+        
+        # Streams beyond the broker's limit are refused; a closed one frees its slot
+        from app import feedback_broker, instrumentation
+        original = feedback_broker.max_subscribers
+        feedback_broker.max_subscribers = 1
+        try:
+            first = self.client.get('/admin/stream')
+            self.assertEqual(first.status_code, 200)
+            refused = self.client.get('/admin/stream')
+            self.assertEqual(refused.status_code, 503)
+            self.assertIn('Retry-After', refused.headers)
+            first.close()
+            response = self.client.get('/admin/stream')
+            self.assertEqual(response.status_code, 200)
+            response.close()
+        finally:
+            feedback_broker.max_subscribers = original
+        self.assertNotIn('endpoint="/admin/stream"', instrumentation.registry.render())
+        
+        self.assertEqual(self.client.get('/admin/stream?after=oops').status_code, 400)
+        self.client.get('/logout')
+        self.assertEqual(self.client.get('/admin/stream').status_code, 401)
+    
+    def test_admin_profiles(self):
+        """Test that ?profile=1 profiles an admin's request and the stacks can be downloaded"""
+        from app import profiler
+        profiler.reset()
+        response = self.client.get('/admin/profiles')
+        self.assertIn(b'No requests profiled yet', response.data)
+        
+        self.assertEqual(self.client.get('/admin?profile=1').status_code, 200)
+        profile = profiler.recent_profiles()[0]
+        self.assertEqual((profile.endpoint, profile.status), ('/admin', 200))
+        response = self.client.get('/admin/profiles')
+        self.assertIn(b'routeProfiles', response.data)
+        response = self.client.get(f'/admin/profiles/{profile.id}.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data.decode(), profile.collapsed())
+        self.assertEqual(self.client.get('/admin/profiles/routes.txt?route=/nowhere').status_code, 404)
+        
+        self.client.post('/admin/profiles/reset')
+        self.assertEqual(profiler.recent_profiles(), [])
+        
+        # Students can neither read profiles nor mark requests
+        self.client.get('/logout')
+        self.client.post('/login', data={'username': 'student1', 'password': 'password123'})
+        self.assertEqual(self.client.get('/admin/profiles').status_code, 302)
+        self.client.get('/feedback?profile=1')
+        self.assertEqual(profiler.recent_profiles(), [])
+    
     def test_admin_role_verification(self):
         """Test that only admin role can access admin features"""
         # This test verifies admin login works
@@ -0,0 +1,120 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from datetime import date
+
+from analytics import FeedbackAnalytics, TermCount
+from database import Database
+from passwords import PasswordEngine
+
+
+class AnalyticsTestCase(unittest.TestCase):
+    """Test cases for the vectorized feedback reports"""
+
+    def setUp(self):
+        """Create a database with feedback from two cohorts over three weeks"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'), password_engine=PasswordEngine(iterations=1000))
+        self.db.bulk_insert_feedback([
+            # Week of Monday 2024-01-29; alice and bob join in January
+            ('alice', 'Grading is confusing, the GRADING rubric too', 1, '2024-01-29 09:00:00'),
+            ('bob', 'Great lectures and great labs', 5, '2024-01-31 23:59:59'),
+            ('alice', 'Lectures were great', 4, '2024-02-04 12:00:00'),
+            # Nothing in the week of 2024-02-05, then carol joins in February
+            ('carol', 'Confusing homework deadlines', 2, '2024-02-12 08:00:00'),
+            ('bob', "Labs don't start on time", 3, '2024-02-13 08:00:00'),
+            ('carol', 'Homework feedback was great', 5, '2024-02-14 08:00:00'),
+        ])
+        # Small chunks so the report spans several of them
+        self.analytics = FeedbackAnalytics(self.db, chunk_size=4)
+
+    def tearDown(self):
+        """Close pooled connections and remove the database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_weekly_trend(self):
+        """Test counts, means and histograms per Monday-based week, empty weeks included"""
+        weekly = self.analytics.reports(weeks=52).weekly
+        self.assertEqual([week.week for week in weekly],
+                         [date(2024, 1, 29), date(2024, 2, 5), date(2024, 2, 12)])
+        self.assertEqual([week.count for week in weekly], [3, 0, 3])
+        self.assertAlmostEqual(weekly[0].mean, 10 / 3)
+        self.assertIsNone(weekly[1].mean)
+        self.assertEqual(weekly[2].histogram, (0, 1, 1, 0, 1))
+
+        self.assertEqual([week.week for week in self.analytics.reports(weeks=2).weekly],
+                         [date(2024, 2, 5), date(2024, 2, 12)])
+
+    def test_cohort_distribution(self):
+        """Test that students are grouped by the month of their first feedback"""
+        cohorts = self.analytics.reports().cohorts
+        self.assertEqual([(cohort.cohort, cohort.students, cohort.count) for cohort in cohorts],
+                         [('2024-01', 2, 4), ('2024-02', 1, 2)])
+        self.assertEqual(cohorts[0].histogram, (1, 0, 1, 1, 1))
+        self.assertAlmostEqual(cohorts[1].mean, 3.5)
+
+    def test_top_terms_by_rating(self):
+        """Test that terms count once per entry, case-folded, without stopwords or short words"""
+        reports = self.analytics.reports(terms=3)
+        # Ties are listed alphabetically
+        self.assertEqual(reports.low_terms, [TermCount('confusing', 2, 0), TermCount('deadlines', 1, 0),
+                                             TermCount('grading', 1, 0)])
+        self.assertEqual(reports.high_terms[0], TermCount('great', 0, 3))
+        terms = {term.term for term in self.analytics.reports(terms=100).high_terms}
+        self.assertFalse(terms & {'and', 'was', 'the', 'don'})
+
+    def test_reports_cached_per_version(self):
+        """Test that reports are reused until the feedback changes"""
+        first = self.analytics.reports()
+        self.assertIs(self.analytics.reports(), first)
+        self.analytics.reports(weeks=4)
+        self.assertEqual(self.analytics.loads, 1)
+
+        self.db.submit_feedback('dave', 'Great course', 5)
+        second = self.analytics.reports()
+        self.assertEqual(self.analytics.loads, 2)
+        self.assertEqual(second.rows, first.rows + 1)
+        self.assertEqual(second.cohorts[-1].students, 1)
+
+    def test_reports_span_archived_terms(self):
+        """Test that archiving a term leaves the reports unchanged"""
+        before = self.analytics.reports()
+        self.db.define_term('2024-january', '2024-01-01', '2024-01-31')
+        self.db.archive_term('2024-january')
+        after = self.analytics.reports()
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(after._replace(version=None), before._replace(version=None))
+
+    def test_rows_without_a_date_are_skipped(self):
+        """Test that NULL and empty submission dates don't break the reports"""
+        before = self.analytics.reports()
+        with self.db.connection() as conn:
+            conn.executemany('INSERT INTO feedback (student_username, feedback_text, rating, submission_date) '
+                             'VALUES (?, ?, ?, ?)', [('dave', 'Undated great feedback', 5, None),
+                                                     ('dave', 'Blank date', 1, '')])
+            conn.commit()
+        self.db.invalidate_feedback_version()
+        after = self.analytics.reports()
+        self.assertEqual(after._replace(version=None), before._replace(version=None))
+
+    def test_empty_table(self):
+        """Test reports over no feedback at all"""
+        with self.db.connection() as conn:
+            conn.execute('DELETE FROM feedback')
+            conn.commit()
+        self.db.invalidate_feedback_version()
+        reports = self.analytics.reports()
+        self.assertEqual((reports.rows, reports.weekly, reports.cohorts, reports.low_terms), (0, [], [], []))
+        with self.assertRaises(ValueError):
+            self.analytics.reports(weeks=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from api import AsyncDatabase, FeedbackApi
+from database import Database
+from passwords import PasswordEngine
+from ratelimit import LoginThrottle, MemoryRateLimiter, RateLimit
+from sessions import SessionStore
+from write_queue import WriteBehindQueue
+
+
+async def call(app, method, path, body=None, token=None, query=''):
+    """Send one HTTP request through the ASGI app and return (status, JSON body)"""
+    headers = []
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'query_string': query.encode(), 'headers': headers}
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+class ApiTestCase(unittest.TestCase):
+    """Test cases for the async JSON API, driven through its ASGI interface"""
+
+    def setUp(self):
+        """Create a fresh database and API for each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+        self.async_db = AsyncDatabase(self.db)
+        self.api = FeedbackApi(self.async_db, 'test-secret')
+
+    def tearDown(self):
+        """Shut down the API's thread pool and remove the database"""
+        self.async_db.close()
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def request(self, *args, **kwargs):
+        return asyncio.run(call(self.api, *args, **kwargs))
+
+    def login(self, username, password):
+        status, body = self.request('POST', '/api/login', {'username': username, 'password': password})
+        self.assertEqual(status, 200)
+        return body['token']
+
+    def test_login(self):
+        """Test that valid credentials get a token and invalid ones get 401"""
+        status, body = self.request('POST', '/api/login', {'username': 'student1', 'password': 'password123'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['role'], 'student')
+
+        status, body = self.request('POST', '/api/login', {'username': 'student1', 'password': 'wrong'})
+        self.assertEqual(status, 401)
+        status, _ = self.request('POST', '/api/login', {'username': 'student1'})
+        self.assertEqual(status, 400)
+
+    def test_submit_list_and_stats(self):
+        """Test a student submission showing up in the admin listing and stats"""
+        student = self.login('student1', 'password123')
+        status, _ = self.request('POST', '/api/feedback', {'feedback_text': 'Great API', 'rating': 5},
+                                 token=student)
+        self.assertEqual(status, 201)
+        status, body = self.request('POST', '/api/feedback', {'feedback_text': ' ', 'rating': 5}, token=student)
+        self.assertEqual(status, 400)
+        self.assertIn('error', body)
+
+        admin = self.login('admin', 'admin123')
+        status, body = self.request('GET', '/api/feedback', token=admin, query='page_size=10')
+        self.assertEqual(status, 200)
+        self.assertEqual(body['items'][0]['feedback_text'], 'Great API')
+        self.assertIsNone(body['next_cursor'])
+
+        status, body = self.request('GET', '/api/feedback', token=admin, query='q=great')
+        self.assertEqual(len(body['items']), 1)
+        self.assertIn('snippet', body['items'][0])
+
+        status, body = self.request('GET', '/api/stats', token=admin)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['total'], 1)
+        self.assertEqual(body['histogram']['5'], 1)
+
+    def test_duplicate_and_own_feedback(self):
+        """Test that a retried submission gets 409 and students can list their own feedback"""
+        student = self.login('student1', 'password123')
+        for text in ('First thoughts', 'Second thoughts', 'Second thoughts'):
+            status, body = self.request('POST', '/api/feedback', {'feedback_text': text, 'rating': 4},
+                                        token=student)
+        self.assertEqual(status, 409)
+        self.assertIn('already submitted', body['error'])
+        self.db.submit_feedback('student2', 'Not mine', 2)
+
+        status, body = self.request('GET', '/api/feedback/mine', token=student, query='page_size=1')
+        self.assertEqual(status, 200)
+        self.assertEqual((body['total'], body['mean']), (2, 4.0))
+        self.assertEqual([item['feedback_text'] for item in body['items']], ['Second thoughts'])
+        status, body = self.request('GET', '/api/feedback/mine', token=student,
+                                    query=f"cursor={body['next_cursor']}")
+        self.assertEqual([item['feedback_text'] for item in body['items']], ['First thoughts'])
+
+        status, _ = self.request('GET', '/api/feedback/mine', token=self.login('admin', 'admin123'))
+        self.assertEqual(status, 403)
+
+    def test_authorization(self):
+        """Test missing, forged and wrong-role tokens"""
+        status, _ = self.request('GET', '/api/stats')
+        self.assertEqual(status, 401)
+        status, _ = self.request('GET', '/api/stats', token='forged')
+        self.assertEqual(status, 401)
+
+        student = self.login('student1', 'password123')
+        status, _ = self.request('GET', '/api/feedback', token=student)
+        self.assertEqual(status, 403)
+
+        admin = self.login('admin', 'admin123')
+        status, _ = self.request('POST', '/api/feedback', {'feedback_text': 'x', 'rating': 3}, token=admin)
+        self.assertEqual(status, 403)
+
+    def test_tokens_follow_revocation_and_role_changes(self):
+        """Test that logout, revoking sessions and a demotion apply to tokens already issued"""
+        student = self.login('student1', 'password123')
+        status, _ = self.request('POST', '/api/logout', token=student)
+        self.assertEqual(status, 200)
+        status, body = self.request('GET', '/api/feedback/mine', token=student)
+        self.assertEqual((status, body['error']), (401, "Token revoked"))
+
+        student = self.login('student1', 'password123')
+        self.assertEqual(SessionStore(self.db, cache_size=0).revoke_user('student1'), 0)
+        status, _ = self.request('GET', '/api/feedback/mine', token=student)
+        self.assertEqual(status, 401)
+
+        admin = self.login('admin', 'admin123')
+        with self.db.connection() as conn:
+            conn.execute("UPDATE users SET role = 'student' WHERE username = 'admin'")
+            conn.commit()
+        status, _ = self.request('GET', '/api/stats', token=admin)
+        self.assertEqual(status, 403)
+
+    def test_unknown_routes_and_bad_input(self):
+        """Test 404, 405 and invalid filters"""
+        self.assertEqual(self.request('GET', '/api/nothing')[0], 404)
+        self.assertEqual(self.request('DELETE', '/api/stats')[0], 405)
+
+        admin = self.login('admin', 'admin123')
+        status, body = self.request('GET', '/api/feedback', token=admin, query='rating=9')
+        self.assertEqual(status, 400)
+        self.assertIn('Rating', body['error'])
+
+    def test_login_throttled(self):
+        """Test that repeated failed logins get 429 with Retry-After"""
+        self.api.login_throttle = LoginThrottle(MemoryRateLimiter(), per_ip=RateLimit(2, 60),
+                                                per_username=RateLimit(10, 60))
+        for _ in range(2):
+            status, _ = self.request('POST', '/api/login', {'username': 'student1', 'password': 'wrong'})
+            self.assertEqual(status, 401)
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return {'type': 'http.request',
+                    'body': json.dumps({'username': 'student1', 'password': 'password123'}).encode()}
+
+        asyncio.run(self.api({'type': 'http', 'method': 'POST', 'path': '/api/login', 'query_string': b'',
+                              'headers': []}, receive, send))
+        self.assertEqual(sent[0]['status'], 429)
+        self.assertGreater(int(dict(sent[0]['headers'])[b'retry-after']), 0)
+
+    def test_concurrent_submissions_through_write_queue(self):
+        """Test many concurrent submissions awaiting group commits"""
+        submission_queue = WriteBehindQueue(self.db, max_batch=50)
+        self.async_db.submission_queue = submission_queue
+        student = self.login('student1', 'password123')
+
+        async def submit_all():
+            return await asyncio.gather(*(
+                call(self.api, 'POST', '/api/feedback', {'feedback_text': f'Concurrent {i}', 'rating': 4},
+                     token=student)
+                for i in range(200)))
+
+        try:
+            results = asyncio.run(submit_all())
+        finally:
+            submission_queue.close()
+
+        self.assertEqual({status for status, _ in results}, {201})
+        self.assertEqual(self.db.get_feedback_stats()['total'], 200)
+        self.assertLess(submission_queue.stats()['flushes'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import gzip
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, render_template_string
+
+from assets import IMMUTABLE_CACHE_CONTROL, StaticAssets, build_assets, manifest_is_current
+
+
+class AssetTestCase(unittest.TestCase):
+    """Test cases for fingerprinted, precompressed static assets"""
+
+    def setUp(self):
+        """Create a static directory with a stylesheet and an app serving its build"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.static_dir = os.path.join(self.tmp_dir, 'static')
+        self.output_dir = os.path.join(self.static_dir, 'dist')
+        os.makedirs(self.static_dir)
+        self.write_static('style.css', 'body { color: #333; }\n' * 50)
+        self.write_static('tiny.js', '1')
+
+        build_assets(self.static_dir, self.output_dir)
+        self.app = Flask(__name__, static_folder=self.static_dir)
+        self.assets = StaticAssets(self.app, output_dir=self.output_dir)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        """Remove the static directory and its build"""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_static(self, name, text):
+        with open(os.path.join(self.static_dir, name), 'w') as f:
+            f.write(text)
+
+    def asset_url(self, name):
+        with self.app.test_request_context():
+            return render_template_string('{{ asset_url(name) }}', name=name)
+
+    def test_urls_are_fingerprinted(self):
+        """Test that asset_url links to a content-hashed name that changes with the content"""
+        url = self.asset_url('style.css')
+        self.assertRegex(url, r'^/assets/style\.[0-9a-f]{12}\.css$')
+        self.assertTrue(manifest_is_current(self.static_dir, self.output_dir))
+        self.assertEqual(self.asset_url('missing.css'), '/static/missing.css')
+
+        self.write_static('style.css', 'body { color: #000; }\n')
+        self.assertFalse(manifest_is_current(self.static_dir, self.output_dir))
+        # Loading never builds; the old URL stays until the next build
+        self.assets.load()
+        self.assertEqual(self.asset_url('style.css'), url)
+        build_assets(self.static_dir, self.output_dir)
+        self.assets.load()
+        new_url = self.asset_url('style.css')
+        self.assertNotEqual(new_url, url)
+        # The previous build's files are gone
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, url.rsplit('/', 1)[1])))
+
+    def test_unbuilt_assets_fall_back_to_static(self):
+        """Test that an app without a build writes nothing and links to /static"""
+        output_dir = os.path.join(self.tmp_dir, 'unbuilt')
+        app = Flask(__name__, static_folder=self.static_dir)
+        StaticAssets(app, output_dir=output_dir)
+        self.assertFalse(os.path.exists(output_dir))
+        with app.test_request_context():
+            self.assertEqual(render_template_string("{{ asset_url('style.css') }}"), '/static/style.css')
+
+    def test_negotiates_encoding(self):
+        """Test that compressed variants are sent only to browsers that accept them"""
+        url = self.asset_url('style.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertEqual(gzip.decompress(response.data).decode(), 'body { color: #333; }\n' * 50)
+
+        for accept in ('', 'gzip;q=0', 'identity'):
+            response = self.client.get(url, headers={'Accept-Encoding': accept})
+            self.assertNotIn('Content-Encoding', response.headers)
+            self.assertEqual(response.data.decode(), 'body { color: #333; }\n' * 50)
+
+        # Compressing a one-byte file would make it larger
+        response = self.client.get(self.asset_url('tiny.js'), headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data, b'1')
+
+    def test_conditional_request(self):
+        """Test that a matching ETag answers 304 and unknown names 404"""
+        url = self.asset_url('style.css')
+        etag = self.client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/assets/style.000000000000.css').status_code, 404)
+
+    def test_build_is_reproducible(self):
+        """Test that rebuilding unchanged sources writes the same manifest and bytes"""
+        first = build_assets(self.static_dir, self.output_dir)
+        path = os.path.join(self.output_dir, first['assets']['style.css']['path'] + '.gz')
+        with open(path, 'rb') as f:
+            compressed = f.read()
+        self.assertEqual(build_assets(self.static_dir, self.output_dir), first)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), compressed)
+        self.assertNotIn('dist/manifest.json', first['assets'])
+
+
+if __name__ == '__main__':
+    unittest.main()
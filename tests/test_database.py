@@ -0,0 +1,419 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import migrations
+from database import (INSERT_UNLESS_DUPLICATE, SNIPPET_END, SNIPPET_START, Database, DuplicateFeedbackError,
+                      PoolTimeoutError)
+from passwords import PasswordEngine
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Test cases for the storage layer against a temporary SQLite file"""
+
+    def setUp(self):
+        """Create a fresh database for each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'), pool_size=2, pool_timeout=0.2,
+                           password_engine=PasswordEngine(iterations=1000))
+
+    def tearDown(self):
+        """Close pooled connections and remove the database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_pool_reuses_connections(self):
+        """Test that repeated calls reuse pooled connections"""
+        for i in range(10):
+            self.db.submit_feedback('student1', f'Pooled feedback {i}', 4)
+            self.assertEqual(self.db.authenticate_user('student1', 'password123'), ('student1', 'student'))
+
+        stats = self.db.pool.stats()
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertLessEqual(stats['open_connections'], 2)
+
+    def test_nested_checkout_reuses_thread_connection(self):
+        """Test that a thread holding a connection gets the same one back"""
+        with self.db.connection() as outer:
+            with self.db.connection() as inner:
+                self.assertIs(outer, inner)
+        self.assertEqual(self.db.pool.stats()['reused_in_thread'], 1)
+
+    def test_get_connection_is_unpooled(self):
+        """Test that get_connection() still returns a plain connection the caller closes"""
+        checkouts = self.db.pool.stats()['checkouts']
+        conn = self.db.get_connection()
+        try:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM users').fetchone()[0], 2)
+        finally:
+            conn.close()
+        self.assertEqual(self.db.pool.stats()['checkouts'], checkouts)
+
+    def test_pool_wait_timeout(self):
+        """Test that an exhausted pool times out and records the wait"""
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold_connection():
+            with self.db.connection():
+                held.set()
+                release.wait(5)
+
+        workers = [threading.Thread(target=hold_connection) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        held.wait(5)
+        while self.db.pool.stats()['in_use_connections'] < 2:
+            pass
+
+        with self.assertRaises(PoolTimeoutError):
+            self.db.get_all_feedback()
+
+        release.set()
+        for worker in workers:
+            worker.join()
+
+        stats = self.db.pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreaterEqual(stats['wait_time_max'], 0.2)
+
+    def test_unhealthy_connection_is_replaced(self):
+        """Test that a broken idle connection is discarded on checkout"""
+        self.db.pool.health_check_interval = 0
+        with self.db.connection() as conn:
+            broken = conn
+        broken.close()
+
+        self.assertEqual(self.db.get_all_feedback(), [])
+        self.assertEqual(self.db.pool.stats()['connections_discarded'], 1)
+
+    def test_high_concurrency_profile(self):
+        """Test that the high-concurrency profile enables WAL and checkpoints"""
+        db = Database(os.path.join(self.tmp_dir, 'wal.db'), storage_profile='high-concurrency',
+                      checkpoint_interval=60, password_engine=PasswordEngine(iterations=1000))
+        try:
+            self.assertEqual(db.storage_settings['journal_mode'], 'wal')
+            self.assertEqual(db.storage_settings['synchronous'], 1)
+            self.assertEqual(db.storage_settings['temp_store'], 2)
+            self.assertTrue(db.checkpointer.is_alive())
+
+            db.submit_feedback('student1', 'WAL feedback', 5)
+            busy, _, _ = db.checkpointer.checkpoint()
+            self.assertEqual(busy, 0)
+        finally:
+            db.close()
+        self.assertFalse(db.checkpointer.is_alive())
+
+    def test_unknown_storage_profile(self):
+        """Test that an unknown storage profile is rejected"""
+        with self.assertRaises(ValueError):
+            Database(os.path.join(self.tmp_dir, 'bad.db'), storage_profile='turbo')
+
+    def test_feedback_page_walks_all_rows(self):
+        """Test that following cursors visits every row exactly once"""
+        for i in range(7):
+            self.db.submit_feedback('student1', f'Feedback {i}', i % 5 + 1)
+
+        seen = []
+        cursor = None
+        while True:
+            page = self.db.get_feedback_page(page_size=3, cursor=cursor)
+            seen.extend(row[0] for row in page.rows)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(sorted(seen), list(range(1, 8)))
+
+    def test_feedback_page_filters_and_sort(self):
+        """Test rating and student filters and rating sort order"""
+        for i, rating in enumerate((1, 5, 3, 5)):
+            self.db.submit_feedback('student1', f'Rated {rating} ({i})', rating)
+        self.db.submit_feedback('student2', 'Other student', 5)
+
+        page = self.db.get_feedback_page(rating=5, student='student1')
+        self.assertEqual([row[3] for row in page.rows], [5, 5])
+
+        page = self.db.get_feedback_page(sort='rating', order='asc', page_size=2)
+        self.assertEqual([row[3] for row in page.rows], [1, 3])
+        page = self.db.get_feedback_page(sort='rating', order='asc', page_size=2, cursor=page.next_cursor)
+        self.assertEqual([row[3] for row in page.rows], [5, 5])
+
+        today = self.db.get_feedback_page(date_from='2000-01-01', date_to='2999-12-31')
+        self.assertEqual(len(today.rows), 5)
+        self.assertEqual(self.db.get_feedback_page(date_to='2000-01-01').rows, [])
+
+    def test_feedback_page_rejects_bad_input(self):
+        """Test that invalid filters and cursors raise ValueError"""
+        for kwargs in ({'cursor': 'not-a-cursor'}, {'rating': 9}, {'date_from': '01/02/2024'},
+                       {'sort': 'student'}, {'order': 'sideways'}):
+            with self.assertRaises(ValueError):
+                self.db.get_feedback_page(**kwargs)
+
+    def test_stats_follow_inserts_updates_and_deletes(self):
+        """Test that triggers keep the summary tables in step with the feedback table"""
+        for i, rating in enumerate((5, 4, 4, 1)):
+            self.db.submit_feedback('student1', f'Rated {rating} ({i})', rating)
+        self.db.submit_feedback('student2', 'Another student', 2)
+
+        stats = self.db.get_feedback_stats()
+        self.assertEqual(stats['total'], 5)
+        self.assertEqual(stats['histogram'], {1: 1, 2: 1, 3: 0, 4: 2, 5: 1})
+        self.assertAlmostEqual(stats['mean'], 16 / 5)
+        self.assertEqual(self.db.get_student_counts('student1'), (4, 3.5))
+        self.assertEqual(sum(row[1] for row in self.db.get_daily_counts()), 5)
+
+        with self.db.connection() as conn:
+            conn.execute("UPDATE feedback SET rating = 3 WHERE rating = 1")
+            conn.execute("DELETE FROM feedback WHERE student_username = 'student2'")
+            conn.commit()
+
+        self.assertEqual(self.db.get_feedback_stats()['histogram'], {1: 0, 2: 0, 3: 1, 4: 2, 5: 1})
+        self.assertIsNone(self.db.get_student_counts('student2'))
+        self.assertEqual(self.db.verify_stats(), [])
+
+    def test_verify_and_rebuild_stats(self):
+        """Test that verify reports drift and rebuild repairs it"""
+        self.db.submit_feedback('student1', 'Drifting stats', 3)
+        with self.db.connection() as conn:
+            conn.execute('UPDATE feedback_rating_stats SET count = 7 WHERE rating = 3')
+            conn.execute('DELETE FROM feedback_student_stats')
+            conn.commit()
+
+        mismatches = self.db.verify_stats()
+        self.assertIn(('feedback_rating_stats', 3, 1, 7), mismatches)
+        self.assertIn(('feedback_student_stats', 'student1', (1, 3), None), mismatches)
+
+        self.db.rebuild_stats()
+        self.assertEqual(self.db.verify_stats(), [])
+        self.assertEqual(self.db.get_feedback_stats()['total'], 1)
+
+    def test_search_ranks_and_paginates(self):
+        """Test that search returns ranked matches with snippets across pages"""
+        self.db.submit_feedback('student1', 'The lectures were fine', 4)
+        self.db.submit_feedback('student1', 'Calculus, calculus and more calculus homework', 5)
+        self.db.submit_feedback('student2', 'Calculus came up once in a long comment about the lectures', 3)
+        self.db.submit_feedback('student2', 'Nothing to report', 2)
+
+        page = self.db.search_feedback('calculus', page_size=1)
+        self.assertEqual(page.rows[0][2], 'Calculus, calculus and more calculus homework')
+        self.assertIn(f'{SNIPPET_START}Calculus{SNIPPET_END}', page.rows[0][5])
+        page = self.db.search_feedback('calculus', page_size=1, cursor=page.next_cursor)
+        self.assertEqual(page.rows[0][2], 'Calculus came up once in a long comment about the lectures')
+        self.assertIsNone(page.next_cursor)
+
+        # Every term must match, prefixes and stems included, and filters still apply
+        self.assertEqual(len(self.db.search_feedback('calculus lecture').rows), 1)
+        self.assertEqual(len(self.db.search_feedback('calc*').rows), 2)
+        self.assertEqual(len(self.db.search_feedback('calculus', student='student2').rows), 1)
+
+    def test_search_follows_updates_and_deletes(self):
+        """Test that triggers keep the search index in step with the feedback table"""
+        self.db.submit_feedback('student1', 'Original wording', 3)
+        with self.db.connection() as conn:
+            conn.execute("UPDATE feedback SET feedback_text = 'Revised wording'")
+            conn.commit()
+        self.assertEqual(self.db.search_feedback('original').rows, [])
+        self.assertEqual(len(self.db.search_feedback('revised').rows), 1)
+
+        with self.db.connection() as conn:
+            conn.execute('DELETE FROM feedback')
+            conn.commit()
+        self.assertEqual(self.db.search_feedback('revised').rows, [])
+        self.assertTrue(self.db.verify_search_index())
+
+    def test_search_backfills_existing_rows(self):
+        """Test that a database created before the index gets its rows indexed"""
+        self.db.submit_feedback('student1', 'Written before search existed', 4)
+        with self.db.connection() as conn:
+            conn.execute('DROP TABLE feedback_fts')
+            for trigger in ('insert', 'delete', 'update'):
+                conn.execute(f'DROP TRIGGER feedback_fts_{trigger}')
+            # Roll the schema back to before the search migration
+            conn.execute('DELETE FROM schema_migrations WHERE version >= 5')
+            conn.commit()
+
+        self.db.migrate()
+        self.assertEqual(len(self.db.search_feedback('existed').rows), 1)
+        self.assertTrue(self.db.verify_search_index())
+
+    def test_skipped_search_index_is_created_later(self):
+        """Test that an index migration 5 skipped (no FTS5 back then) is created on a later start"""
+        self.db.submit_feedback('student1', 'Written while FTS5 was missing', 4)
+        with self.db.connection() as conn:
+            conn.execute('DROP TABLE feedback_fts')
+            for trigger in ('insert', 'delete', 'update'):
+                conn.execute(f'DROP TRIGGER feedback_fts_{trigger}')
+            conn.commit()
+
+        self.db.migrate()
+        self.assertTrue(self.db.search_available)
+        self.assertEqual(len(self.db.search_feedback('missing').rows), 1)
+        self.assertTrue(self.db.verify_search_index())
+
+    def test_search_treats_input_as_text(self):
+        """Test that FTS5 syntax in the query is searched for, not executed"""
+        self.db.submit_feedback('student1', 'Quotes " and NEAR(operators) OR stars', 3)
+        self.assertEqual(len(self.db.search_feedback('NEAR(operators) OR').rows), 1)
+        self.assertEqual(self.db.search_feedback('"unbalanced').rows, [])
+        for query in ('', '   ', '***'):
+            with self.assertRaises(ValueError):
+                self.db.search_feedback(query)
+
+    def test_duplicate_submissions_are_dropped(self):
+        """Test that repeats within the window are rejected by one index probe and others are kept"""
+        self.db.submit_feedback('student1', 'Great   lectures', 5)
+        with self.assertRaises(DuplicateFeedbackError):
+            self.db.submit_feedback('student1', ' great lectures ', 5)
+        # Another rating or another student is new feedback
+        self.db.submit_feedback('student1', 'Great lectures', 4)
+        self.db.submit_feedback('student2', 'Great lectures', 5)
+
+        rows = [('student3', 'Imported twice', 3, '2023-09-01 10:00:00')] * 2
+        rows.append(('student3', 'Imported twice', 3, '2023-10-01 10:00:00'))
+        self.assertEqual(self.db.bulk_insert_feedback(rows), 2)
+        self.assertEqual(self.db.get_feedback_stats()['total'], 5)
+        self.assertEqual(self.db.verify_stats(), [])
+
+        with self.db.connection() as conn:
+            plan = ' '.join(row[3] for row in conn.execute(
+                'EXPLAIN QUERY PLAN ' + INSERT_UNLESS_DUPLICATE,
+                self.db._duplicate_params('student1', 'Great lectures', 5)))
+        self.assertIn('idx_feedback_duplicates', plan)
+
+    def test_dedup_compacts_rows_from_before_the_guard(self):
+        """Test that upgrading leaves stored repeats to dedup, which keeps the oldest copy"""
+        guard = next(m for m in migrations.MIGRATIONS if m.name == 'feedback duplicate guard')
+        path = os.path.join(self.tmp_dir, 'legacy.db')
+        legacy = Database(path, password_engine=PasswordEngine(iterations=1000),
+                          schema_migrations=[m for m in migrations.MIGRATIONS if m.version < guard.version])
+        with legacy.connection() as conn:
+            conn.executemany('''
+                INSERT INTO feedback (student_username, feedback_text, rating, submission_date) VALUES (?, ?, ?, ?)
+            ''', [('student1', 'Double click', 4, '2024-03-01 09:00:00'),
+                  ('student1', 'Double click', 4, '2024-03-01 09:00:01'),
+                  ('student1', 'Double click', 4, '2024-03-08 09:00:00'),
+                  ('student2', 'Double click', 4, '2024-03-01 09:00:01')])
+            conn.commit()
+        legacy.close()
+
+        db = Database(path, password_engine=PasswordEngine(iterations=1000))
+        try:
+            self.assertIn(guard, db.applied_migrations)
+            self.assertEqual(db.get_feedback_stats()['total'], 4)
+            self.assertEqual(db.deduplicate_feedback(batch_size=2), (4, 1))
+            self.assertEqual(db.get_feedback_stats()['total'], 3)
+            self.assertEqual(db.verify_stats(), [])
+            self.assertTrue(db.verify_search_index())
+            self.assertEqual([row[4] for row in db.get_student_feedback('student1').rows],
+                             ['2024-03-08 09:00:00', '2024-03-01 09:00:00'])
+            # A wider window also folds the repeat a week later into the first copy
+            self.assertEqual(db.deduplicate_feedback(window=14 * 86400), (0, 1))
+        finally:
+            db.close()
+
+    def test_feedback_version_tracks_writes(self):
+        """Test that the version counter moves on every kind of feedback write"""
+        self.db.version_ttl = 60
+        version, _ = self.db.get_feedback_version()
+
+        self.db.submit_feedback('student1', 'Bumps the version', 3)
+        after_submit, _ = self.db.get_feedback_version()
+        self.assertGreater(after_submit, version)
+
+        self.db.bulk_insert_feedback([('student1', 'Bulk row', 4, None)])
+        after_bulk, _ = self.db.get_feedback_version()
+        self.assertGreater(after_bulk, after_submit)
+
+        # Writes that bypass Database are seen once the cached value is re-read
+        with self.db.connection() as conn:
+            conn.execute('DELETE FROM feedback')
+            conn.commit()
+        self.assertEqual(self.db.get_feedback_version()[0], after_bulk)
+        self.db.invalidate_feedback_version()
+        self.assertGreater(self.db.get_feedback_version()[0], after_bulk)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_database_survives_fork(self):
+        """Test that a forked child can use the database after prepare_fork/after_fork"""
+        self.db.submit_feedback('student1', 'From the parent', 4)
+        self.db.prepare_fork()
+        self.assertEqual(self.db.pool.stats()['open_connections'], 0)
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self.db.after_fork()
+                self.db.submit_feedback('student1', 'From the child', 4)
+                code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.db.get_feedback_stats()['total'], 2)
+
+    def test_current_schema_skips_migrations(self):
+        """Test that reopening an up-to-date database runs no DDL"""
+        self.assertEqual(self.db.schema_version, migrations.MIGRATIONS[-1].version)
+        self.assertEqual(len(self.db.applied_migrations), len(migrations.MIGRATIONS))
+
+        db = Database(self.db.db_name, password_engine=PasswordEngine(iterations=1000))
+        try:
+            self.assertEqual(db.applied_migrations, [])
+            self.assertEqual(db.schema_version, self.db.schema_version)
+            self.assertTrue(db.search_available)
+        finally:
+            db.close()
+
+    def test_forward_migration_is_atomic(self):
+        """Test that pending migrations apply together or not at all"""
+        def add_index(db, cursor):
+            cursor.execute('CREATE INDEX idx_feedback_text ON feedback (feedback_text)')
+
+        def broken(db, cursor):
+            cursor.execute('CREATE TABLE half_done (id INTEGER)')
+            raise RuntimeError('migration failed')
+
+        version = migrations.MIGRATIONS[-1].version
+        failing = migrations.MIGRATIONS + [migrations.Migration(version + 1, 'text index', add_index),
+                                           migrations.Migration(version + 2, 'broken', broken)]
+        with self.assertRaises(RuntimeError):
+            Database(self.db.db_name, password_engine=PasswordEngine(iterations=1000), schema_migrations=failing)
+
+        with self.db.connection() as conn:
+            names = {row[0] for row in conn.execute('SELECT name FROM sqlite_master')}
+            self.assertEqual(migrations.current_version(conn), version)
+        self.assertNotIn('idx_feedback_text', names)
+        self.assertNotIn('half_done', names)
+
+        working = failing[:-1]
+        db = Database(self.db.db_name, password_engine=PasswordEngine(iterations=1000), schema_migrations=working)
+        try:
+            self.assertEqual([migration.name for migration in db.applied_migrations], ['text index'])
+            self.assertEqual(db.schema_version, version + 1)
+        finally:
+            db.close()
+
+    def test_unversioned_database_is_adopted(self):
+        """Test that a database created before versioning is brought up to date without losing data"""
+        self.db.submit_feedback('student1', 'Before versioning', 5)
+        with self.db.connection() as conn:
+            conn.execute('DROP TABLE schema_migrations')
+            conn.commit()
+
+        self.assertEqual(len(self.db.migrate()), len(migrations.MIGRATIONS))
+        self.assertEqual(self.db.get_feedback_stats()['total'], 1)
+        self.assertEqual(self.db.verify_stats(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from events import FeedbackBroker, TooManySubscribersError, feedback_stream, sse_message
+from passwords import PasswordEngine
+
+
+def feedback_ids(messages):
+    """Ids of the feedback events among SSE messages"""
+    return [json.loads(message.split('data: ', 1)[1])['id'] for message in messages
+            if message.startswith('event: feedback')]
+
+
+class EventStreamTestCase(unittest.TestCase):
+    """Test cases for the live feedback broker and its SSE stream"""
+
+    def setUp(self):
+        """Create a database whose committed feedback is published to a broker"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'), password_engine=PasswordEngine(iterations=1000))
+        self.broker = FeedbackBroker(buffer_size=4)
+        self.db.feedback_observer = self.broker.publish
+
+    def tearDown(self):
+        """Close streams and pooled connections and remove the database"""
+        self.broker.close()
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_sse_message_format(self):
+        """Test that messages carry their fields and split multi-line data"""
+        self.assertEqual(sse_message('a\nb', event='feedback', event_id=7),
+                         'event: feedback\nid: 7\ndata: a\ndata: b\n\n')
+        self.assertEqual(sse_message(comment='heartbeat'), ': heartbeat\n\n')
+        self.assertEqual(sse_message(retry=3.0), 'retry: 3000\n\n')
+
+    def test_commits_are_published(self):
+        """Test that submissions and bulk inserts reach subscribers once committed, duplicates don't"""
+        with self.broker.subscribe() as subscription:
+            self.db.submit_feedback('student1', 'Published feedback', 4)
+            self.db.bulk_insert_feedback([('student2', 'Bulk one', 3, None), ('student2', 'Bulk two', 5, None),
+                                          ('student1', 'Published feedback', 4, None)])
+            rows, overflowed = subscription.get(timeout=0)
+        self.assertFalse(overflowed)
+        self.assertEqual([row[2] for row in rows], ['Published feedback', 'Bulk one', 'Bulk two'])
+        self.assertEqual([row[0] for row in rows], [1, 2, 3])
+        self.assertEqual(self.db.get_last_feedback_id(), 3)
+        self.assertEqual(len(self.broker), 0)
+
+    def test_slow_subscriber_overflows(self):
+        """Test that a full buffer is dropped and flagged instead of blocking the writer"""
+        with self.broker.subscribe() as subscription:
+            self.db.bulk_insert_feedback([('student1', f'Overflow {i}', 3, None) for i in range(6)])
+            self.assertEqual(subscription.get(timeout=0), ([], True))
+        self.assertEqual(self.broker.stats()['dropped_rows'], 6)
+
+    def test_subscribers_are_capped(self):
+        """Test that the broker refuses subscriptions beyond max_subscribers until one closes"""
+        broker = FeedbackBroker(max_subscribers=2)
+        first, second = broker.subscribe(), broker.subscribe()
+        with self.assertRaises(TooManySubscribersError):
+            broker.subscribe()
+        first.close()
+        broker.subscribe().close()
+        second.close()
+        self.assertEqual((broker.stats()['subscribers'], broker.stats()['rejected_subscriptions']), (0, 1))
+
+    def test_observer_errors_do_not_fail_writes(self):
+        """Test that a failing observer is logged and the submission still succeeds"""
+        def broken(rows):
+            raise RuntimeError('subscriber failed')
+
+        self.db.feedback_observer = broken
+        with self.assertLogs('database', level='ERROR'):
+            self.assertTrue(self.db.submit_feedback('student1', 'Still saved', 5))
+        self.assertEqual([row[2] for row in self.db.get_feedback_since(0)], ['Still saved'])
+
+    def test_stream_resumes_after_last_event_id(self):
+        """Test that a stream backfills rows after last_id, then follows commits without repeats"""
+        self.db.bulk_insert_feedback([('student1', f'Earlier {i}', 2, None) for i in range(3)])
+        stream = feedback_stream(self.db, self.broker.subscribe(), last_id=1, heartbeat=5.0, max_age=5.0)
+        self.assertIn('retry: 3000', next(stream))
+        self.assertEqual(feedback_ids([next(stream), next(stream)]), [2, 3])
+
+        writer = threading.Thread(target=self.db.submit_feedback, args=('student2', 'Live row', 5))
+        writer.start()
+        message = next(stream)
+        writer.join()
+        self.assertEqual(feedback_ids([message]), [4])
+        self.assertIn('Live row', message)
+
+        self.broker.close()
+        self.assertEqual(list(stream), [])
+
+    def test_stream_resets_far_behind_subscriber(self):
+        """Test that a subscriber beyond the backlog is told to reload and continues from the newest row"""
+        self.db.bulk_insert_feedback([('student1', f'Backlog {i}', 2, None) for i in range(5)])
+        stream = feedback_stream(self.db, self.broker.subscribe(), last_id=0, heartbeat=0.01, max_age=5.0, backlog=3)
+        next(stream)
+        self.assertEqual(next(stream), 'event: reset\nid: 5\ndata: 5\n\n')
+
+        # Rows committed elsewhere (here: with no observer) arrive with the next heartbeat
+        self.db.feedback_observer = None
+        self.db.submit_feedback('student2', 'From another process', 4)
+        self.assertEqual(next(stream), ': heartbeat\n\n')
+        self.assertEqual(feedback_ids([next(stream)]), [6])
+        stream.close()
+        self.assertEqual(len(self.broker), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
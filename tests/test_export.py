@@ -0,0 +1,68 @@
+import unittest
+import sys
+import os
+import csv
+import io
+import json
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine
+from exporter import ExportProgress, export_feedback
+
+
+class ExportTestCase(unittest.TestCase):
+    """Test cases for streaming feedback exports"""
+
+    def setUp(self):
+        """Create a database with a few feedback rows"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+        for i in range(5):
+            self.db.submit_feedback('student1', f'Export feedback, "quoted" {i}', i % 5 + 1)
+
+    def tearDown(self):
+        """Close pooled connections and remove the database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_csv_export_streams_in_batches(self):
+        """Test that CSV is produced one chunk per batch and round-trips"""
+        progress = ExportProgress()
+        chunks = list(export_feedback(self.db, 'csv', batch_size=2, progress=progress))
+
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], ['id', 'student_username', 'feedback_text', 'rating', 'submission_date'])
+        self.assertEqual(rows[1][2], 'Export feedback, "quoted" 0')
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(progress.rows, 5)
+        self.assertIsNotNone(progress.finished)
+
+    def test_ndjson_export_with_filters(self):
+        """Test that NDJSON export applies the dashboard filters"""
+        output = ''.join(export_feedback(self.db, 'ndjson', rating=3))
+        records = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['rating'], 3)
+
+    def test_empty_export_has_header(self):
+        """Test that an empty CSV export still has its header row"""
+        output = ''.join(export_feedback(self.db, 'csv', student='nobody'))
+        self.assertEqual(output.strip(), 'id,student_username,feedback_text,rating,submission_date')
+
+    def test_invalid_export_arguments(self):
+        """Test that bad formats and filters fail before streaming"""
+        with self.assertRaises(ValueError):
+            export_feedback(self.db, 'xml')
+        with self.assertRaises(ValueError):
+            export_feedback(self.db, 'csv', date_from='yesterday')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,20 @@
 import unittest
 import sys
 import os
+import uuid
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+# Keep password hashing cheap for the functional tests
+os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+
 from app import app
 
+# The app's database outlives a test run, and identical feedback within the
+# duplicate window is dropped, so submissions that must land are made unique
+RUN_ID = uuid.uuid4().hex[:8]
+
 class FeedbackTestCase(unittest.TestCase):
     """Test cases for feedback functionality using Flask test client"""
     
@@ -41,7 +49,7 @@ class FeedbackTestCase(unittest.TestCase):
     def test_valid_feedback_submission(self):
         """Test successful feedback submission"""
         response = self.client.post('/feedback', data={
-            'feedback_text': 'This is a test feedback. The course was excellent and very informative.',
+            'feedback_text': f'This is a test feedback. The course was excellent and very informative. ({RUN_ID})',
             'rating': '5'
         }, follow_redirects=True)
         self.assertEqual(response.status_code, 200)
@@ -71,19 +79,30 @@ class FeedbackTestCase(unittest.TestCase):
         """Test submitting multiple feedback entries"""
         # First submission
         response1 = self.client.post('/feedback', data={
-            'feedback_text': 'First feedback submission - very good course content',
+            'feedback_text': f'First feedback submission - very good course content ({RUN_ID})',
             'rating': '4'
         }, follow_redirects=True)
         self.assertEqual(response1.status_code, 200)
         
         # Second submission
         response2 = self.client.post('/feedback', data={
-            'feedback_text': 'Second feedback - excellent instructor teaching methods',
+            'feedback_text': f'Second feedback - excellent instructor teaching methods ({RUN_ID})',
             'rating': '5'
         }, follow_redirects=True)
         self.assertEqual(response2.status_code, 200)
         self.assertIn(b'Feedback submitted successfully', response2.data)
     
+    def test_double_submission_is_saved_once(self):
+        """Test that a repeated POST is dropped and the student sees their feedback once"""
+        text = f'Double-clicked feedback about the labs ({RUN_ID})'
+        self.client.post('/feedback', data={'feedback_text': text, 'rating': '4'})
+        response = self.client.post('/feedback', data={'feedback_text': text, 'rating': '4'},
+                                    follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'This feedback was already submitted', response.data)
+        self.assertIn(b'Your Feedback', response.data)
+        self.assertEqual(response.data.count(text.encode()), 1)
+    
     def test_feedback_requires_login(self):
         """Test that feedback page requires login"""
         # Logout first
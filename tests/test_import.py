@@ -0,0 +1,89 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine
+from importer import import_feedback, import_users
+
+
+class ImportTestCase(unittest.TestCase):
+    """Test cases for bulk feedback and roster imports"""
+
+    def setUp(self):
+        """Create an empty database and a scratch directory"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+
+    def tearDown(self):
+        """Close pooled connections and remove the scratch directory"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_csv_feedback_import_reports_bad_rows(self):
+        """Test that valid rows are inserted and invalid ones reported by line"""
+        path = self.write_file('feedback.csv', (
+            'student_username,feedback_text,rating,submission_date\n'
+            'student1,Great course,5,2023-09-01 10:00:00\n'
+            'student1,   ,4,\n'
+            'student2,Too fast,9,\n'
+            'student2,Good labs,4,2023-09-02\n'
+        ))
+        report = import_feedback(self.db, path, batch_size=1)
+
+        self.assertEqual(report.imported, 2)
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+        self.assertIn('empty', report.errors[0][1])
+        rows = self.db.get_feedback_page(order='asc').rows
+        self.assertEqual([row[4] for row in rows], ['2023-09-01 10:00:00', '2023-09-02 00:00:00'])
+        self.assertEqual(self.db.get_feedback_stats()['total'], 2)
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test that a rerun skips committed batches and a finished import is a no-op"""
+        lines = [json.dumps({'student_username': 'student1', 'feedback_text': f'Archived {i}', 'rating': 3})
+                 for i in range(5)]
+        path = self.write_file('feedback.ndjson', '\n'.join(lines) + '\n')
+        # Pretend an earlier run committed the first three lines
+        self.db.bulk_insert_feedback([('student1', f'Archived {i}', 3, None) for i in range(3)],
+                                     checkpoint=('feedback', os.path.abspath(path), 3))
+
+        report = import_feedback(self.db, path, batch_size=2)
+        self.assertEqual((report.resumed_from, report.skipped, report.imported), (3, 3, 2))
+        self.assertEqual(self.db.get_feedback_stats()['total'], 5)
+
+        self.assertEqual(import_feedback(self.db, path).imported, 0)
+        # Restarting reads the file again, but the duplicate guard keeps the rows from doubling
+        self.assertEqual(import_feedback(self.db, path, restart=True).imported, 0)
+        self.assertEqual(self.db.get_feedback_stats()['total'], 5)
+
+    def test_user_roster_import(self):
+        """Test that roster users can log in and duplicates are skipped"""
+        path = self.write_file('roster.csv', (
+            'username,password,role\n'
+            'student2,secret2,student\n'
+            'student1,changed,student\n'
+            'ta1,secret3,teacher\n'
+        ))
+        report = import_users(self.db, path)
+
+        self.assertEqual(report.imported, 1)
+        self.assertEqual(len(report.errors), 1)
+        self.assertEqual(self.db.authenticate_user('student2', 'secret2'), ('student2', 'student'))
+        self.assertEqual(self.db.authenticate_user('student1', 'password123'), ('student1', 'student'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,9 @@ import threading
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
+# Keep password hashing cheap for the functional tests
+os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+
 from app import app
 
 class LoginTestCase(unittest.TestCase):
@@ -0,0 +1,107 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Keep password hashing cheap for the functional tests
+os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+
+from flask import Flask, render_template_string
+from app import app
+from database import Database
+from metrics import Instrumentation, MetricsRegistry
+from passwords import PasswordEngine
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Test cases for request/query instrumentation and the /metrics endpoint"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up test environment"""
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.client = cls.app.test_client()
+
+    def test_registry_renders_prometheus_text(self):
+        """Test counter and histogram exposition format"""
+        registry = MetricsRegistry()
+        counter = registry.counter('demo_total', 'Demo counter', ('kind',))
+        histogram = registry.histogram('demo_seconds', 'Demo histogram', buckets=(0.1, 1.0))
+        counter.inc(kind='a "quoted" value')
+        histogram.observe(0.5)
+        histogram.observe(2.0)
+
+        text = registry.render()
+        self.assertIn('# TYPE demo_total counter', text)
+        self.assertIn('demo_total{kind="a \\"quoted\\" value"} 1', text)
+        self.assertIn('demo_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('demo_seconds_bucket{le="1.0"} 1', text)
+        self.assertIn('demo_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('demo_seconds_count 2', text)
+
+    def test_metrics_endpoint_reports_routes_and_queries(self):
+        """Test that requests and Database calls show up at /metrics"""
+        self.client.post('/login', data={'username': 'student1', 'password': 'password123'})
+        self.client.get('/logout')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('feedback_http_request_duration_seconds_count{endpoint="/login",method="POST",status="302"}', text)
+        self.assertIn('feedback_db_query_duration_seconds_count{method="authenticate_user"}', text)
+        self.assertIn('feedback_db_connections_opened_total', text)
+
+    def test_streamed_batches_are_timed_when_consumed(self):
+        """Test that iter_feedback_batches reports its fetch time once the stream finishes"""
+        tmp_dir = tempfile.mkdtemp()
+        db = Database(os.path.join(tmp_dir, 'test.db'), password_engine=PasswordEngine(iterations=1000))
+        try:
+            db.bulk_insert_feedback([('student1', f'Streamed {i}', 3, None) for i in range(25)])
+            calls = []
+            db.query_observer = lambda name, elapsed, error: calls.append((name, elapsed, error))
+
+            batches = db.iter_feedback_batches(batch_size=10)
+            self.assertEqual(calls, [])
+            self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+            self.assertEqual([(name, error) for name, _, error in calls], [('iter_feedback_batches', None)])
+            self.assertGreater(calls[0][1], 0)
+        finally:
+            db.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def test_slow_request_log_breakdown(self):
+        """Test that slow requests are logged with SQL and template timings"""
+        tmp_dir = tempfile.mkdtemp()
+        db = Database(os.path.join(tmp_dir, 'test.db'), password_engine=PasswordEngine(iterations=1000))
+        try:
+            demo = Flask(__name__)
+            instrumentation = Instrumentation(slow_request_ms=0)
+            instrumentation.init_app(demo)
+            instrumentation.instrument_database(db)
+
+            @demo.route('/stats')
+            def stats():
+                return render_template_string('{{ stats.total }}', stats=db.get_feedback_stats())
+
+            with self.assertLogs('metrics', level='WARNING') as logs:
+                demo.test_client().get('/stats')
+
+            message = '\n'.join(logs.output)
+            self.assertIn('Slow request GET /stats', message)
+            self.assertIn('get_feedback_stats=', message)
+            self.assertIn('SELECT rating, count FROM feedback_rating_stats', message)
+            self.assertIn('rendering templates', message)
+            self.assertEqual(instrumentation.slow_requests.value(endpoint='/stats'), 1)
+        finally:
+            db.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+import hashlib
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine, identify, verify_password
+
+
+class PasswordTestCase(unittest.TestCase):
+    """Test cases for password hashing and login upgrades"""
+
+    def setUp(self):
+        """Create a fresh database with cheap password hashing"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+
+    def tearDown(self):
+        """Close pooled connections and remove the database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_hash_and_verify_each_scheme(self):
+        """Test that every scheme salts its hashes and verifies them"""
+        for engine in (PasswordEngine(iterations=1000), PasswordEngine('scrypt', n=2 ** 10)):
+            first = engine.hash('secret')
+            self.assertEqual(identify(first), engine.scheme)
+            self.assertNotEqual(first, engine.hash('secret'))
+            self.assertTrue(engine.verify('secret', first))
+            self.assertFalse(engine.verify('wrong', first))
+            self.assertFalse(engine.needs_rehash(first))
+            engine.close()
+
+    def test_needs_rehash(self):
+        """Test that legacy, cheaper and other-scheme hashes are flagged"""
+        engine = PasswordEngine(iterations=2000)
+        legacy = hashlib.sha256(b'secret').hexdigest()
+        self.assertTrue(verify_password('secret', legacy))
+        self.assertTrue(engine.needs_rehash(legacy))
+        self.assertTrue(engine.needs_rehash(PasswordEngine(iterations=1000).hash('secret')))
+        self.assertTrue(engine.needs_rehash(PasswordEngine('scrypt', n=2 ** 10).hash('secret')))
+        self.assertFalse(verify_password('secret', 'not-a-hash'))
+
+    def test_legacy_hash_upgraded_on_login(self):
+        """Test that a legacy SHA-256 row is rehashed after a successful login"""
+        with self.db.connection() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE username = 'student1'",
+                         (hashlib.sha256(b'password123').hexdigest(),))
+            conn.commit()
+
+        self.assertIsNone(self.db.authenticate_user('student1', 'wrong'))
+        self.assertEqual(self.db.authenticate_user('student1', 'password123'), ('student1', 'student'))
+        self.assertEqual(identify(self.db.get_user('student1')[1]), 'pbkdf2_sha256')
+        self.assertEqual(self.db.authenticate_user('student1', 'password123'), ('student1', 'student'))
+
+    def test_login_sees_changes_at_once(self):
+        """Test that a password or role changed by another connection applies to the next login"""
+        self.assertEqual(self.db.authenticate_user('student1', 'password123'), ('student1', 'student'))
+        with self.db.connection() as conn:
+            conn.execute("UPDATE users SET password = ?, role = 'admin' WHERE username = 'student1'",
+                         (self.db.hash_password('new-password'),))
+            conn.commit()
+
+        self.assertIsNone(self.db.authenticate_user('student1', 'password123'))
+        self.assertEqual(self.db.authenticate_user('student1', 'new-password'), ('student1', 'admin'))
+
+    def test_sync_verify_runs_inline(self):
+        """Test that verify() hashes on the calling thread and never starts the worker pool"""
+        engine = PasswordEngine(iterations=1000)
+        encoded = engine.hash('secret')
+        self.assertTrue(engine.verify('secret', encoded))
+        self.assertFalse(engine.verify('wrong', encoded))
+        self.assertFalse(engine.verify('secret', None))
+        self.assertIsNone(engine._executor)
+        self.assertTrue(engine.verify_async('secret', encoded).result())
+        engine.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import threading
+import time
+from collections import Counter
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, request
+
+from profiler import RequestProfiler, format_collapsed
+
+
+def busy_wait(seconds):
+    """Keep the thread in Python code so samples land in this function"""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilerTestCase(unittest.TestCase):
+    """Test cases for the request stack sampler"""
+
+    def setUp(self):
+        self.profiler = RequestProfiler(interval=0.001, max_profiles=3)
+
+    def test_samples_profiled_thread(self):
+        """Test that samples are collapsed root-first stacks of the profiled thread only"""
+        profile = self.profiler.start('/work', 'GET', '/work')
+        other = threading.Thread(target=busy_wait, args=(0.05,))
+        other.start()
+        busy_wait(0.05)
+        other.join()
+        self.profiler.finish(profile, 200)
+
+        self.assertGreater(profile.samples, 0)
+        self.assertEqual(sum(profile.stacks.values()), profile.samples)
+        stack = profile.stacks.most_common(1)[0][0]
+        frames = stack.split(';')
+        self.assertRegex(frames[-1], r'^busy_wait \(test_profiler\.py:\d+\)$')
+        self.assertIn('test_samples_profiled_thread (test_profiler.py:', stack)
+        # The other thread's frames never show up
+        self.assertTrue(all('Thread.run' not in frame and 'run (threading.py' not in frame
+                            for stack in profile.stacks for frame in stack.split(';')))
+        self.assertEqual(self.profiler.stats()['active'], 0)
+
+        line, count = profile.collapsed().splitlines()[0].rsplit(' ', 1)
+        self.assertEqual(line, stack)
+        self.assertEqual(int(count), profile.stacks[stack])
+
+    def test_ring_and_route_totals(self):
+        """Test that only the newest profiles are kept while route totals keep counting"""
+        for i in range(5):
+            profile = self.profiler.start('/admin' if i % 2 else '/login', 'GET', f'/page{i}')
+            profile.stacks['root;leaf'] += 2
+            profile.samples += 2
+            self.profiler.finish(profile, 200)
+
+        self.assertEqual([profile.path for profile in self.profiler.recent_profiles()],
+                         ['/page4', '/page3', '/page2'])
+        self.assertIsNone(self.profiler.get(1))
+        self.assertEqual(self.profiler.get(5).path, '/page4')
+        routes = {route.endpoint: route for route in self.profiler.route_profiles()}
+        self.assertEqual((routes['/login'].profiles, routes['/login'].samples), (3, 6))
+        self.assertEqual(self.profiler.collapsed('/admin'), 'root;leaf 4\n')
+        self.assertEqual(self.profiler.collapsed(), '/admin;root;leaf 4\n/login;root;leaf 6\n')
+        self.assertIsNone(self.profiler.collapsed('/missing'))
+
+        self.profiler.reset()
+        self.assertEqual(self.profiler.recent_profiles(), [])
+        self.assertEqual(self.profiler.collapsed(), '')
+
+    def test_collapsed_format_escapes_frames(self):
+        """Test that frame separators in a root label can't split the stack"""
+        self.assertEqual(format_collapsed(Counter({'a;b': 1}), root='x;y'), 'x:y;a;b 1\n')
+
+    def test_sampling_decision(self):
+        """Test that marked requests are always profiled and the rate bounds the rest"""
+        self.assertFalse(any(self.profiler.should_profile() for _ in range(100)))
+        self.assertTrue(self.profiler.should_profile(marked=True))
+        self.assertTrue(all(RequestProfiler(sample_rate=1.0).should_profile() for _ in range(100)))
+        with self.assertRaises(ValueError):
+            RequestProfiler(sample_rate=1.5)
+
+    def test_flask_requests(self):
+        """Test that marked Flask requests are profiled under their route with their status"""
+        app = Flask(__name__)
+
+        @app.route('/slow/<int:n>')
+        def slow(n):
+            busy_wait(0.03)
+            return 'done'
+
+        self.profiler.init_app(app, marked=lambda: request.args.get('profile') == '1')
+        client = app.test_client()
+        client.get('/slow/1')
+        self.assertEqual(self.profiler.recent_profiles(), [])
+
+        self.assertEqual(client.get('/slow/2?profile=1').status_code, 200)
+        profile, = self.profiler.recent_profiles()
+        self.assertEqual((profile.endpoint, profile.path, profile.status), ('/slow/<int:n>', '/slow/2', 200))
+        self.assertGreater(profile.samples, 0)
+        self.assertIn('busy_wait (test_profiler.py:', profile.collapsed())
+
+
+if __name__ == '__main__':
+    unittest.main()
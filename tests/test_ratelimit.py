@@ -0,0 +1,145 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Keep password hashing cheap for the functional tests
+os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+
+from app import app, instrumentation, login_throttle
+from database import Database
+from passwords import PasswordEngine
+from ratelimit import LoginThrottle, MemoryRateLimiter, RateLimit, RateLimiter, SQLiteRateLimiter
+
+
+class RateLimitTestCase(unittest.TestCase):
+    """Test cases for the sliding-window limiters and login throttling"""
+
+    def setUp(self):
+        """Create a fresh database for the shared limiter"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.db')
+        self.db = Database(self.db_path, password_engine=PasswordEngine(iterations=1000))
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Remove the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def assert_sliding_window(self, limiter):
+        rule = RateLimit(3, 10)
+        for t in (100.0, 101.0, 102.0):
+            self.assertEqual(limiter.hit('k', rule, now=t), 0.0)
+        retry_after = limiter.hit('k', rule, now=103.0)
+        self.assertGreater(retry_after, 7.0)
+
+        # A new fixed window still sees the previous one's hits at nearly full weight
+        self.assertGreater(limiter.hit('k', rule, now=110.5), 0.0)
+        # ...which fade as the sliding window moves on
+        self.assertEqual(limiter.hit('k', rule, now=117.0), 0.0)
+
+        limiter.release('k', rule, now=117.5)
+        self.assertEqual(limiter.hit('k', rule, now=117.5), 0.0)
+        # Two windows later nothing is left
+        for t in (140.0, 140.1, 140.2):
+            self.assertEqual(limiter.hit('k', rule, now=t), 0.0)
+
+    def test_memory_sliding_window(self):
+        """Test the sliding count, retry estimate and release in memory"""
+        self.assert_sliding_window(MemoryRateLimiter())
+
+    def test_unsatisfiable_hit_waits_one_window(self):
+        """Test that a zero limit or an oversized cost gets a finite Retry-After and a 429"""
+        limiter = MemoryRateLimiter()
+        self.assertEqual(limiter.hit('k', RateLimit(0, 10), now=100.0), 10.0)
+        self.assertEqual(limiter.hit('k', RateLimit(3, 10), cost=4, now=100.0), 10.0)
+        with self.assertRaises(TypeError):
+            RateLimiter()
+
+        original = login_throttle.per_ip
+        login_throttle.per_ip = RateLimit(0, 60)
+        try:
+            response = self.client.post('/login', data={'username': 'student1', 'password': 'password123'},
+                                        environ_base={'REMOTE_ADDR': '203.0.113.99'})
+        finally:
+            login_throttle.per_ip = original
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '60')
+
+    def test_memory_limiter_is_bounded(self):
+        """Test that keys are evicted beyond max_keys and dropped once expired"""
+        limiter = MemoryRateLimiter(max_keys=3)
+        rule = RateLimit(5, 10)
+        for i in range(10):
+            limiter.hit(f'k{i}', rule, now=100.0)
+        self.assertEqual(len(limiter), 3)
+        self.assertEqual(limiter.evictions, 7)
+
+        limiter.hit('late', RateLimit(5, 1000), now=200.0)
+        self.assertEqual(len(limiter), 1)
+
+    def test_sqlite_limiter_is_shared(self):
+        """Test the shared limiter, including two databases opened on the same file"""
+        self.assert_sliding_window(SQLiteRateLimiter(self.db))
+
+        other_db = Database(self.db_path, password_engine=PasswordEngine(iterations=1000))
+        try:
+            rule = RateLimit(2, 60)
+            first, second = SQLiteRateLimiter(self.db), SQLiteRateLimiter(other_db)
+            self.assertEqual(first.hit('shared', rule, now=600.0), 0.0)
+            self.assertEqual(second.hit('shared', rule, now=600.0), 0.0)
+            self.assertGreater(first.hit('shared', rule, now=600.0), 0.0)
+        finally:
+            other_db.close()
+
+    def test_throttle_releases_successful_logins(self):
+        """Test that only failed attempts use up the limits"""
+        throttle = LoginThrottle(MemoryRateLimiter(), per_ip=RateLimit(2, 60), per_username=RateLimit(5, 60))
+        for _ in range(5):
+            self.assertEqual(throttle.acquire('10.0.0.1', 'student1'), 0.0)
+            throttle.succeeded('10.0.0.1', 'student1')
+        throttle.acquire('10.0.0.1', 'student1')
+        throttle.acquire('10.0.0.1', 'student2')
+        self.assertGreater(throttle.acquire('10.0.0.1', 'student3'), 0.0)
+        self.assertEqual(throttle.stats(), {'ip': 1, 'username': 0})
+
+    def test_login_throttled_per_ip(self):
+        """Test that one address hammering the login form gets 429"""
+        ip = {'REMOTE_ADDR': '203.0.113.7'}
+        for i in range(login_throttle.per_ip.limit):
+            response = self.client.post('/login', data={'username': f'guess{i}', 'password': 'x'},
+                                        environ_base=ip)
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post('/login', data={'username': 'admin', 'password': 'admin123'},
+                                    environ_base=ip)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        self.assertIn(b'Too many login attempts', response.data)
+
+        # Other addresses are unaffected, and successful logins are not counted
+        for _ in range(login_throttle.per_ip.limit + 1):
+            response = self.client.post('/login', data={'username': 'student1', 'password': 'password123'},
+                                        environ_base={'REMOTE_ADDR': '203.0.113.8'})
+            self.assertEqual(response.status_code, 302)
+
+    def test_login_throttled_per_username(self):
+        """Test that failures spread over many addresses still lock the target username"""
+        throttled = instrumentation.registry.get('feedback_login_throttled_total')
+        before = throttled.value(scope='username')
+        for i in range(login_throttle.per_username.limit):
+            self.client.post('/login', data={'username': 'throttle-target', 'password': 'x'},
+                             environ_base={'REMOTE_ADDR': f'198.51.100.{i}'})
+        response = self.client.post('/login', data={'username': 'throttle-target', 'password': 'x'},
+                                    environ_base={'REMOTE_ADDR': '198.51.100.200'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(throttled.value(scope='username'), before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
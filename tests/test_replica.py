@@ -0,0 +1,149 @@
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """Test cases for the snapshot replica behind Database.reporting()"""
+
+    def setUp(self):
+        """Create a database with a replica that only refreshes when told to"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.db')
+        self.replica_path = os.path.join(self.tmp_dir, 'replica.db')
+        self.db = self.open_database(replica_refresh_interval=0)
+        self.db.bulk_insert_feedback([(f'student{i % 3}', f'Replica feedback {i}', 1 + i % 5, None)
+                                      for i in range(20)])
+        self.db.replica.refresh(force=True)
+
+    def tearDown(self):
+        """Close pooled connections and remove the database and its replica"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def open_database(self, **kwargs):
+        return Database(self.db_path, password_engine=PasswordEngine(iterations=1000),
+                        storage_profile='high-concurrency', replica_path=self.replica_path, **kwargs)
+
+    def reported_total(self):
+        with self.db.reporting():
+            return self.db.get_feedback_stats()['total'], self.db.get_feedback_version()[0]
+
+    def test_reads_see_snapshot_until_refresh(self):
+        """Test that reporting blocks read the snapshot, with its own version, until the next refresh"""
+        self.db.submit_feedback('student1', 'Written after the snapshot', 5)
+        primary_version = self.db.get_feedback_version()[0]
+        self.assertEqual(self.db.get_feedback_stats()['total'], 21)
+
+        total, version = self.reported_total()
+        self.assertEqual(total, 20)
+        self.assertLess(version, primary_version)
+
+        self.db.replica.refresh(force=True)
+        self.assertEqual(self.reported_total(), (21, primary_version))
+        with self.db.reporting():
+            page = self.db.get_feedback_page(page_size=5)
+            self.assertEqual(page.rows[0][2], 'Written after the snapshot')
+            with self.assertRaises(sqlite3.OperationalError):
+                self.db.submit_feedback('student1', 'Writes belong on the primary', 3)
+
+    def test_stale_replica_falls_back_to_primary(self):
+        """Test that a snapshot older than the staleness bound is not used"""
+        self.db.replica.max_staleness = 0.05
+        self.db.submit_feedback('student1', 'Only on the primary', 4)
+        time.sleep(0.1)
+
+        self.assertEqual(self.reported_total(), (21, self.db.get_feedback_version()[0]))
+        stats = self.db.replica.stats()
+        self.assertEqual(stats['fallbacks'], 1)
+        self.assertGreater(stats['lag'], 0.05)
+
+    def test_snapshot_is_pinned_for_the_block(self):
+        """Test that a refresh during a reporting block doesn't change what the block reads"""
+        def write_and_refresh():
+            self.db.submit_feedback('student2', 'Written during the report', 2)
+            self.db.replica.refresh(force=True)
+
+        with self.db.reporting():
+            first = self.db.get_feedback_stats()['total']
+            writer = threading.Thread(target=write_and_refresh)
+            writer.start()
+            writer.join()
+            # The old file was renamed over, but this block's connection still reads it
+            self.assertEqual(self.db.get_feedback_stats()['total'], first)
+            self.assertEqual(len(self.db.get_feedback_page(page_size=100).rows), first)
+        self.assertEqual(self.reported_total()[0], first + 1)
+
+    def test_second_database_adopts_shared_snapshot(self):
+        """Test that another process opening the same replica reuses a fresh file instead of copying"""
+        other = self.open_database(replica_refresh_interval=60.0)
+        try:
+            stats = other.replica.stats()
+            self.assertEqual((stats['refreshes'], stats['adoptions']), (0, 1))
+            with other.reporting():
+                self.assertEqual(other.get_feedback_stats()['total'], 20)
+        finally:
+            other.close()
+
+    def test_archive_refreshes_replica(self):
+        """Test that archiving a term refreshes the snapshot that still pointed at the live rows"""
+        self.db.bulk_insert_feedback([('student1', 'Old term feedback', 3, '2023-03-01 10:00:00')])
+        self.db.define_term('2023-spring', '2023-01-01', '2023-06-30')
+        self.db.archive_term('2023-spring')
+        self.db.bulk_insert_feedback([('student1', 'Late old term feedback', 4, '2023-04-01 10:00:00')])
+        self.db.archive_term('2023-spring')
+
+        with self.db.reporting():
+            page = self.db.get_feedback_page(page_size=100, date_from='2023-01-01', date_to='2023-06-30')
+        self.assertEqual(len(page.rows), 2)
+
+
+    def test_writes_carry_on_during_refresh(self):
+        """Test that a writer that won't wait for locks commits while the replica is copied"""
+        self.db.bulk_insert_feedback([(f'student{i % 3}', f'Bulk feedback {i} ' + 'x' * 200, 1 + i % 5, None)
+                                      for i in range(20000)])
+        errors = []
+        refreshing = threading.Event()
+
+        def refresh():
+            refreshing.set()
+            try:
+                self.db.replica.refresh(force=True)
+            except Exception as e:
+                errors.append(e)
+
+        refresher = threading.Thread(target=refresh)
+        refresher.start()
+        refreshing.wait(5)
+        writer = sqlite3.connect(self.db_path, timeout=0)
+        try:
+            for i in range(50):
+                writer.execute("INSERT INTO feedback (student_username, feedback_text, rating) VALUES (?, ?, 3)",
+                               ('student1', f'Written during the refresh {i}'))
+                writer.commit()
+        finally:
+            writer.close()
+            refresher.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.get_feedback_stats()['total'], 20070)
+
+    def test_replica_needs_wal(self):
+        """Test that a replica of a rollback-journal database is refused"""
+        with self.assertRaises(ValueError):
+            Database(os.path.join(self.tmp_dir, 'journal.db'), password_engine=PasswordEngine(iterations=1000),
+                     replica_path=os.path.join(self.tmp_dir, 'journal-replica.db'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from database import Database
+from passwords import PasswordEngine
+from retention import RetentionManager, storage_usage
+
+
+class RetentionTestCase(unittest.TestCase):
+    """Test cases for the retention policy, chunked archiving and incremental vacuum"""
+
+    def setUp(self):
+        """Create a database holding three terms of feedback with long texts"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'test.db')
+        self.db = self.open_database(incremental_vacuum=True)
+        rows = []
+        for i in range(90):
+            year, month = (2023, 1 + i % 12) if i < 60 else (2024, 1 + i % 6)
+            rows.append((f'student{i % 4}', f'Retention feedback {i} ' + 'about the lectures ' * 200, 1 + i % 5,
+                         f'{year}-{month:02d}-{1 + i % 28:02d} 10:{i % 60:02d}:00'))
+        self.db.bulk_insert_feedback(rows)
+
+    def tearDown(self):
+        """Close pooled connections and remove the database and archives"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def open_database(self, **kwargs):
+        db = Database(self.db_path, password_engine=PasswordEngine(iterations=1000), **kwargs)
+        if not db.get_terms():
+            db.define_term('2023-spring', '2023-01-01', '2023-06-30')
+            db.define_term('2023-fall', '2023-07-01', '2023-12-31')
+            db.define_term('2024-spring', '2024-01-01', '2024-06-30')
+        return db
+
+    def live_rows(self):
+        with self.db.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM main.feedback').fetchone()[0]
+
+    def test_due_terms(self):
+        """Test that the newest started terms and unfinished terms are never due"""
+        def due(keep_terms, today):
+            return [term.name for term in RetentionManager(self.db, keep_terms).due_terms(today)]
+
+        self.assertEqual(due(1, '2024-07-15'), ['2023-spring', '2023-fall'])
+        self.assertEqual(due(2, '2024-07-15'), ['2023-spring'])
+        self.assertEqual(due(3, '2024-07-15'), [])
+        # 2024-spring hasn't started, and 2023-fall isn't over yet
+        self.assertEqual(due(1, '2023-12-15'), ['2023-spring'])
+        self.assertEqual(due(1, '2023-06-30'), [])
+        with self.assertRaises(ValueError):
+            RetentionManager(self.db, 0)
+
+    def test_run_archives_in_chunks(self):
+        """Test that due terms move in batch-sized chunks and reads see the same feedback"""
+        stats = self.db.get_feedback_stats()
+        page = self.db.get_feedback_page(page_size=200)
+        retention = RetentionManager(self.db, 1, batch_size=4)
+        self.assertEqual(retention.chunks(self.db.get_terms()[0])[:2], [('2023-01-21', 4), ('2023-02-14', 4)])
+
+        report = retention.run(today='2024-07-15')
+        self.assertEqual(report.terms, ['2023-spring', '2023-fall'])
+        self.assertEqual(report.rows_archived, 60)
+        self.assertEqual(report.chunks, 16)
+        self.assertTrue(report.complete)
+        self.assertEqual(set(report.latency), {'newest_page', 'rating_page', 'live_scan'})
+        self.assertEqual(self.live_rows(), 30)
+        self.assertEqual([term.row_count for term in self.db.get_terms()], [30, 30, 0])
+        # Every chunk of a term went into the same file
+        self.assertEqual(len(os.listdir(self.db.terms.directory)), 2)
+        self.assertEqual(self.db.get_feedback_stats(), stats)
+        self.assertEqual(self.db.get_feedback_page(page_size=200), page)
+        self.assertEqual(self.db.verify_stats(), [])
+
+        again = retention.run(today='2024-07-15', measure=False)
+        self.assertEqual((again.terms, again.rows_archived, again.latency), ([], 0, {}))
+        self.assertEqual(retention.stats()['runs'], 2)
+        self.assertEqual(retention.stats()['rows_archived'], 60)
+
+    def test_reclaims_space_incrementally(self):
+        """Test that the pages the archived rows used are handed back to the filesystem"""
+        with self.db.pool.connection() as conn:
+            self.assertEqual(storage_usage(conn)['auto_vacuum'], 'incremental')
+        size = os.path.getsize(self.db_path)
+
+        report = RetentionManager(self.db, 1, vacuum_step=8).run(today='2024-07-15', measure=False)
+        self.assertGreater(report.bytes_reclaimed, 0)
+        self.assertEqual(report.bytes_reclaimed, report.bytes_before - report.bytes_after)
+        self.assertLess(os.path.getsize(self.db_path), size)
+        with self.db.pool.connection() as conn:
+            self.assertEqual(storage_usage(conn)['freelist_count'], 0)
+
+    def test_incremental_vacuum_is_opt_in(self):
+        """Test that a new database without retention keeps SQLite's default auto-vacuum mode"""
+        db = Database(os.path.join(self.tmp_dir, 'plain.db'), password_engine=PasswordEngine(iterations=1000))
+        try:
+            with db.pool.connection() as conn:
+                self.assertEqual(storage_usage(conn)['auto_vacuum'], 'none')
+        finally:
+            db.close()
+
+    def test_existing_database_needs_conversion(self):
+        """Test that free pages are left alone until incremental auto-vacuum is enabled"""
+        self.db.close()
+        os.remove(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE placeholder (id INTEGER)')
+        conn.close()
+        self.db = self.open_database()
+        self.db.bulk_insert_feedback([('student1', 'Old feedback ' * 500, 3, f'2023-02-{day:02d} 10:00:00')
+                                      for day in range(1, 29)])
+
+        retention = RetentionManager(self.db, 1)
+        self.assertEqual(retention.run(today='2024-07-15', measure=False).bytes_reclaimed, 0)
+        self.assertGreater(retention.storage()['freelist_count'], 0)
+
+        self.assertTrue(self.db.enable_incremental_vacuum())
+        self.assertFalse(self.db.enable_incremental_vacuum())
+        self.assertEqual(retention.storage()['auto_vacuum'], 'incremental')
+        self.assertEqual(retention.reclaim(), 0)
+
+    def test_stopped_run_resumes(self):
+        """Test that a run stopped between chunks leaves the rest for the next run"""
+        retention = RetentionManager(self.db, 1, batch_size=10)
+        chunks = []
+        report = retention.run(today='2024-07-15', should_stop=lambda: len(chunks.append(1) or chunks) > 2,
+                               measure=False)
+        self.assertFalse(report.complete)
+        self.assertEqual((report.terms, report.rows_archived), (['2023-spring'], 20))
+        self.assertEqual(self.live_rows(), 70)
+
+        report = retention.run(today='2024-07-15', measure=False)
+        self.assertTrue(report.complete)
+        self.assertEqual(report.rows_archived, 40)
+        self.assertEqual(self.live_rows(), 30)
+        self.assertEqual(self.db.verify_stats(), [])
+
+    @unittest.skipIf(fcntl is None, 'needs fcntl')
+    def test_one_run_at_a_time(self):
+        """Test that a run is skipped while another process holds the lock"""
+        retention = RetentionManager(self.db, 1, interval=3600)
+        self.assertTrue(retention.is_due())
+        with open(retention.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.assertIsNone(retention.run(today='2024-07-15'))
+        self.assertEqual(self.live_rows(), 90)
+
+        self.assertIsNotNone(retention.run(today='2024-07-15', measure=False))
+        self.assertFalse(retention.is_due())
+
+    def test_scheduler(self):
+        """Test that the database's scheduler runs the policy in the background"""
+        self.db.close()
+        self.db = self.open_database(retention_terms=1, retention_interval=0.02)
+        deadline = time.monotonic() + 10
+        while self.db.retention.stats()['runs'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.db.close()
+        self.assertGreaterEqual(self.db.retention.stats()['runs'], 1)
+        self.assertEqual(self.db.retention.last_report.rows_archived, 60)
+        self.assertFalse(self.db.retention_scheduler)
+
+
+if __name__ == '__main__':
+    unittest.main()
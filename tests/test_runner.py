@@ -11,6 +11,22 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from test_login import LoginTestCase
 from test_feedback import FeedbackTestCase  
 from test_admin import AdminTestCase
+from test_database import DatabaseTestCase
+from test_export import ExportTestCase
+from test_import import ImportTestCase
+from test_write_queue import WriteQueueTestCase
+from test_passwords import PasswordTestCase
+from test_metrics import MetricsTestCase
+from test_api import ApiTestCase
+from test_sessions import SessionTestCase
+from test_ratelimit import RateLimitTestCase
+from test_terms import TermTestCase
+from test_replica import ReplicaTestCase
+from test_analytics import AnalyticsTestCase
+from test_events import EventStreamTestCase
+from test_assets import AssetTestCase
+from test_profiler import ProfilerTestCase
+from test_retention import RetentionTestCase
 
 def create_test_suite():
     """Create test suite with all test cases"""
@@ -34,6 +50,86 @@ def create_test_suite():
     suite.addTests(admin_tests)
     print(f"Loaded {admin_tests.countTestCases()} admin tests")
     
+    # Load database tests
+    database_tests = loader.loadTestsFromTestCase(DatabaseTestCase)
+    suite.addTests(database_tests)
+    print(f"Loaded {database_tests.countTestCases()} database tests")
+    
+    # Load export tests
+    export_tests = loader.loadTestsFromTestCase(ExportTestCase)
+    suite.addTests(export_tests)
+    print(f"Loaded {export_tests.countTestCases()} export tests")
+    
+    # Load import tests
+    import_tests = loader.loadTestsFromTestCase(ImportTestCase)
+    suite.addTests(import_tests)
+    print(f"Loaded {import_tests.countTestCases()} import tests")
+    
+    # Load write-behind queue tests
+    write_queue_tests = loader.loadTestsFromTestCase(WriteQueueTestCase)
+    suite.addTests(write_queue_tests)
+    print(f"Loaded {write_queue_tests.countTestCases()} write queue tests")
+    
+    # Load password hashing tests
+    password_tests = loader.loadTestsFromTestCase(PasswordTestCase)
+    suite.addTests(password_tests)
+    print(f"Loaded {password_tests.countTestCases()} password tests")
+    
+    # Load metrics tests
+    metrics_tests = loader.loadTestsFromTestCase(MetricsTestCase)
+    suite.addTests(metrics_tests)
+    print(f"Loaded {metrics_tests.countTestCases()} metrics tests")
+    
+    # Load JSON API tests
+    api_tests = loader.loadTestsFromTestCase(ApiTestCase)
+    suite.addTests(api_tests)
+    print(f"Loaded {api_tests.countTestCases()} API tests")
+    
+    # Load session store tests
+    session_tests = loader.loadTestsFromTestCase(SessionTestCase)
+    suite.addTests(session_tests)
+    print(f"Loaded {session_tests.countTestCases()} session tests")
+    
+    # Load rate limiting tests
+    ratelimit_tests = loader.loadTestsFromTestCase(RateLimitTestCase)
+    suite.addTests(ratelimit_tests)
+    print(f"Loaded {ratelimit_tests.countTestCases()} rate limiting tests")
+    
+    # Load term archive tests
+    term_tests = loader.loadTestsFromTestCase(TermTestCase)
+    suite.addTests(term_tests)
+    print(f"Loaded {term_tests.countTestCases()} term archive tests")
+    
+    # Load read replica tests
+    replica_tests = loader.loadTestsFromTestCase(ReplicaTestCase)
+    suite.addTests(replica_tests)
+    print(f"Loaded {replica_tests.countTestCases()} read replica tests")
+    
+    # Load analytics report tests
+    analytics_tests = loader.loadTestsFromTestCase(AnalyticsTestCase)
+    suite.addTests(analytics_tests)
+    print(f"Loaded {analytics_tests.countTestCases()} analytics report tests")
+    
+    # Load live feed tests
+    event_tests = loader.loadTestsFromTestCase(EventStreamTestCase)
+    suite.addTests(event_tests)
+    print(f"Loaded {event_tests.countTestCases()} live feed tests")
+    
+    # Load static asset tests
+    asset_tests = loader.loadTestsFromTestCase(AssetTestCase)
+    suite.addTests(asset_tests)
+    print(f"Loaded {asset_tests.countTestCases()} static asset tests")
+    
+    # Load request profiler tests
+    profiler_tests = loader.loadTestsFromTestCase(ProfilerTestCase)
+    suite.addTests(profiler_tests)
+    print(f"Loaded {profiler_tests.countTestCases()} request profiler tests")
+    
+    # Load retention tests
+    retention_tests = loader.loadTestsFromTestCase(RetentionTestCase)
+    suite.addTests(retention_tests)
+    print(f"Loaded {retention_tests.countTestCases()} retention tests")
+    
     print(f"Total tests loaded: {suite.countTestCases()}")
     return suite
 
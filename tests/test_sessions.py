@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Keep password hashing cheap for the functional tests
+os.environ.setdefault('FEEDBACK_PASSWORD_ITERATIONS', '1000')
+
+from app import app, session_store
+from database import Database
+from passwords import PasswordEngine
+from sessions import SessionStore
+
+
+class SessionTestCase(unittest.TestCase):
+    """Test cases for the server-side session store"""
+
+    def setUp(self):
+        """Create a fresh database and store for each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+        self.store = SessionStore(self.db, lifetime=60.0)
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Remove the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def session_cookie(self):
+        cookie = self.client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+        return cookie.value if cookie else None
+
+    def test_store_round_trip(self):
+        """Test saving, loading through the cache, and deleting a session"""
+        expires_at = time.time() + 60
+        self.store.save('sid-1', {'username': 'student1', '_flashes': [('info', 'Hi')]}, expires_at)
+        data, loaded_expiry = self.store.load('sid-1')
+        self.assertEqual(data['_flashes'], [('info', 'Hi')])
+        self.assertEqual(loaded_expiry, expires_at)
+
+        # Mutating a loaded session must not leak into the next load
+        data['_flashes'].append(('info', 'Again'))
+        self.assertEqual(len(self.store.load('sid-1')[0]['_flashes']), 1)
+        self.assertGreater(self.store.cache.stats()['hits'], 0)
+
+        self.store.delete('sid-1')
+        self.assertIsNone(self.store.load('sid-1'))
+
+    def test_revoke_and_expiry(self):
+        """Test per-user revocation and the expiry sweep"""
+        now = time.time()
+        self.store.save('a', {'username': 'admin'}, now + 60)
+        self.store.save('b', {'username': 'admin'}, now + 60)
+        self.store.save('c', {'username': 'student1'}, now + 60)
+        self.store.save('old', {'username': 'student1'}, now - 1)
+        self.assertEqual(self.store.active_by_user(), {'admin': 2, 'student1': 1})
+
+        self.assertEqual(self.store.revoke_user('admin'), 2)
+        self.assertIsNone(self.store.load('a'))
+        self.assertIsNotNone(self.store.load('c'))
+
+        self.assertIsNone(self.store.load('old'))
+        self.assertEqual(self.store.purge_expired(), 1)
+        self.assertEqual(self.store.count_active(), 1)
+
+    def test_cookie_carries_only_the_session_id(self):
+        """Test that login state lives server-side and forged cookies are ignored"""
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        cookie = self.session_cookie()
+        self.assertNotIn('admin', cookie)
+        self.assertEqual(self.client.get('/admin').status_code, 200)
+
+        self.client.set_cookie(app.config['SESSION_COOKIE_NAME'], cookie[:-2] + 'xx')
+        response = self.client.get('/admin')
+        self.assertEqual(response.status_code, 302)
+
+    def test_login_and_logout_rotate_the_session_id(self):
+        """Test that the id before login, after login and after logout all differ"""
+        self.client.post('/login', data={'username': 'admin', 'password': 'wrong'})
+        anonymous = self.session_cookie()
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        logged_in = self.session_cookie()
+        self.client.get('/logout')
+        logged_out = self.session_cookie()
+        self.assertEqual(len({anonymous, logged_in, logged_out}), 3)
+
+        # The logged-in id is gone, so replaying it gets no admin access
+        self.client.set_cookie(app.config['SESSION_COOKIE_NAME'], logged_in)
+        self.assertEqual(self.client.get('/admin').status_code, 302)
+
+    def test_revoked_admin_loses_access(self):
+        """Test that revoking a user's sessions logs out their open browser"""
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        self.assertEqual(self.client.get('/admin').status_code, 200)
+
+        self.assertGreaterEqual(session_store.revoke_user('admin'), 1)
+        self.assertEqual(self.client.get('/admin').status_code, 302)
+
+
+if __name__ == '__main__':
+    unittest.main()
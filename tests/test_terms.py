@@ -0,0 +1,138 @@
+import unittest
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database
+from passwords import PasswordEngine
+from terms import ALIAS_PREFIX, term_alias
+
+
+class TermTestCase(unittest.TestCase):
+    """Test cases for per-term archives and queries spanning them"""
+
+    def setUp(self):
+        """Create a database holding three terms of feedback"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+        self.db.define_term('2023-spring', '2023-01-01', '2023-06-30')
+        self.db.define_term('2023-fall', '2023-07-01', '2023-12-31')
+        self.db.define_term('2024-spring', '2024-01-01', '2024-06-30')
+        rows = []
+        for i in range(90):
+            year, month = (2023, 1 + i % 12) if i < 60 else (2024, 1 + i % 6)
+            rows.append((f'student{i % 4}', f'Term feedback {i} about lectures', 1 + i % 5,
+                         f'{year}-{month:02d}-{1 + i % 28:02d} 10:{i % 60:02d}:00'))
+        self.db.bulk_insert_feedback(rows)
+
+    def tearDown(self):
+        """Close pooled connections and remove the database and archives"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def snapshot(self):
+        """Everything a reader can see, for before/after comparisons"""
+        pages = []
+        cursor = None
+        while True:
+            page = self.db.get_feedback_page(page_size=7, cursor=cursor, sort='rating', order='asc')
+            pages.append(page.rows)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        stats = self.db.get_feedback_stats()
+        daily = self.db.get_daily_counts()
+        search = [row[0] for row in self.db.search_feedback('lectures', page_size=100).rows]
+        export = [row for batch in self.db.iter_feedback_batches(batch_size=13) for row in batch]
+        return pages, stats, daily, sorted(search), export, self.db.get_all_feedback()
+
+    def test_archive_is_transparent(self):
+        """Test that pages, stats, search and export are unchanged by archiving"""
+        before = self.snapshot()
+        self.db.archive_term('2023-spring')
+        self.db.archive_term('2023-fall')
+
+        with self.db.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM main.feedback').fetchone()[0], 30)
+        self.assertEqual([term.row_count for term in self.db.get_terms()], [30, 30, 0])
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.db.verify_stats(), [])
+
+        self.db.rebuild_stats()
+        self.assertEqual(self.db.verify_stats(), [])
+        self.assertEqual(self.db.get_feedback_stats(), before[1])
+
+    def test_queries_prune_terms_by_date(self):
+        """Test that a date-filtered page only attaches the archives it can match"""
+        self.db.archive_term('2023-spring')
+        self.db.archive_term('2023-fall')
+        self.db.pool.close_idle()
+
+        page = self.db.get_feedback_page(page_size=100, date_from='2023-08-01', date_to='2023-09-30')
+        self.assertEqual(len(page.rows), 10)
+        self.assertTrue(all(row[4].startswith('2023-0') for row in page.rows))
+
+        fall = {term.name: term for term in self.db.get_terms()}['2023-fall']
+        with self.db.connection() as conn:
+            attached = {row[1] for row in conn.execute('PRAGMA database_list') if row[1].startswith(ALIAS_PREFIX)}
+        self.assertEqual(attached, {term_alias(fall.path)})
+
+    def test_rearchive_folds_in_late_rows(self):
+        """Test that rows imported after archiving are appended to the term's archive file"""
+        old = self.db.archive_term('2023-spring')
+        self.db.bulk_insert_feedback([('student9', 'Late import', 5, '2023-03-03 09:00:00')])
+        before = self.snapshot()
+
+        new = self.db.archive_term('2023-spring')
+        self.assertEqual(new.row_count, old.row_count + 1)
+        self.assertEqual(new.path, old.path)
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.db.verify_stats(), [])
+
+    def test_archive_in_chunks(self):
+        """Test that a term moved a few days at a time ends up as one archive of the whole term"""
+        before = self.snapshot()
+        partial = self.db.archive_term('2023-spring', through='2023-03-31', compact=False)
+        term = self.db.get_terms()[0]
+        self.assertEqual(partial.row_count, 15)
+        self.assertEqual(self.db.terms.live_count(term), 15)
+        self.assertEqual(self.snapshot(), before)
+
+        full = self.db.archive_term('2023-spring', through='2099-01-01')
+        self.assertEqual(full.row_count, 30)
+        self.assertEqual(full.path, partial.path)
+        self.assertEqual(self.db.terms.live_count(term), 0)
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.db.verify_stats(), [])
+        with self.assertRaises(ValueError):
+            self.db.archive_term('2023-fall', through='next week')
+
+    def test_archives_are_read_only(self):
+        """Test that an attached archive rejects writes"""
+        term = self.db.archive_term('2023-spring')
+        self.db.get_feedback_page(date_from='2023-01-01', date_to='2023-02-01')
+        with self.db.connection() as conn:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute(f'DELETE FROM {term_alias(term.path)}.feedback')
+            conn.rollback()
+
+    def test_define_rejects_bad_terms(self):
+        """Test that overlapping, inverted or oddly named terms are refused"""
+        with self.assertRaises(ValueError):
+            self.db.define_term('overlap', '2023-06-01', '2023-07-15')
+        with self.assertRaises(ValueError):
+            self.db.define_term('2025-spring', '2025-06-30', '2025-01-01')
+        with self.assertRaises(ValueError):
+            self.db.define_term('../escape', '2025-01-01', '2025-06-30')
+        with self.assertRaises(ValueError):
+            self.db.archive_term('missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
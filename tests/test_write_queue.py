@@ -0,0 +1,124 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database import Database, DuplicateFeedbackError
+from passwords import PasswordEngine
+from write_queue import QueueFullError, WriteBehindQueue
+
+
+class WriteQueueTestCase(unittest.TestCase):
+    """Test cases for the write-behind submission queue"""
+
+    def setUp(self):
+        """Create a fresh database for each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'test.db'),
+                           password_engine=PasswordEngine(iterations=1000))
+
+    def tearDown(self):
+        """Close pooled connections and remove the database"""
+        self.db.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_submissions_are_group_committed(self):
+        """Test that queued submissions land in few transactions"""
+        submission_queue = WriteBehindQueue(self.db, max_batch=50, max_delay=0.5)
+        futures = [submission_queue.submit('student1', f'Queued feedback {i}', 4) for i in range(20)]
+        for future in futures:
+            self.assertTrue(future.result(timeout=5))
+        submission_queue.close()
+
+        stats = submission_queue.stats()
+        self.assertEqual(stats['flushed_rows'], 20)
+        self.assertLess(stats['flushes'], 20)
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(self.db.get_feedback_stats()['total'], 20)
+
+    def test_repeats_are_reported_as_duplicates(self):
+        """Test that a repeat dropped by the duplicate guard fails its future, in or across batches"""
+        submission_queue = WriteBehindQueue(self.db, max_batch=50, max_delay=0.5)
+        futures = [submission_queue.submit('student1', text, 4)
+                   for text in ('Same feedback', 'Other feedback', ' same  FEEDBACK ')]
+        self.assertTrue(futures[0].result(timeout=5))
+        self.assertTrue(futures[1].result(timeout=5))
+        with self.assertRaises(DuplicateFeedbackError):
+            futures[2].result(timeout=5)
+
+        with self.assertRaises(DuplicateFeedbackError):
+            submission_queue.submit('student1', 'Same feedback', 4).result(timeout=5)
+        submission_queue.close()
+
+        stats = submission_queue.stats()
+        self.assertEqual((stats['flushed_rows'], stats['duplicate_rows']), (2, 2))
+        self.assertEqual(self.db.get_feedback_stats()['total'], 2)
+
+    def test_close_flushes_pending_submissions(self):
+        """Test that a clean shutdown commits everything still queued"""
+        submission_queue = WriteBehindQueue(self.db, max_batch=1000, max_delay=60)
+        for i in range(10):
+            submission_queue.submit('student1', f'Pending feedback {i}', 3)
+        submission_queue.close()
+
+        self.assertEqual(self.db.get_feedback_stats()['total'], 10)
+        with self.assertRaises(RuntimeError):
+            submission_queue.submit('student1', 'Too late', 3)
+
+    def test_failed_batch_is_retried_row_by_row(self):
+        """Test that one failing submission doesn't reject the rest of its batch"""
+        original_insert = self.db.insert_feedback_batch
+
+        def insert(rows):
+            if any(text == 'Poison' for _, text, _, _ in rows):
+                raise ValueError("poisoned row")
+            return original_insert(rows)
+        self.db.insert_feedback_batch = insert
+
+        submission_queue = WriteBehindQueue(self.db, max_batch=50, max_delay=0.5)
+        futures = [submission_queue.submit('student1', text, 4) for text in ('Fine 1', 'Poison', 'Fine 2')]
+        submission_queue.close()
+
+        self.assertTrue(futures[0].result(timeout=5))
+        self.assertTrue(futures[2].result(timeout=5))
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout=5)
+        self.assertEqual(self.db.get_feedback_stats()['total'], 2)
+        self.assertEqual(submission_queue.stats()['failed_rows'], 1)
+
+    def test_validation_and_backpressure(self):
+        """Test that invalid submissions fail fast and a full queue pushes back"""
+        submission_queue = WriteBehindQueue(self.db, maxsize=1, put_timeout=0.05)
+        with self.assertRaises(ValueError):
+            submission_queue.submit('student1', '   ', 3)
+
+        # Hold the write lock so the writer thread cannot drain the queue
+        with self.db.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            blocked = threading.Event()
+            original_flush = submission_queue._flush
+
+            def slow_flush(batch):
+                blocked.set()
+                original_flush(batch)
+            submission_queue._flush = slow_flush
+
+            submission_queue.submit('student1', 'First', 3)
+            blocked.wait(5)
+            submission_queue.submit('student1', 'Second', 3)
+            with self.assertRaises(QueueFullError):
+                submission_queue.submit('student1', 'Third', 3)
+            conn.rollback()
+
+        submission_queue.close()
+        self.assertEqual(submission_queue.stats()['rejected'], 1)
+        self.assertEqual(self.db.get_feedback_stats()['total'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
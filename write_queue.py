@@ -0,0 +1,185 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+from database import DuplicateFeedbackError
+
+logger = logging.getLogger(__name__)
+
+# Tells the writer thread to flush what it has and exit
+_STOP = object()
+
+
+class QueueFullError(Exception):
+    """Raised when the submission queue stays full for longer than the put timeout"""
+
+
+class WriteBehindQueue:
+    """In-process queue that group-commits feedback submissions on a writer thread.
+
+    submit() validates a submission and enqueues it; the writer thread collects
+    up to max_batch submissions, waiting at most max_delay seconds after the
+    first one, and inserts them in a single transaction. close() flushes
+    everything still queued before returning.
+    """
+
+    def __init__(self, db, max_batch=100, max_delay=0.05, maxsize=10000, put_timeout=1.0):
+        if max_batch < 1:
+            raise ValueError("Batch size must be at least 1")
+
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        # Signalled when the last submit() still putting an item has finished
+        self._puts_done = threading.Condition(self._lock)
+        self._putting = 0
+        self._closed = False
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'flushes': 0,
+            'flushed_rows': 0,
+            'duplicate_rows': 0,
+            'failed_rows': 0,
+            'last_batch_size': 0,
+            'flush_time_total': 0.0,
+            'flush_time_max': 0.0,
+        }
+        self._writer = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+        self._writer.start()
+
+    def submit(self, student_username, feedback_text, rating):
+        """Validate and enqueue a submission; returns a Future resolved once it is committed"""
+        feedback_text, rating = self.db.validate_feedback(feedback_text, rating)
+        # Keep the submission time rather than the (slightly later) flush time
+        submitted_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        future = Future()
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Submission queue is closed")
+            # close() waits for this put, so the item can't end up behind the stop marker
+            self._putting += 1
+        try:
+            self._queue.put(((student_username, feedback_text, rating, submitted_at), future),
+                            timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise QueueFullError("Too many submissions are waiting to be saved")
+        finally:
+            with self._lock:
+                self._putting -= 1
+                if not self._putting:
+                    self._puts_done.notify_all()
+
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return future
+
+    def _collect(self, first):
+        """Gather a batch starting with the first item, bounded by size and delay"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Flush this batch, then let _run see the stop marker
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _flush(self, batch):
+        """Insert one batch in a single transaction and resolve its futures.
+
+        Repeats of earlier feedback (e.g. a double-clicked submit) are dropped
+        by the duplicate guard and their futures fail with
+        DuplicateFeedbackError, as submit_feedback() would raise. If the batch
+        fails, its rows are retried one at a time so only the rows that fail
+        on their own are rejected.
+        """
+        started = time.perf_counter()
+        try:
+            results = self.db.insert_feedback_batch([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error("Failed to save a queued submission: %s", e)
+                with self._lock:
+                    self._stats['failed_rows'] += 1
+                batch[0][1].set_exception(e)
+                return
+            logger.warning("Failed to save %d queued submissions (%s); retrying them one by one", len(batch), e)
+            for item in batch:
+                self._flush([item])
+            return
+
+        elapsed = time.perf_counter() - started
+        inserted = sum(results)
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['flushed_rows'] += inserted
+            self._stats['duplicate_rows'] += len(batch) - inserted
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['flush_time_total'] += elapsed
+            self._stats['flush_time_max'] = max(self._stats['flush_time_max'], elapsed)
+        for (_, future), saved in zip(batch, results):
+            if saved:
+                future.set_result(True)
+            else:
+                future.set_exception(DuplicateFeedbackError())
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            self._flush(self._collect(item))
+        # Nothing is put after the stop marker, but fail anything that was rather than leave it waiting
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Submission queue is closed"))
+
+    def stats(self):
+        """Return queue depth, flush counts and flush latency"""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['depth'] = self._queue.qsize()
+        snapshot['flush_time_avg'] = (snapshot['flush_time_total'] / snapshot['flushes']
+                                      if snapshot['flushes'] else 0.0)
+        return snapshot
+
+    def after_fork(self):
+        """Start a fresh writer thread in a forked child; the parent's does not survive fork"""
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._lock = threading.Lock()
+        self._puts_done = threading.Condition(self._lock)
+        self._putting = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+        self._writer.start()
+
+    def close(self, timeout=None):
+        """Stop accepting submissions and wait until every queued one is committed"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while self._putting:
+                self._puts_done.wait()
+        # Blocks while the queue is full, so nothing queued is dropped
+        self._queue.put(_STOP)
+        self._writer.join(timeout)